@@ -1,23 +1,48 @@
 import os
-from datetime import datetime, timezone
 from http.client import HTTPException
-from typing import List
+from typing import List, Optional, Set, Tuple
 
 import neo4j
 from neo4j import Session
 
 from model.incomplete_artist import IncompleteArtist
-from services.artist_lookup import get_existing_artist_by_spotify_id
+from services.artist_lookup import (
+    get_existing_artist_by_spotify_id,
+    get_existing_artists_by_ids,
+    get_existing_artists_by_spotify_ids,
+)
 from services.lastfm import (
     fetch_top_artists,
     fetch_artist_details,
 )
-from services.musicbrainz import fetch_artist_genre_data
+from services.musicbrainz import MAX_ARTIST_COUNT, fetch_artist_genre_data
 from services.redis import set_to_cache
-from services.spotify import fetch_spotify_data
+from services.single_flight import single_flight
+from services.spotify import MAX_ARTIST_LOOKUP, fetch_spotify_data
 from services.combine_artist_data import combine_top_artist_data, implement_genre_data
-from services.neo4j_export import export_artist_data_to_neo4j
-from services.mysql_export import export_genres_to_mysql, save_incomplete_artist
+from services.neo4j_export import export_artist_data_to_neo4j, remove_top_artist_label
+from services.neo4j_bulk_import import export_checkpoint_to_bulk_import_csv
+from services.neo4j_publish import NEO4J_PUBLISH_MODE, new_publish_version, publish_top_artists_versioned
+from services.graph_snapshot import publish_graph_snapshot
+from services.crawl import CRAWL_RELATED_ARTISTS, crawl_related_artists
+from services.entity_resolution import get_entity_index
+from services.refresh_scheduler import (
+    CUSTOM_ARTIST_MAX_AGE_DAYS,
+    REFRESH_REQUEST_BUDGET,
+    RefreshCandidate,
+    chart_refresh_cost,
+    is_stale,
+    load_refresh_candidates,
+    select_refresh_batch,
+)
+from services.layout import LAYOUT_REFINEMENT, fetch_previous_positions, refine_layout
+from services.mysql_export import (
+    export_genres_to_mysql,
+    save_incomplete_artist,
+    fetch_incomplete_tags,
+    delete_incomplete_artists,
+)
+from services.user_tags import add_user_tag, remove_user_tag, get_tagged_spotify_ids
 
 from model.artist_node import ArtistNode
 from utils.checkpoint import save_checkpoint, load_checkpoint
@@ -36,6 +61,8 @@ RELOAD_MUSICBRAINZ = True if LOCAL_ENV else True
 RELOAD_SPOTIFY = True if LOCAL_ENV else True
 EXPORT_TO_NEO4J = True if LOCAL_ENV else True
 EXPORT_TO_MYSQL = True if LOCAL_ENV else True
+# "cypher" writes through the driver, "bulk_csv" writes neo4j-admin import files for cold rebuilds
+EXPORT_TARGET = os.getenv("EXPORT_TARGET", "cypher")
 
 
 def main():
@@ -44,11 +71,21 @@ def main():
     #     name="Love Spells",
     #     spotify_id="5iiqhuffUTPEOjAUDj19IW"
     # )
-    generate_top_artist_data()
-
-
-def generate_top_artist_data(max_artists:int=1000):
+    generate_top_artist_data(refresh_budget=REFRESH_REQUEST_BUDGET)
+
+
+def generate_top_artist_data(max_artists:int=1000, refresh_budget: Optional[float] = None):
+    """
+    Syncs the chart. Without refresh_budget every chart artist is enriched
+    upstream. With it, chart artists already in the graph compete with all
+    other artists for the budget (see schedule_chart_refresh): only the
+    selected ones are re-enriched, the rest keep their graph data and take
+    their new rank, and the non-chart artists selected are refreshed after
+    the sync.
+    """
     artists: list[ArtistNode] = []
+    chart_order = None
+    scheduled: List[RefreshCandidate] = []
 
     if RELOAD_LASTFM:
         print("[MAIN] Fetching top artists from Last.fm...")
@@ -56,6 +93,9 @@ def generate_top_artist_data(max_artists:int=1000):
         if WRITE_TO_FILE:
             save_checkpoint(artists, "lastfm_top")
 
+        if refresh_budget is not None:
+            chart_order, artists, scheduled = schedule_chart_refresh(artists, refresh_budget)
+
         print("\n[MAIN] Fetching detailed info from Last.fm...")
         artists = fetch_artist_details(artists)
         if WRITE_TO_FILE:
@@ -86,20 +126,160 @@ def generate_top_artist_data(max_artists:int=1000):
         artists = load_checkpoint('spotify')
         print(f"\n[MAIN] Loaded top artists from Spotify detailed json file")
 
+    # Enriched artists were updated in place, so the chart order holds them next to the kept ones
+    if chart_order is not None:
+        artists = chart_order
+
     print("\n[MAIN] Finalizing artist nodes (calculate x/y/color)...")
     artists = implement_genre_data(artists, top_artists=True)
+    if LAYOUT_REFINEMENT:
+        print("\n[MAIN] Refining artist layout...")
+        artists = refine_layout(artists, previous_positions=fetch_previous_positions([a.id for a in artists]))
     if WRITE_TO_FILE:
         save_checkpoint(artists, "final_genre_combined")
     print(f"[MAIN] Finalized {len(artists)} artist nodes wth proper genre data implemented.")
 
-    if EXPORT_TO_NEO4J:
-        print("\n[MAIN] Exporting artists to Neo4j...")
-        export_artist_data_to_neo4j(artists, write_to_file=WRITE_TO_FILE, add_top_artist_label=True)
+    # Crawled artists are exported first, without ranks or the TopArtist label, so the chart sync links to them
+    # and never treats them as chart artists
+    if CRAWL_RELATED_ARTISTS and EXPORT_TO_NEO4J and EXPORT_TARGET != "bulk_csv":
+        generate_crawled_artist_data(artists)
+
+    if EXPORT_TARGET == "bulk_csv":
+        print("\n[MAIN] Writing Neo4j bulk import files...")
+        if not WRITE_TO_FILE:
+            save_checkpoint(artists, "final_genre_combined")
+        export_checkpoint_to_bulk_import_csv("final_genre_combined", top_artists=True)
+    elif EXPORT_TO_NEO4J:
+        if NEO4J_PUBLISH_MODE == "versioned":
+            print("\n[MAIN] Publishing versioned top artist graph to Neo4j...")
+            version = publish_top_artists_versioned(artists)
+            if version:
+                publish_graph_snapshot(version, versioned=True, write_to_file=WRITE_TO_FILE)
+        else:
+            print("\n[MAIN] Exporting artists to Neo4j...")
+            if export_artist_data_to_neo4j(artists, write_to_file=WRITE_TO_FILE, add_top_artist_label=True):
+                publish_graph_snapshot(new_publish_version(), write_to_file=WRITE_TO_FILE)
 
     # if EXPORT_TO_MYSQL:
     #     print("\n[MAIN] Exporting genres to MySQL...")
     #     export_genres_to_mysql()
 
+    if scheduled:
+        results = refresh_artists([candidate.spotifyId for candidate in scheduled])
+        print(f"[SCHEDULER] Refreshed {sum(r['status'] == 'success' for r in results)}/{len(results)} artists.")
+
+    return artists
+
+
+def schedule_chart_refresh(chart: List[ArtistNode], budget: float
+                           ) -> Tuple[List[ArtistNode], List[ArtistNode], List[RefreshCandidate]]:
+    """
+    Chart artists the graph already has are scheduled like any other
+    refresh candidate, ranked by chart position; artists new to the graph
+    are always enriched. Returns the chart in order with unselected members
+    swapped for their graph nodes, the chart artists to enrich, and the
+    selected non-chart artists.
+    """
+    try:
+        canonical_ids = get_entity_index().resolve_artists(chart)
+    except Exception as e:
+        print(f"[SCHEDULER] Entity index unavailable, enriching the whole chart: {e}")
+        canonical_ids = [None] * len(chart)
+
+    driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    session = driver.session(database=NEO4J_ARTISTS_DB)
+    try:
+        existing = get_existing_artists_by_ids(session, [cid for cid in canonical_ids if cid])
+        candidates = load_refresh_candidates(session)
+    finally:
+        session.close()
+        driver.close()
+
+    known = {}
+    for position, canonical_id in enumerate(canonical_ids, start=1):
+        props, user_tags, _ = existing.get(canonical_id, ({}, [], []))
+        if props.get("spotifyId") and canonical_id not in known:
+            known[canonical_id] = RefreshCandidate(
+                id=canonical_id,
+                spotifyId=props["spotifyId"],
+                lastUpdated=props.get("lastUpdated"),
+                popularity=props.get("popularity") or 0,
+                rank=position,
+                isTopArtist=True,
+                tagCount=len(user_tags)
+            )
+
+    new_artists = len(chart) - len(known)
+    selected = select_refresh_batch(
+        list(known.values()) + [candidate for candidate in candidates if candidate.id not in known],
+        budget - chart_refresh_cost(len(chart), new_artists),
+        max_artists=max(min(MAX_ARTIST_COUNT, MAX_ARTIST_LOOKUP) - new_artists, 0)
+    )
+    selected_ids = {candidate.id for candidate in selected}
+
+    chart_order, to_enrich = [], []
+    for artist, canonical_id in zip(chart, canonical_ids):
+        if canonical_id in known and canonical_id not in selected_ids:
+            props, user_tags, related = existing[canonical_id]
+            kept = artist_node_from_props(props, user_tags)
+            kept.relatedArtists = related
+            chart_order.append(kept)
+            continue
+        if canonical_id in known:
+            # Known Spotify IDs skip the name search
+            artist.spotifyId = known[canonical_id].spotifyId
+        chart_order.append(artist)
+        to_enrich.append(artist)
+
+    print(f"[SCHEDULER] Enriching {len(to_enrich)} of {len(chart)} chart artists ({new_artists} new), "
+          f"keeping graph data for the rest.")
+    return chart_order, to_enrich, [candidate for candidate in selected if candidate.id not in known]
+
+
+def generate_crawled_artist_data(seeds: List[ArtistNode]) -> List[ArtistNode]:
+    print("\n[MAIN] Crawling related artists from Last.fm...")
+    crawled = crawl_related_artists(seeds)
+    print(f"[MAIN] Discovered {len(crawled)} related artists.")
+    if not crawled:
+        return []
+
+    crawled = fetch_artist_genre_data(crawled, write_to_file=False)
+    crawled = fetch_spotify_data(crawled, write_to_file=False)
+    crawled = implement_genre_data(crawled, top_artists=False)
+    if WRITE_TO_FILE:
+        save_checkpoint(crawled, "crawled")
+
+    print(f"\n[MAIN] Exporting {len(crawled)} crawled artists to Neo4j...")
+    if export_artist_data_to_neo4j(crawled, write_to_file=False, add_top_artist_label=False):
+        # Crawled artists that have dropped off the chart would otherwise be deleted as stale top artists
+        chart_ids = {artist.id for artist in seeds}
+        remove_top_artist_label([artist.id for artist in crawled if artist.id and artist.id not in chart_ids])
+    return crawled
+
+
+def custom_artist_needs_refresh(artist_props: dict) -> bool:
+    return is_stale(artist_props.get("lastUpdated"), CUSTOM_ARTIST_MAX_AGE_DAYS)
+
+
+def artist_node_from_props(artist_props: dict, user_tags: List[str]) -> ArtistNode:
+    return ArtistNode(
+        id=artist_props.get("id"),
+        name=artist_props.get("name", ""),
+        popularity=artist_props.get("popularity", 0),
+        spotifyId=artist_props.get("spotifyId"),
+        spotifyUrl=artist_props.get("spotifyUrl"),
+        lastfmMBID=artist_props.get("lastfmMBID"),
+        imageUrl=artist_props.get("imageUrl"),
+        genres=artist_props.get("genres", []),
+        x=artist_props.get("x"),
+        y=artist_props.get("y"),
+        color=artist_props.get("color"),
+        userTags=user_tags,
+        relatedArtists=artist_props.get("relatedArtists", []),
+        rank=artist_props.get("rank", 0),
+        lastUpdated=artist_props.get("lastUpdated")
+    )
+
 
 def generate_custom_artist_data(spotify_id: str = None, mbid: str = None, user_tag: str = None, session = None):
     if not spotify_id:
@@ -120,27 +300,12 @@ def generate_custom_artist_data(spotify_id: str = None, mbid: str = None, user_t
             artist_props, user_tags, is_top = existing
             print(f"[CUSTOM] Artist {spotify_id} already exists.")
 
-            last_updated_str = artist_props.get("lastUpdated")
-            should_refresh = True
-
-            if last_updated_str:
-                try:
-                    last_updated = datetime.fromisoformat(last_updated_str)
-                    days_since_update = (datetime.now(timezone.utc) - last_updated).days
-                    should_refresh = days_since_update > 90
-                except Exception as e:
-                    print(f"[WARN] Could not parse lastUpdated: {e} (forcing refresh)")
+            should_refresh = custom_artist_needs_refresh(artist_props)
 
             user_tag_added = False
             if user_tag and user_tag not in user_tags:
                 user_tags.append(user_tag)
-                session.run(
-                    """
-                    MATCH (a:Artist {spotifyId: $spotifyId})
-                    SET a.userTags = $userTags
-                    """,
-                    {"spotifyId": spotify_id, "userTags": user_tags}
-                )
+                add_user_tag(session, [spotify_id], user_tag)
                 print(f"[CUSTOM] Added userTag {user_tag} to artist.")
                 user_tag_added = True
 
@@ -149,29 +314,11 @@ def generate_custom_artist_data(spotify_id: str = None, mbid: str = None, user_t
             if not refresh_required:
                 print(f"[CUSTOM] Skipping re-fetch: {'TopArtist' if is_top else 'Recently updated'}")
 
-                artist_node = ArtistNode(
-                    id=artist_props.get("id"),
-                    name=artist_props.get("name", ""),
-                    popularity=artist_props.get("popularity", 0),
-                    spotifyId=artist_props.get("spotifyId"),
-                    spotifyUrl=artist_props.get("spotifyUrl"),
-                    lastfmMBID=artist_props.get("lastfmMBID"),
-                    imageUrl=artist_props.get("imageUrl"),
-                    genres=artist_props.get("genres", []),
-                    x=artist_props.get("x"),
-                    y=artist_props.get("y"),
-                    color=artist_props.get("color"),
-                    userTags=user_tags,
-                    relatedArtists=artist_props.get("relatedArtists", []),
-                    rank=artist_props.get("rank", 0),
-                    lastUpdated=artist_props.get("lastUpdated")
-                )
-
                 return {
                     "status": "alreadyExists",
                     "spotifyId": spotify_id,
                     "userTagAdded": user_tag_added,
-                    "artistNode": artist_node
+                    "artistNode": artist_node_from_props(artist_props, user_tags)
                 }
 
         print(f"[MAIN] Starting custom artist ingestion for SpotifyID: {spotify_id}...")
@@ -218,34 +365,24 @@ def generate_custom_artist_data(spotify_id: str = None, mbid: str = None, user_t
         if own_driver:
             own_driver.close()
 
-def ingest_artist_minimal(spotify_id: str, user_tag: str, session: Session, mysql_conn=None, already_exists=False):
+def ingest_artist_minimal(spotify_id: str, user_tag: str, session: Session, mysql_conn=None, already_exists=False,
+                          incomplete_tags: Set[str] = None, failures: List[IncompleteArtist] = None,
+                          completed: List[str] = None) -> bool:
+    # Batch callers pass prefetched incomplete_tags and collect failures/completed ids to flush once per batch
+    artist = None
     try:
         all_tags = {user_tag}
 
-        # Step 1: Pull any tags from incomplete_artists (MySQL)
-        if mysql_conn:
+        # Step 1: Pull any tags from incomplete_artists (MySQL, pooled connection unless one is passed in)
+        if incomplete_tags is None:
             try:
-                cursor = mysql_conn.cursor()
-                cursor.execute("""
-                    SELECT user_tag FROM incomplete_artists WHERE spotify_id = %s
-                """, (spotify_id,))
-                rows = cursor.fetchall()
-                for row in rows:
-                    all_tags.add(row[0])
-                cursor.close()
+                incomplete_tags = fetch_incomplete_tags(mysql_conn, [spotify_id]).get(spotify_id, set())
             except Exception as e:
                 print(f"[WARN] Failed to fetch incomplete tags for {spotify_id}: {e}")
+                incomplete_tags = set()
+        all_tags.update(incomplete_tags)
 
-        # Step 2: Pull any existing userTags from Neo4j if artist exists
-        if already_exists:
-            try:
-                result = session.run("MATCH (a:Artist {spotifyId: $id}) RETURN a.userTags AS tags", {"id": spotify_id})
-                record = result.single()
-                if record:
-                    existing_tags = record["tags"] or []
-                    all_tags.update(existing_tags)
-            except Exception as e:
-                print(f"[WARN] Failed to fetch existing tags for {spotify_id}: {e}")
+        # Step 2: Existing Neo4j userTags are unioned by the export upsert, no need to read them first
 
         # Step 3: Create artist node with merged user tags
         artist = ArtistNode(
@@ -273,57 +410,178 @@ def ingest_artist_minimal(spotify_id: str, user_tag: str, session: Session, mysq
         export_artist_data_to_neo4j(artists, write_to_file=False, add_top_artist_label=False)
 
         # Step 6: Cleanup MySQL incomplete records
-        if mysql_conn:
+        if completed is not None:
+            completed.append(spotify_id)
+        elif incomplete_tags:
             try:
-                cursor = mysql_conn.cursor()
-                cursor.execute("DELETE FROM incomplete_artists WHERE spotify_id = %s", (spotify_id,))
-                mysql_conn.commit()
-                cursor.close()
-                print(f"[CLEANUP] Removed {spotify_id} from incomplete_artists")
+                delete_incomplete_artists(mysql_conn, [spotify_id])
             except Exception as cleanup_err:
                 print(f"[ERROR] Failed to clean up {spotify_id} from incomplete_artists: {cleanup_err}")
 
+        return True
+
     except Exception as e:
         print(f"[INCOMPLETE] Failed to ingest artist {spotify_id}: {e}")
 
-        if mysql_conn:
+        incomplete = IncompleteArtist(
+            spotify_id=spotify_id,
+            user_tag=user_tag,
+            name=(artist.name if artist else "") or "",
+            popularity=(artist.popularity if artist else 0) or 0,
+            image_url=(artist.imageUrl if artist else "") or "",
+            failure_reason=str(e)
+        )
+        if failures is not None:
+            failures.append(incomplete)
+        else:
             try:
-                incomplete = IncompleteArtist(
-                    spotify_id=spotify_id,
-                    user_tag=user_tag,
-                    name=artist.name or "",
-                    popularity=artist.popularity or 0,
-                    image_url=artist.imageUrl or "",
-                    failure_reason=str(e)
-                )
                 save_incomplete_artist(mysql_conn, incomplete)
             except Exception as db_err:
                 print(f"[INCOMPLETE] Failed to save incomplete artist {spotify_id} to MySQL: {db_err}")
 
+        return False
+
+
+def ingest_artist_coalesced(spotify_id: str, user_tag: str, session: Session, **kwargs) -> bool:
+    # Concurrent requests for the same artist wait on one ingestion, then only add their own tag
+    succeeded, leader = single_flight(
+        f"ingest:{spotify_id}",
+        lambda: ingest_artist_minimal(spotify_id, user_tag, session=session, **kwargs)
+    )
+    if leader:
+        return succeeded
+
+    if succeeded:
+        print(f"[CUSTOM] Joined in-flight ingestion of {spotify_id}, adding userTag {user_tag}.")
+        add_user_tag(session, [spotify_id], user_tag)
+        return True
+
+    incomplete = IncompleteArtist(
+        spotify_id=spotify_id,
+        user_tag=user_tag,
+        failure_reason="coalesced ingestion failed"
+    )
+    if kwargs.get("failures") is not None:
+        kwargs["failures"].append(incomplete)
+    else:
+        try:
+            save_incomplete_artist(kwargs.get("mysql_conn"), incomplete)
+        except Exception as db_err:
+            print(f"[INCOMPLETE] Failed to save incomplete artist {spotify_id} to MySQL: {db_err}")
+    return False
+
 
 def get_custom_artists_by_user_tag(user_tag: str) -> List[str]:
     driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
     session = driver.session(database=NEO4J_ARTISTS_DB)
     try:
-        result = session.run(
-            """
-            MATCH (a:Artist)
-            WHERE NOT a:TopArtist AND $userTag IN a.userTags
-            RETURN a.spotifyId AS spotifyId
-            """,
-            {"userTag": user_tag}
-        )
-        return [record["spotifyId"] for record in result if record["spotifyId"]]
+        return get_tagged_spotify_ids(session, user_tag, exclude_top_artists=True)
     finally:
         session.close()
         driver.close()
 
 def refresh_custom_artists_by_user_tag(user_tag: str):
-    spotify_ids = get_custom_artists_by_user_tag(user_tag)
+    """
+    Refreshes every custom artist tagged by user_tag in one pass: one
+    metadata read, local staleness check, batched enrichment of the stale
+    artists and a single export. Returns one result per tagged artist.
+    """
+    driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    session = driver.session(database=NEO4J_ARTISTS_DB)
+    try:
+        spotify_ids = get_tagged_spotify_ids(session, user_tag, exclude_top_artists=True)
+        existing = get_existing_artists_by_spotify_ids(session, spotify_ids)
+    finally:
+        session.close()
+        driver.close()
+
     results = []
+    stale_ids = []
     for spotify_id in spotify_ids:
-        result = generate_custom_artist_data(spotify_id=spotify_id, user_tag=user_tag)
-        results.append(result)
+        found = existing.get(spotify_id)
+        if found and (found[2] or not custom_artist_needs_refresh(found[0])):
+            artist_props, user_tags, _ = found
+            results.append({
+                "status": "alreadyExists",
+                "spotifyId": spotify_id,
+                "userTagAdded": False,
+                "artistNode": artist_node_from_props(artist_props, user_tags)
+            })
+        else:
+            stale_ids.append(spotify_id)
+
+    print(f"[REFRESH] {len(stale_ids)} of {len(spotify_ids)} custom artists for {user_tag} are stale.")
+    return results + refresh_artists(stale_ids, user_tag=user_tag)
+
+
+def refresh_artists(spotify_ids: List[str], user_tag: str = None) -> List[dict]:
+    """
+    Re-fetches existing artists in one batched pass and exports them once.
+    Returns a success/failed result per Spotify ID.
+    """
+    if not spotify_ids:
+        return []
+
+    artists = [
+        ArtistNode(
+            id=spotify_id,
+            name="",
+            spotifyId=spotify_id,
+            genres=[],
+            userTags=[user_tag] if user_tag else [],
+            relatedArtists=[],
+        )
+        for spotify_id in spotify_ids
+    ]
+
+    # Each stage processes the whole list in one pass; Spotify resolves ids 50 per request
+    artists = fetch_spotify_data(artists, write_to_file=False)
+    artists = fetch_artist_details(artists, write_to_file=False)
+    artists = fetch_artist_genre_data(artists, write_to_file=False)
+    finalized = implement_genre_data(artists, top_artists=False)
+    finalized_ids = {id(artist) for artist in finalized}
+
+    exported = bool(finalized) and export_artist_data_to_neo4j(
+        finalized,
+        write_to_file=False,
+        add_top_artist_label=False
+    )
+
+    results = []
+    for spotify_id, artist in zip(spotify_ids, artists):
+        if exported and id(artist) in finalized_ids:
+            results.append({
+                "status": "success",
+                "artistName": artist.name,
+                "spotifyId": spotify_id,
+                "artistNode": artist
+            })
+        else:
+            results.append({"status": "failed", "artistName": artist.name, "spotifyId": spotify_id})
+
+    return results
+
+
+def refresh_scheduled_artists(budget: float = REFRESH_REQUEST_BUDGET) -> List[dict]:
+    """
+    Refreshes the highest-priority due artists that fit in the request
+    budget; see services.refresh_scheduler for the scoring.
+    """
+    if budget <= 0:
+        print("[SCHEDULER] No request budget left for scheduled refreshes.")
+        return []
+
+    driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    session = driver.session(database=NEO4J_ARTISTS_DB)
+    try:
+        candidates = load_refresh_candidates(session)
+    finally:
+        session.close()
+        driver.close()
+
+    selected = select_refresh_batch(candidates, budget, max_artists=min(MAX_ARTIST_COUNT, MAX_ARTIST_LOOKUP))
+    results = refresh_artists([candidate.spotifyId for candidate in selected])
+    print(f"[SCHEDULER] Refreshed {sum(r['status'] == 'success' for r in results)}/{len(results)} artists.")
     return results
 
 
@@ -353,18 +611,7 @@ def remove_user_tag_from_artist_node(spotify_id: str, user_tag: str) -> dict:
                 "userTagRemoved": False
             }
 
-        updated_tags = [tag for tag in current_tags if tag != user_tag]
-
-        session.run(
-            """
-            MATCH (a:Artist {spotifyId: $spotify_id})
-            SET a.userTags = $updated_tags
-            """,
-            {
-                "spotify_id": spotify_id,
-                "updated_tags": updated_tags
-            }
-        )
+        remove_user_tag(session, [spotify_id], user_tag)
 
         return {
             "success": True,
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 from typing import List, Optional, ClassVar
@@ -77,6 +78,21 @@ class ArtistNode:
 
         self.genres = unique_genres
 
+    def content_hash(self) -> str:
+        content = {
+            "name": self.name,
+            "popularity": self.popularity,
+            "spotifyId": self.spotifyId,
+            "spotifyUrl": self.spotifyUrl,
+            "lastfmMBID": self.lastfmMBID,
+            "imageUrl": self.imageUrl,
+            "genres": self.genres,
+            "x": self.x,
+            "y": self.y,
+            "color": self.color,
+        }
+        return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
     def to_dict(self):
         return asdict(self)
 
@@ -0,0 +1,46 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+
+@dataclass
+class ArtistSnapshot:
+    id: str
+    spotifyId: Optional[str] = None
+    normalizedName: str = ""
+    userTags: List[str] = field(default_factory=list)
+    contentHash: Optional[str] = None
+    isTopArtist: bool = False
+    lastUpdated: Optional[str] = None
+    rank: Optional[int] = None
+    x: Optional[float] = None
+    y: Optional[float] = None
+
+
+@dataclass
+class GraphIndex:
+    by_id: Dict[str, ArtistSnapshot] = field(default_factory=dict)
+    by_spotify_id: Dict[str, ArtistSnapshot] = field(default_factory=dict)
+    by_normalized_name: Dict[str, ArtistSnapshot] = field(default_factory=dict)
+    top_artist_ids: Set[str] = field(default_factory=set)
+
+    def add(self, snapshot: ArtistSnapshot):
+        self.by_id[snapshot.id] = snapshot
+        if snapshot.spotifyId:
+            self.by_spotify_id[snapshot.spotifyId] = snapshot
+        if snapshot.normalizedName:
+            self.by_normalized_name.setdefault(snapshot.normalizedName, snapshot)
+        if snapshot.isTopArtist:
+            self.top_artist_ids.add(snapshot.id)
+
+    def get(self, artist_id: str) -> Optional[ArtistSnapshot]:
+        return self.by_id.get(artist_id)
+
+    def get_by_spotify_id(self, spotify_id: str) -> Optional[ArtistSnapshot]:
+        return self.by_spotify_id.get(spotify_id)
+
+    def resolve_normalized_name(self, normalized_name: str) -> Optional[str]:
+        snapshot = self.by_normalized_name.get(normalized_name)
+        return snapshot.id if snapshot else None
+
+    def __len__(self):
+        return len(self.by_id)
@@ -1,4 +1,4 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from datetime import datetime, timezone
 from typing import Optional
 
@@ -10,7 +10,8 @@ class IncompleteArtist:
     popularity: int = 0
     image_url: str = ""
     failure_reason: str = "unknown"
-    last_attempted: datetime = datetime.now(tz=timezone.utc)
+    last_attempted: datetime = field(default_factory=lambda: datetime.now(tz=timezone.utc))
+    attempt_count: int = 0
 
     def to_sql_tuple(self):
         return (
@@ -1,21 +1,54 @@
+import json
 import os
-from datetime import datetime, timezone
+import time
+from contextlib import asynccontextmanager
 from typing import List
 
-import mysql.connector
 import neo4j
 import uvicorn
-from fastapi import FastAPI, HTTPException
-from neo4j import Session
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from main import generate_custom_artist_data, refresh_custom_artists_by_user_tag, remove_user_tag_from_artist_node, \
-    ingest_artist_minimal
+from main import refresh_custom_artists_by_user_tag, remove_user_tag_from_artist_node, get_custom_artists_by_user_tag
 from fastapi.middleware.cors import CORSMiddleware
 
-from services.mysql_export import db_config
+from services import http_client
+from services.api.streaming import run_as_completed, stream_events
+from services.async_ingest import (
+    generate_custom_artist_data_async,
+    ingest_artist_batch_async,
+    ingest_artist_coalesced_async,
+)
+from services.mysql_export import fetch_incomplete_tags, delete_incomplete_artists, upsert_incomplete_artists
+from services.graph_snapshot import (
+    SNAPSHOT_FORMATS,
+    etag_matches,
+    get_current_snapshot_version,
+    get_snapshot_body,
+    get_tile_body,
+    get_tile_index,
+    negotiate_encoding,
+    snapshot_etag,
+)
+from services.tile_index import TILE_FIELDS, TILE_MAX_ZOOM
+from services.neo4j_async import close_async_driver
 from services.neo4j_export import add_user_tag_to_artist
+from services.artist_cache import get_artist_metadata_cached
+from services.job_queue import enqueue_ingest_job, get_job_status
+from services.redis import async_binary_redis_client, async_redis_client
+from services.user_tags import get_tagged_spotify_ids_cached, remove_user_tag
+from services.refresh_scheduler import BULK_INGEST_MAX_AGE_DAYS, is_stale
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await http_client.close_async_client()
+    await close_async_driver()
+    await async_redis_client.aclose()
+    await async_binary_redis_client.aclose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,7 +59,7 @@ app.add_middleware(
 )
 
 @app.get("/api/test")
-def api_test():
+async def api_test():
     return {"success": True, "message": "Ingestor API is running."}
 
 class CustomArtistRequest(BaseModel):
@@ -36,6 +69,8 @@ class CustomArtistRequest(BaseModel):
 class BulkCustomArtistRequest(BaseModel):
     user_tag: str
     spotify_ids: List[str]
+    # Queue the work for the ingest worker pool and return a job id instead of ingesting inline
+    background: bool = True
 
 class RefreshRequest(BaseModel):
     user_tag: str
@@ -50,9 +85,9 @@ NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 NEO4J_ARTISTS_DB = os.getenv("NEO4J_ARTISTS_DB")
 
 @app.post("/api/custom-artist")
-def ingest_custom_artist(request: CustomArtistRequest):
+async def ingest_custom_artist(request: CustomArtistRequest):
     try:
-        result = generate_custom_artist_data(
+        result = await generate_custom_artist_data_async(
             user_tag=request.user_tag,
             spotify_id=request.spotify_id
         )
@@ -77,44 +112,32 @@ def ingest_custom_artist(request: CustomArtistRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/custom-artist/bulk")
-def ingest_multiple_custom_artists(request: BulkCustomArtistRequest):
+def plan_bulk_ingest(request: BulkCustomArtistRequest):
+    """
+    Decides which ids need ingestion, drops the user's tag from artists no
+    longer in the list and tags fresh ones in place. Returns
+    (ids_to_process, existing_map, removed_count).
+    """
     driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
     session = driver.session(database=NEO4J_ARTISTS_DB)
-    mysql_conn = mysql.connector.connect(**db_config)
 
     try:
-        existing_map = get_existing_artists_metadata(session, request.spotify_ids)
+        existing_map = get_artist_metadata_cached(session, request.spotify_ids)
 
         # Fetch all artist IDs currently tagged by this user
-        query = """
-        MATCH (a:Artist)
-        WHERE $user_tag IN a.userTags
-        RETURN a.spotifyId AS sid
-        """
-        result = session.run(query, user_tag=request.user_tag)
-        tagged_ids = set(record["sid"] for record in result if record["sid"])
+        tagged_ids = set(get_tagged_spotify_ids_cached(session, request.user_tag))
         current_ids = set(request.spotify_ids)
 
         # Remove tag from artists no longer in the current list
         to_remove = tagged_ids - current_ids
         if to_remove:
             print(f"Removing user tag from {len(to_remove)} artists")
-            session.run("""
-                MATCH (a:Artist)
-                WHERE a.spotifyId IN $ids
-                SET a.userTags = [tag IN a.userTags WHERE tag <> $user_tag]
-            """, ids=list(to_remove), user_tag=request.user_tag)
+            remove_user_tag(session, list(to_remove), request.user_tag)
 
         def should_process(meta, sid):
             if not meta:
                 return True
-            try:
-                last = datetime.fromisoformat(meta["lastUpdated"])
-                daysSinceLastDataRefresh = (datetime.now(timezone.utc) - last).days
-            except (KeyError, TypeError, ValueError):
-                daysSinceLastDataRefresh = 999
-            if daysSinceLastDataRefresh >= 30:
+            if is_stale(meta.get("lastUpdated"), BULK_INGEST_MAX_AGE_DAYS):
                 return True
             if request.user_tag not in meta["userTags"]:
                 add_user_tag_to_artist(sid, request.user_tag, session)
@@ -122,36 +145,120 @@ def ingest_multiple_custom_artists(request: BulkCustomArtistRequest):
         ids_to_process = [
             sid for sid in request.spotify_ids if should_process(existing_map.get(sid), sid)
         ]
+        return ids_to_process, existing_map, len(to_remove)
 
-        for idx, sid in enumerate(ids_to_process, start=1):
-            print(f"[{idx}/{len(ids_to_process)}] Processing artist ID: {sid}")
-            ingest_artist_minimal(
-                sid,
-                request.user_tag,
-                session=session,
-                mysql_conn=mysql_conn,
-                already_exists=existing_map.get(sid) is not None
-            )
+    finally:
+        session.close()
+        driver.close()
 
+@app.post("/api/custom-artist/bulk")
+async def ingest_multiple_custom_artists(request: BulkCustomArtistRequest):
+    ids_to_process, existing_map, removed_count = await run_in_threadpool(plan_bulk_ingest, request)
+
+    if request.background:
+        job_id = await run_in_threadpool(enqueue_ingest_job, request.user_tag, ids_to_process, set(existing_map))
         return {
             "success": True,
-            "processedCount": len(ids_to_process),
-            "removedCount": len(to_remove),
+            "jobId": job_id,
+            "queuedCount": len(ids_to_process),
+            "removedCount": removed_count,
             "skippedCount": len(request.spotify_ids) - len(ids_to_process)
         }
 
-    finally:
-        session.close()
-        driver.close()
-        mysql_conn.close()
+    incomplete_tags = await run_in_threadpool(fetch_incomplete_tags, None, ids_to_process)
+    failures = []
+    completed = []
+
+    print(f"Processing {len(ids_to_process)} artists as one batch")
+    await ingest_artist_batch_async(
+        ids_to_process,
+        request.user_tag,
+        incomplete_tags=incomplete_tags,
+        failures=failures,
+        completed=completed
+    )
+
+    # Flush MySQL bookkeeping for the whole request in one statement each
+    def flush():
+        delete_incomplete_artists(None, [sid for sid in completed if sid in incomplete_tags])
+        upsert_incomplete_artists(None, failures)
+
+    await run_in_threadpool(flush)
+
+    return {
+        "success": True,
+        "processedCount": len(ids_to_process),
+        "removedCount": removed_count,
+        "skippedCount": len(request.spotify_ids) - len(ids_to_process)
+    }
+
+@app.post("/api/custom-artist/bulk/stream")
+async def ingest_multiple_custom_artists_stream(request: BulkCustomArtistRequest,
+                                                fmt: str = Query("ndjson", alias="format")):
+    # Per-artist progress as NDJSON or SSE, one event per artist as it finishes
+    async def events():
+        started = time.perf_counter()
+        ids_to_process, existing_map, removed_count = await run_in_threadpool(plan_bulk_ingest, request)
+        to_process = set(ids_to_process)
+        skipped = [sid for sid in dict.fromkeys(request.spotify_ids) if sid not in to_process]
+        yield {
+            "event": "started",
+            "total": len(ids_to_process) + len(skipped),
+            "toProcess": len(ids_to_process),
+            "removedCount": removed_count
+        }
+
+        for sid in skipped:
+            yield {"event": "skipped", "spotifyId": sid, "elapsedMs": 0}
+
+        incomplete_tags = await run_in_threadpool(fetch_incomplete_tags, None, ids_to_process)
+        failures = []
+        completed = []
+
+        def ingest(sid):
+            return ingest_artist_coalesced_async(
+                sid,
+                request.user_tag,
+                incomplete_tags=incomplete_tags.get(sid, set()),
+                failures=failures,
+                completed=completed
+            )
+
+        counts = {"processed": 0, "skipped": len(skipped), "failed": 0}
+        async for sid, result, elapsed_ms in run_as_completed(ids_to_process, ingest):
+            if result is True:
+                counts["processed"] += 1
+                yield {"event": "processed", "spotifyId": sid, "elapsedMs": elapsed_ms}
+            else:
+                counts["failed"] += 1
+                reason = str(result) if isinstance(result, Exception) else next(
+                    (f.failure_reason for f in reversed(failures) if f.spotify_id == sid), None
+                )
+                yield {"event": "failed", "spotifyId": sid, "elapsedMs": elapsed_ms, "error": reason}
+
+        def flush():
+            delete_incomplete_artists(None, [sid for sid in completed if sid in incomplete_tags])
+            upsert_incomplete_artists(None, failures)
+
+        await run_in_threadpool(flush)
+        yield {"event": "done", **counts, "elapsedMs": round((time.perf_counter() - started) * 1000, 1)}
+
+    return stream_events(events(), fmt)
+
+@app.get("/api/custom-artist/jobs/{job_id}")
+async def get_ingest_job_status(job_id: str):
+    job = await run_in_threadpool(get_job_status, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return {"success": True, "job": job}
 
 @app.post("/api/refresh-custom-artists")
-def refresh_custom_artists(request: RefreshRequest):
+async def refresh_custom_artists(request: RefreshRequest):
     user_tag = request.user_tag
     if not user_tag:
         raise HTTPException(status_code=400, detail="Missing user_tag")
     try:
-        results = refresh_custom_artists_by_user_tag(user_tag)
+        results = await run_in_threadpool(refresh_custom_artists_by_user_tag, user_tag)
         return {
             "success": True,
             "message": f"Refreshed {len(results)} custom artists for user tag {user_tag}.",
@@ -160,31 +267,114 @@ def refresh_custom_artists(request: RefreshRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/refresh-custom-artists/stream")
+async def refresh_custom_artists_stream(request: RefreshRequest, fmt: str = Query("ndjson", alias="format")):
+    user_tag = request.user_tag
+    if not user_tag:
+        raise HTTPException(status_code=400, detail="Missing user_tag")
+
+    async def events():
+        started = time.perf_counter()
+        spotify_ids = await run_in_threadpool(get_custom_artists_by_user_tag, user_tag)
+        yield {"event": "started", "total": len(spotify_ids)}
+
+        def refresh(sid):
+            return generate_custom_artist_data_async(spotify_id=sid, user_tag=user_tag)
+
+        counts = {"processed": 0, "skipped": 0, "failed": 0}
+        async for sid, result, elapsed_ms in run_as_completed(spotify_ids, refresh):
+            if isinstance(result, Exception):
+                counts["failed"] += 1
+                yield {"event": "failed", "spotifyId": sid, "elapsedMs": elapsed_ms, "error": str(result)}
+            elif result["status"] == "success":
+                counts["processed"] += 1
+                yield {"event": "processed", "spotifyId": sid, "artistName": result["artistName"],
+                       "elapsedMs": elapsed_ms}
+            else:
+                counts["skipped"] += 1
+                yield {"event": "skipped", "spotifyId": sid, "elapsedMs": elapsed_ms}
+
+        yield {"event": "done", **counts, "elapsedMs": round((time.perf_counter() - started) * 1000, 1)}
+
+    return stream_events(events(), fmt)
+
 @app.post("/api/remove-custom-artist-usertag")
-def remove_user_tag_from_artist(request: RemoveUserTagRequest):
+async def remove_user_tag_from_artist(request: RemoveUserTagRequest):
     try:
-        return remove_user_tag_from_artist_node(request.spotify_id, request.user_tag)
+        return await run_in_threadpool(remove_user_tag_from_artist_node, request.spotify_id, request.user_tag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-def get_existing_artists_metadata(session: Session, spotify_ids: List[str]) -> dict:
-    result = session.run(
-        """
-        UNWIND $ids AS sid
-        MATCH (a:Artist {spotifyId: sid})
-        RETURN a.spotifyId AS spotifyId,
-               a:TopArtist AS isTopArtist,
-               a.lastUpdated AS lastUpdated,
-               a.userTags AS userTags
-        """,
-        {"ids": spotify_ids}
-    )
+@app.get("/api/graph/snapshot")
+async def get_graph_snapshot(request: Request, fmt: str = Query("json", alias="format")):
+    # Served from the precomputed snapshot in Redis; revalidations are answered from the ETag alone
+    if fmt not in SNAPSHOT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}', expected json or binary")
 
-    existing = {}
-    for record in result:
-        existing[record["spotifyId"]] = {
-            "isTopArtist": record.get("isTopArtist", False),
-            "lastUpdated": record.get("lastUpdated"),
-            "userTags": record.get("userTags") or []
-        }
-    return existing
\ No newline at end of file
+    version = await get_current_snapshot_version()
+    if not version:
+        raise HTTPException(status_code=404, detail="No graph snapshot has been published yet.")
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    etag = snapshot_etag(version, fmt, encoding)
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "public, no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    body = await get_snapshot_body(version, fmt, encoding)
+    if body is None:
+        raise HTTPException(status_code=404, detail=f"Snapshot {version} is no longer available.")
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    headers["X-Graph-Version"] = version
+    media_type = "application/json" if fmt == "json" else "application/octet-stream"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+@app.get("/api/graph/tiles/{z}/{x}/{y}")
+async def get_graph_tile(request: Request, z: int, x: int, y: int):
+    if not 0 <= z <= TILE_MAX_ZOOM or not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        raise HTTPException(status_code=404, detail=f"Tile {z}/{x}/{y} is outside the index.")
+
+    version = await get_current_snapshot_version()
+    if not version:
+        raise HTTPException(status_code=404, detail="No graph snapshot has been published yet.")
+
+    etag = f"\"{version}-tile-{z}-{x}-{y}\""
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache", "X-Graph-Version": version}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    body = await get_tile_body(version, z, x, y)
+    if body is None:
+        # Tiles without artists are not stored
+        body = json.dumps({
+            "z": z, "x": x, "y": y, "total": 0, "artists": {field: [] for field in TILE_FIELDS}
+        }, separators=(",", ":")).encode("utf-8")
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/graph/viewport")
+async def get_graph_viewport(min_x: float = Query(..., alias="minX"), min_y: float = Query(..., alias="minY"),
+                             max_x: float = Query(..., alias="maxX"), max_y: float = Query(..., alias="maxY"),
+                             zoom: int = None, limit: int = Query(2000, ge=1, le=20000)):
+    if max_x < min_x or max_y < min_y:
+        raise HTTPException(status_code=400, detail="Viewport max must not be less than min.")
+
+    version = await get_current_snapshot_version()
+    index = await get_tile_index(version) if version else None
+    if index is None:
+        raise HTTPException(status_code=404, detail="No graph snapshot has been published yet.")
+
+    started = time.perf_counter()
+    z = index.zoom_for_viewport(min_x, min_y, max_x, max_y) if zoom is None else min(max(zoom, 0), index.max_zoom)
+    artists = index.query(min_x, min_y, max_x, max_y, zoom=z, limit=limit)
+    body = {
+        "version": version,
+        "zoom": z,
+        "count": len(artists),
+        "queryMs": round((time.perf_counter() - started) * 1000, 3),
+        "artists": {field: [artist.get(field) for artist in artists] for field in TILE_FIELDS}
+    }
+    return Response(content=json.dumps(body, separators=(",", ":")), media_type="application/json",
+                    headers={"X-Graph-Version": version})
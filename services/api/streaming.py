@@ -0,0 +1,65 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+STREAM_CONCURRENCY = int(os.getenv("STREAM_CONCURRENCY", "8"))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def format_event(event: dict, fmt: str) -> str:
+    payload = json.dumps(event, default=str)
+    if fmt == "sse":
+        return f"event: {event['event']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+def stream_events(events: AsyncIterator[dict], fmt: str) -> StreamingResponse:
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}', expected ndjson or sse")
+
+    async def body():
+        async for event in events:
+            yield format_event(event, fmt)
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[fmt],
+        # Disable proxy buffering so each event reaches the client as soon as it is written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def run_as_completed(items: Iterable[str], worker: Callable[[str], Awaitable[Any]],
+                           concurrency: int = STREAM_CONCURRENCY) -> AsyncIterator[Tuple[str, Any, float]]:
+    """
+    Runs worker over items with bounded concurrency and yields
+    (item, result_or_exception, elapsed_ms) in completion order.
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(item):
+        async with slots:
+            started = time.perf_counter()
+            try:
+                result = await worker(item)
+            except Exception as e:
+                result = e
+            return item, result, round((time.perf_counter() - started) * 1000, 1)
+
+    tasks = [asyncio.create_task(run(item)) for item in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client disconnected mid-stream: stop work nobody will read
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,77 @@
+import os
+from typing import Dict, Iterable, List
+
+from neo4j import Session
+
+from services.artist_lookup import get_existing_artists_metadata
+from services.redis import (
+    delete_many_from_cache,
+    delete_many_from_cache_async,
+    get_many_from_cache,
+    set_many_to_cache,
+    set_many_to_cache_async,
+)
+
+ARTIST_METADATA_TTL = int(os.getenv("ARTIST_METADATA_CACHE_TTL", str(24 * 3600)))
+
+# Read-through cache of {isTopArtist, lastUpdated, userTags} per Spotify ID, used by the bulk endpoint
+# to decide skip-or-process without touching Neo4j. Writers keep it fresh via the helpers below.
+
+
+def artist_metadata_key(spotify_id: str) -> str:
+    return f"artist:meta:{spotify_id}"
+
+
+def user_tagged_key(user_tag: str) -> str:
+    return f"user:tagged:{user_tag}"
+
+
+def get_artist_metadata_cached(session: Session, spotify_ids: List[str]) -> Dict[str, dict]:
+    ids = list(dict.fromkeys(spotify_ids))
+    cached = get_many_from_cache(artist_metadata_key(sid) for sid in ids)
+
+    metadata = {}
+    misses = []
+    for sid in ids:
+        entry = cached.get(artist_metadata_key(sid))
+        if entry is None:
+            misses.append(sid)
+        else:
+            metadata[sid] = entry
+
+    if misses:
+        fetched = get_existing_artists_metadata(session, misses)
+        cache_artist_metadata(fetched)
+        metadata.update(fetched)
+
+    return metadata
+
+
+def cache_artist_metadata(entries: Dict[str, dict]):
+    set_many_to_cache(
+        {artist_metadata_key(sid): meta for sid, meta in entries.items() if sid},
+        ex=ARTIST_METADATA_TTL
+    )
+
+
+def invalidate_artist_metadata(spotify_ids: Iterable[str]):
+    delete_many_from_cache(artist_metadata_key(sid) for sid in set(spotify_ids) if sid)
+
+
+def invalidate_user_tagged_ids(user_tags: Iterable[str]):
+    delete_many_from_cache(user_tagged_key(tag) for tag in set(user_tags) if tag)
+
+
+async def cache_artist_metadata_async(entries: Dict[str, dict]):
+    await set_many_to_cache_async(
+        {artist_metadata_key(sid): meta for sid, meta in entries.items() if sid},
+        ex=ARTIST_METADATA_TTL
+    )
+
+
+async def invalidate_artist_metadata_async(spotify_ids: Iterable[str]):
+    await delete_many_from_cache_async(artist_metadata_key(sid) for sid in set(spotify_ids) if sid)
+
+
+async def invalidate_user_tagged_ids_async(user_tags: Iterable[str]):
+    await delete_many_from_cache_async(user_tagged_key(tag) for tag in set(user_tags) if tag)
@@ -1,20 +1,179 @@
-from typing import Optional, Tuple
+from typing import Iterable, List, Optional, Tuple
 from neo4j import Session
 
+from model.graph_index import ArtistSnapshot, GraphIndex
+from services.entity_resolution import normalize_name
+
+# Whether a is in the published top artist set. With versioned publishing that is membership of the
+# current TopArtistSet, which flips atomically; the TopArtist label is reconciled later by the GC.
+# Without a current version (in-place syncs) the label is authoritative.
+IS_TOP_ARTIST = """coalesce(
+    head([(m:Metadata {name: 'lastSync'}) WHERE m.currentTopVersion IS NOT NULL
+          | size([(s:TopArtistSet {version: m.currentTopVersion})-[:INCLUDES]->(a) | s]) > 0]),
+    a:TopArtist
+)"""
+
+EXISTING_ARTIST_QUERY = f"""
+MATCH (a:Artist {{spotifyId: $spotifyId}})
+RETURN a, a.userTags AS userTags, {IS_TOP_ARTIST} AS isTopArtist
+"""
+
+BACKFILL_NORMALIZED_NAME_QUERY = """
+UNWIND $rows AS row
+MATCH (a:Artist {id: row.id})
+SET a.normalizedName = row.normalizedName
+"""
+
+
 def get_existing_artist_by_spotify_id(session: Session, spotify_id: str) -> Optional[Tuple[dict, list, bool]]:
     """
     Checks if an artist with the given Spotify ID exists in Neo4j.
     Returns:
         (artist_properties, userTags, isTopArtist) if found, else None
     """
+    result = session.run(EXISTING_ARTIST_QUERY, {"spotifyId": spotify_id})
+    record = result.single()
+    if record:
+        return record["a"]._properties, record["userTags"] or [], record["isTopArtist"]
+    return None
+
+
+def get_existing_artists_by_spotify_ids(session: Session, spotify_ids: List[str]) -> dict:
+    """
+    Batched get_existing_artist_by_spotify_id: maps each Spotify ID found to
+    (artist_properties, userTags, isTopArtist).
+    """
+    result = session.run(
+        f"""
+        UNWIND $ids AS sid
+        MATCH (a:Artist {{spotifyId: sid}})
+        RETURN sid, a, a.userTags AS userTags, {IS_TOP_ARTIST} AS isTopArtist
+        """,
+        {"ids": spotify_ids}
+    )
+    return {
+        record["sid"]: (record["a"]._properties, record["userTags"] or [], record["isTopArtist"])
+        for record in result
+    }
+
+
+def get_existing_artists_by_ids(session: Session, artist_ids: List[str]) -> dict:
+    """
+    Maps each artist id found to (artist_properties, userTags, relatedArtists),
+    where relatedArtists are the names of its RELATED_TO neighbours, so the
+    node can be re-exported without losing its edges.
+    """
     result = session.run(
         """
-        MATCH (a:Artist {spotifyId: $spotifyId})
-        RETURN a, a.userTags AS userTags, a:TopArtist AS isTopArtist
+        UNWIND $ids AS id
+        MATCH (a:Artist {id: id})
+        RETURN id, a, a.userTags AS userTags, [(a)-[:RELATED_TO]-(b:Artist) | b.name] AS relatedArtists
         """,
-        {"spotifyId": spotify_id}
+        {"ids": artist_ids}
     )
-    record = result.single()
-    if record:
-        return record["a"]._properties, record["userTags"] or [], record["isTopArtist"]
-    return None
\ No newline at end of file
+    return {
+        record["id"]: (record["a"]._properties, record["userTags"] or [], record["relatedArtists"] or [])
+        for record in result
+    }
+
+
+def get_existing_artists_metadata(session: Session, spotify_ids: List[str]) -> dict:
+    result = session.run(
+        f"""
+        UNWIND $ids AS sid
+        MATCH (a:Artist {{spotifyId: sid}})
+        RETURN a.spotifyId AS spotifyId,
+               {IS_TOP_ARTIST} AS isTopArtist,
+               a.lastUpdated AS lastUpdated,
+               a.userTags AS userTags
+        """,
+        {"ids": spotify_ids}
+    )
+
+    existing = {}
+    for record in result:
+        existing[record["spotifyId"]] = {
+            "isTopArtist": record.get("isTopArtist", False),
+            "lastUpdated": record.get("lastUpdated"),
+            "userTags": record.get("userTags") or []
+        }
+    return existing
+
+
+def ensure_artist_schema(session: Session):
+    session.run("CREATE INDEX artist_id IF NOT EXISTS FOR (a:Artist) ON (a.id)")
+    session.run("CREATE INDEX artist_spotify_id IF NOT EXISTS FOR (a:Artist) ON (a.spotifyId)")
+    session.run("CREATE INDEX artist_normalized_name IF NOT EXISTS FOR (a:Artist) ON (a.normalizedName)")
+
+
+def graph_index_query(ids: Optional[Iterable[str]] = None,
+                      normalized_names: Optional[Iterable[str]] = None) -> Tuple[str, dict]:
+    if ids is None and normalized_names is None:
+        query = "MATCH (a:Artist)"
+        params = {}
+    else:
+        query = """
+        MATCH (a:Artist)
+        WHERE a.id IN $ids OR a.normalizedName IN $names
+        """
+        params = {"ids": list(ids or []), "names": list(normalized_names or [])}
+
+    return query + f"""
+        RETURN a.id AS id,
+               a.spotifyId AS spotifyId,
+               a.name AS name,
+               a.normalizedName AS normalizedName,
+               a.userTags AS userTags,
+               a.contentHash AS contentHash,
+               {IS_TOP_ARTIST} AS isTopArtist,
+               a.lastUpdated AS lastUpdated,
+               a.rank AS rank,
+               a.x AS x,
+               a.y AS y
+        """, params
+
+
+def add_snapshot_record(index: GraphIndex, record, backfill: List[dict]):
+    if record["id"] is None:
+        return
+    # Also rewrites values stored under an older normalization, so name lookups keep matching
+    normalized = normalize_name(record["name"] or "")
+    if record["normalizedName"] != normalized:
+        backfill.append({"id": record["id"], "normalizedName": normalized})
+
+    index.add(ArtistSnapshot(
+        id=record["id"],
+        spotifyId=record["spotifyId"],
+        normalizedName=normalized,
+        userTags=record["userTags"] or [],
+        contentHash=record["contentHash"],
+        isTopArtist=record["isTopArtist"],
+        lastUpdated=record["lastUpdated"],
+        rank=record["rank"],
+        x=record["x"],
+        y=record["y"]
+    ))
+
+
+def prefetch_graph_index(session: Session, ids: Optional[Iterable[str]] = None,
+                         normalized_names: Optional[Iterable[str]] = None) -> GraphIndex:
+    """
+    Loads a compact snapshot of existing artists in one streamed query.
+    Without ids/normalized_names every artist is loaded; otherwise only the
+    artists matching either filter. Missing normalizedName properties are
+    computed locally and backfilled in one batched write.
+    """
+    query, params = graph_index_query(ids, normalized_names)
+    result = session.run(query, params)
+
+    index = GraphIndex()
+    backfill = []
+    for record in result:
+        add_snapshot_record(index, record, backfill)
+
+    if backfill:
+        session.run(BACKFILL_NORMALIZED_NAME_QUERY, {"rows": backfill})
+        print(f"[NEO4J] Backfilled normalizedName on {len(backfill)} artists.")
+
+    print(f"[NEO4J] Prefetched {len(index)} existing artists ({len(index.top_artist_ids)} top artists).")
+    return index
@@ -0,0 +1,397 @@
+import asyncio
+import os
+from typing import Dict, List, Optional, Set
+
+from main import artist_node_from_props, custom_artist_needs_refresh
+from model.artist_node import ArtistNode
+from model.incomplete_artist import IncompleteArtist
+from services.combine_artist_data import implement_genre_data
+from services.lastfm import apply_artist_info, fetch_artist_info_async
+from services.musicbrainz import apply_artist_match, fetch_artist_match_async
+from services.mysql_export import (
+    delete_incomplete_artists,
+    fetch_incomplete_tags,
+    save_incomplete_artist,
+    upsert_incomplete_artists,
+)
+from services.neo4j_async import (
+    add_user_tag_async,
+    async_session,
+    export_artist_data_to_neo4j_async,
+    get_existing_artist_by_spotify_id_async,
+)
+from services.redis import set_to_cache_async
+from services.single_flight import single_flight_async, single_flight_many_async
+from services.spotify import (
+    apply_spotify_artist,
+    fetch_spotify_artists_by_ids_async,
+    get_spotify_access_token_async,
+)
+
+# Async counterparts of generate_custom_artist_data / ingest_artist_minimal for the API server.
+# Upstream, Neo4j and Redis calls await on the event loop; MySQL bookkeeping has no async
+# driver here and runs on the default thread pool via asyncio.to_thread.
+
+
+LASTFM_CONCURRENCY = int(os.getenv("LASTFM_CONCURRENCY", "8"))
+MUSICBRAINZ_CONCURRENCY = int(os.getenv("MUSICBRAINZ_CONCURRENCY", "1"))
+
+# Caps on in-flight requests per upstream, on top of the fleet-wide rate limiter
+_lastfm_slots = asyncio.Semaphore(LASTFM_CONCURRENCY)
+_musicbrainz_slots = asyncio.Semaphore(MUSICBRAINZ_CONCURRENCY)
+
+
+async def _lastfm_info(name: str):
+    async with _lastfm_slots:
+        try:
+            return await fetch_artist_info_async(name)
+        except Exception as e:
+            print(f"[LASTFM] Failed to fetch details for {name}: {e}")
+            return None, []
+
+
+async def _musicbrainz_match(name: str):
+    async with _musicbrainz_slots:
+        return await fetch_artist_match_async(name)
+
+
+async def enrich_artists_async(artists: List[ArtistNode], user_tag: Optional[str] = None) -> List[ArtistNode]:
+    """
+    Resolves every artist on Spotify together (50 ids per request), then runs
+    Last.fm and MusicBrainz for all of them concurrently. Each artist's results
+    are applied in the same order as the sync pipeline so genre ordering is
+    unchanged. Returns the artists implement_genre_data finalized; artists
+    Spotify did not resolve keep an empty name.
+    """
+    token = await get_spotify_access_token_async()
+    found = await fetch_spotify_artists_by_ids_async([a.spotifyId for a in artists], token)
+
+    resolved = []
+    for artist in artists:
+        spotify_artist = found.get(artist.spotifyId)
+        if spotify_artist:
+            apply_spotify_artist(artist, spotify_artist)
+            resolved.append(artist)
+        else:
+            print(f"[SPOTIFY] No match found for {artist.spotifyId}")
+
+    async def enrich(artist: ArtistNode):
+        (info, similar), match = await asyncio.gather(_lastfm_info(artist.name), _musicbrainz_match(artist.name))
+        if info:
+            apply_artist_info(artist, info, similar)
+        if match:
+            apply_artist_match(artist, match)
+        if user_tag:
+            await set_to_cache_async(f"ingest:latest:{user_tag}", {"name": artist.name}, ex=60)
+
+    await asyncio.gather(*(enrich(artist) for artist in resolved))
+    return implement_genre_data(resolved, top_artists=False)
+
+
+async def enrich_artist_async(artist: ArtistNode, user_tag: Optional[str] = None) -> List[ArtistNode]:
+    artists = await enrich_artists_async([artist], user_tag=user_tag)
+    if not artist.name:
+        raise ValueError(f"No Spotify artist found for {artist.spotifyId}")
+    return artists
+
+
+async def generate_custom_artist_data_async(spotify_id: str = None, mbid: str = None, user_tag: str = None) -> dict:
+    if not spotify_id:
+        raise ValueError("Must provide spotify id")
+
+    async with async_session() as session:
+        existing = await get_existing_artist_by_spotify_id_async(session, spotify_id)
+
+        if existing:
+            artist_props, user_tags, is_top = existing
+            print(f"[CUSTOM] Artist {spotify_id} already exists.")
+
+            user_tag_added = False
+            if user_tag and user_tag not in user_tags:
+                user_tags.append(user_tag)
+                await add_user_tag_async(session, [spotify_id], user_tag)
+                print(f"[CUSTOM] Added userTag {user_tag} to artist.")
+                user_tag_added = True
+
+            if is_top or not custom_artist_needs_refresh(artist_props):
+                print(f"[CUSTOM] Skipping re-fetch: {'TopArtist' if is_top else 'Recently updated'}")
+                return {
+                    "status": "alreadyExists",
+                    "spotifyId": spotify_id,
+                    "userTagAdded": user_tag_added,
+                    "artistNode": artist_node_from_props(artist_props, user_tags)
+                }
+
+    result, leader = await single_flight_async(
+        f"ingest:{spotify_id}",
+        lambda: _ingest_custom_artist_async(spotify_id, mbid, user_tag)
+    )
+    if leader:
+        return {**result, "artistNode": ArtistNode(**result["artistNode"])}
+
+    # Joined an ingestion started by another request, which may not carry this user's tag
+    if not result:
+        raise RuntimeError(f"In-flight ingestion of {spotify_id} failed")
+    print(f"[CUSTOM] Joined in-flight ingestion of {spotify_id}, adding userTag {user_tag}.")
+    async with async_session() as session:
+        if user_tag:
+            await add_user_tag_async(session, [spotify_id], user_tag)
+        existing = await get_existing_artist_by_spotify_id_async(session, spotify_id)
+    if not existing:
+        raise RuntimeError(f"Artist {spotify_id} missing after in-flight ingestion")
+
+    artist_props, user_tags, _ = existing
+    return {
+        "status": "success",
+        "artistName": artist_props.get("name"),
+        "spotifyId": spotify_id,
+        "artistNode": artist_node_from_props(artist_props, user_tags)
+    }
+
+
+async def _ingest_custom_artist_async(spotify_id: str, mbid: Optional[str], user_tag: Optional[str]) -> dict:
+    print(f"[MAIN] Starting custom artist ingestion for SpotifyID: {spotify_id}...")
+
+    artist = ArtistNode(
+        id=spotify_id,
+        name="",
+        spotifyId=spotify_id,
+        lastfmMBID=mbid,
+        genres=[],
+        userTags=[user_tag],
+        relatedArtists=[],
+    )
+
+    artists = await enrich_artist_async(artist)
+    if not artists:
+        raise ValueError(f"No genres found for {artist.name or spotify_id}")
+
+    if not await export_artist_data_to_neo4j_async(artists):
+        raise RuntimeError(f"Neo4j export failed for {spotify_id}")
+
+    print(f"[MAIN] Finished ingesting {artists[0].name}.")
+
+    return {
+        "status": "success",
+        "artistName": artists[0].name,
+        "spotifyId": spotify_id,
+        # Shared with coalesced callers through Redis, so it must be JSON-serializable
+        "artistNode": artists[0].to_dict()
+    }
+
+
+async def ingest_artist_minimal_async(spotify_id: str, user_tag: str, incomplete_tags: Set[str] = None,
+                                      failures: List[IncompleteArtist] = None,
+                                      completed: List[str] = None) -> bool:
+    artist = None
+    try:
+        all_tags = {user_tag}
+
+        if incomplete_tags is None:
+            try:
+                found = await asyncio.to_thread(fetch_incomplete_tags, None, [spotify_id])
+                incomplete_tags = found.get(spotify_id, set())
+            except Exception as e:
+                print(f"[WARN] Failed to fetch incomplete tags for {spotify_id}: {e}")
+                incomplete_tags = set()
+        all_tags.update(incomplete_tags)
+
+        artist = ArtistNode(
+            id=spotify_id,
+            name="",
+            spotifyId=spotify_id,
+            userTags=list(all_tags),
+            relatedArtists=[],
+            genres=[]
+        )
+
+        artists = await enrich_artist_async(artist, user_tag=user_tag)
+        if not artists:
+            raise ValueError("No genres found after data fetching")
+
+        if not await export_artist_data_to_neo4j_async(artists):
+            raise RuntimeError("Neo4j export failed")
+
+        if completed is not None:
+            completed.append(spotify_id)
+        elif incomplete_tags:
+            try:
+                await asyncio.to_thread(delete_incomplete_artists, None, [spotify_id])
+            except Exception as cleanup_err:
+                print(f"[ERROR] Failed to clean up {spotify_id} from incomplete_artists: {cleanup_err}")
+
+        return True
+
+    except Exception as e:
+        print(f"[INCOMPLETE] Failed to ingest artist {spotify_id}: {e}")
+
+        incomplete = IncompleteArtist(
+            spotify_id=spotify_id,
+            user_tag=user_tag,
+            name=(artist.name if artist else "") or "",
+            popularity=(artist.popularity if artist else 0) or 0,
+            image_url=(artist.imageUrl if artist else "") or "",
+            failure_reason=str(e)
+        )
+        if failures is not None:
+            failures.append(incomplete)
+        else:
+            try:
+                await asyncio.to_thread(save_incomplete_artist, None, incomplete)
+            except Exception as db_err:
+                print(f"[INCOMPLETE] Failed to save incomplete artist {spotify_id} to MySQL: {db_err}")
+
+        return False
+
+
+async def ingest_artist_coalesced_async(spotify_id: str, user_tag: str, **kwargs) -> bool:
+    succeeded, leader = await single_flight_async(
+        f"ingest:{spotify_id}",
+        lambda: ingest_artist_minimal_async(spotify_id, user_tag, **kwargs)
+    )
+    if leader:
+        return succeeded
+
+    if succeeded:
+        print(f"[CUSTOM] Joined in-flight ingestion of {spotify_id}, adding userTag {user_tag}.")
+        async with async_session() as session:
+            await add_user_tag_async(session, [spotify_id], user_tag)
+        return True
+
+    incomplete = IncompleteArtist(
+        spotify_id=spotify_id,
+        user_tag=user_tag,
+        failure_reason="coalesced ingestion failed"
+    )
+    if kwargs.get("failures") is not None:
+        kwargs["failures"].append(incomplete)
+    else:
+        try:
+            await asyncio.to_thread(save_incomplete_artist, None, incomplete)
+        except Exception as db_err:
+            print(f"[INCOMPLETE] Failed to save incomplete artist {spotify_id} to MySQL: {db_err}")
+    return False
+
+
+async def ingest_artist_batch_async(spotify_ids: List[str], user_tag: str,
+                                    incomplete_tags: Dict[str, Set[str]] = None,
+                                    failures: List[IncompleteArtist] = None,
+                                    completed: List[str] = None) -> List[str]:
+    """
+    Ingests a list of artists as one batch: one Spotify pass, concurrent
+    Last.fm/MusicBrainz enrichment, one implement_genre_data call and one
+    Neo4j export. Ids already being ingested by another request are joined
+    through single flight and only tagged, as in ingest_artist_coalesced_async.
+    Artists that fail are recorded as incomplete. Callers may pass prefetched
+    incomplete_tags and collect failures/completed to flush themselves;
+    otherwise MySQL is updated before returning. Returns the ids that were
+    ingested.
+    """
+    spotify_ids = list(dict.fromkeys(spotify_ids))
+    if not spotify_ids:
+        return []
+
+    flush = failures is None and completed is None
+    failures = [] if failures is None else failures
+    completed = [] if completed is None else completed
+
+    if incomplete_tags is None:
+        try:
+            incomplete_tags = await asyncio.to_thread(fetch_incomplete_tags, None, spotify_ids)
+        except Exception as e:
+            print(f"[WARN] Failed to fetch incomplete tags for batch: {e}")
+            incomplete_tags = {}
+
+    outcomes = await single_flight_many_async(
+        [f"ingest:{sid}" for sid in spotify_ids],
+        lambda keys: _ingest_claimed_batch_async(
+            [key[len("ingest:"):] for key in keys], user_tag, incomplete_tags, failures
+        )
+    )
+
+    succeeded, joined = [], []
+    for spotify_id in spotify_ids:
+        result, leader = outcomes[f"ingest:{spotify_id}"]
+        if leader:
+            if result:
+                succeeded.append(spotify_id)
+        elif result is True or isinstance(result, dict):
+            joined.append(spotify_id)
+        else:
+            failures.append(IncompleteArtist(
+                spotify_id=spotify_id,
+                user_tag=user_tag,
+                failure_reason="coalesced ingestion failed"
+            ))
+
+    if joined:
+        print(f"[CUSTOM] Joined {len(joined)} in-flight ingestions, adding userTag {user_tag}.")
+        try:
+            async with async_session() as session:
+                await add_user_tag_async(session, joined, user_tag)
+            succeeded += joined
+        except Exception as e:
+            print(f"[INCOMPLETE] Failed to tag {len(joined)} coalesced artists: {e}")
+            failures.extend(
+                IncompleteArtist(spotify_id=sid, user_tag=user_tag, failure_reason=str(e)) for sid in joined
+            )
+    completed.extend(succeeded)
+
+    if flush:
+        try:
+            await asyncio.to_thread(delete_incomplete_artists, None, [sid for sid in succeeded if sid in incomplete_tags])
+            await asyncio.to_thread(upsert_incomplete_artists, None, failures)
+        except Exception as db_err:
+            print(f"[INCOMPLETE] Failed to update incomplete_artists for batch: {db_err}")
+
+    return succeeded
+
+
+async def _ingest_claimed_batch_async(spotify_ids: List[str], user_tag: str, incomplete_tags: Dict[str, Set[str]],
+                                      failures: List[IncompleteArtist]) -> Dict[str, bool]:
+    artists = [
+        ArtistNode(
+            id=sid,
+            name="",
+            spotifyId=sid,
+            userTags=sorted({user_tag} | set(incomplete_tags.get(sid, set()))),
+            relatedArtists=[],
+            genres=[]
+        )
+        for sid in spotify_ids
+    ]
+
+    batch_error = None
+    try:
+        finalized = await enrich_artists_async(artists, user_tag=user_tag)
+    except Exception as e:
+        print(f"[INCOMPLETE] Batch enrichment failed for {len(spotify_ids)} artists: {e}")
+        finalized, batch_error = [], str(e)
+
+    finalized_ids = {id(artist) for artist in finalized}
+    exported = bool(finalized) and await export_artist_data_to_neo4j_async(finalized)
+    print(f"[BATCH] Enriched {len(finalized)}/{len(spotify_ids)} artists, export {'ok' if exported else 'failed'}.")
+
+    results = {}
+    for spotify_id, artist in zip(spotify_ids, artists):
+        results[f"ingest:{spotify_id}"] = exported and id(artist) in finalized_ids
+        if results[f"ingest:{spotify_id}"]:
+            continue
+        if batch_error:
+            reason = batch_error
+        elif not artist.name:
+            reason = "No Spotify data"
+        elif not artist.genres:
+            reason = "No genres found after data fetching"
+        else:
+            reason = "Neo4j export failed"
+        print(f"[INCOMPLETE] Failed to ingest artist {spotify_id}: {reason}")
+        failures.append(IncompleteArtist(
+            spotify_id=spotify_id,
+            user_tag=user_tag,
+            name=artist.name or "",
+            popularity=artist.popularity or 0,
+            image_url=artist.imageUrl or "",
+            failure_reason=reason
+        ))
+    return results
@@ -0,0 +1,144 @@
+import json
+import os
+from typing import Iterable, List, Optional, Tuple
+
+import redis
+
+from services.redis import async_redis_client, redis_client
+
+CHANGE_STREAM_KEY = "graph:changes"
+CHANGE_VERSION_KEY = "graph:changes:version"
+# Approximate cap on retained events; consumers further behind than this must resync from the graph
+CHANGE_STREAM_MAXLEN = int(os.getenv("CHANGE_STREAM_MAXLEN", "1000000"))
+# Events per script call, so a large sync does not hold Redis for one long command
+CHANGE_PUBLISH_CHUNK = 500
+
+ARTIST_UPSERTED = "artist.upsert"
+ARTIST_DELETED = "artist.delete"
+LABEL_ADDED = "label.add"
+LABEL_REMOVED = "label.remove"
+EDGE_ADDED = "edge.add"
+EDGE_REMOVED = "edge.remove"
+TAG_ADDED = "tag.add"
+TAG_REMOVED = "tag.remove"
+
+# Each event is an entry {v, type, id, data}. The version comes from one counter incremented in
+# the same script that appends, so stream order and version order always agree across writers.
+_PUBLISH_LUA = """
+local count = tonumber(ARGV[2])
+local version = redis.call('INCRBY', KEYS[2], count) - count
+for i = 0, count - 1 do
+    version = version + 1
+    redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*',
+        'v', version, 'type', ARGV[3 + i * 3], 'id', ARGV[4 + i * 3], 'data', ARGV[5 + i * 3])
+end
+return version
+"""
+
+_publish_script = redis_client.register_script(_PUBLISH_LUA)
+_publish_script_async = async_redis_client.register_script(_PUBLISH_LUA)
+
+ChangeEvent = Tuple[str, str, Optional[dict]]
+
+
+def change_event(event_type: str, artist_id: str, data: Optional[dict] = None) -> ChangeEvent:
+    return event_type, artist_id, data
+
+
+def _chunks(events: List[ChangeEvent]):
+    for start in range(0, len(events), CHANGE_PUBLISH_CHUNK):
+        chunk = events[start:start + CHANGE_PUBLISH_CHUNK]
+        args = [CHANGE_STREAM_MAXLEN, len(chunk)]
+        for event_type, artist_id, data in chunk:
+            args.extend([event_type, artist_id, json.dumps(data or {}, separators=(",", ":"), default=str)])
+        yield args
+
+
+def publish_changes(events: Iterable[ChangeEvent]) -> Optional[int]:
+    """
+    Appends events to the change stream in order. Returns the version of the
+    last event, or None if there was nothing to publish or Redis failed;
+    publishing never fails the write that produced the events.
+    """
+    events = list(events)
+    if not events:
+        return None
+    try:
+        version = None
+        for args in _chunks(events):
+            version = _publish_script(keys=[CHANGE_STREAM_KEY, CHANGE_VERSION_KEY], args=args)
+        print(f"[CHANGES] Published {len(events)} events up to version {version}.")
+        return version
+    except Exception as e:
+        print(f"[CHANGES] Failed to publish {len(events)} events: {e}")
+        return None
+
+
+async def publish_changes_async(events: Iterable[ChangeEvent]) -> Optional[int]:
+    events = list(events)
+    if not events:
+        return None
+    try:
+        version = None
+        for args in _chunks(events):
+            version = await _publish_script_async(keys=[CHANGE_STREAM_KEY, CHANGE_VERSION_KEY], args=args)
+        print(f"[CHANGES] Published {len(events)} events up to version {version}.")
+        return version
+    except Exception as e:
+        print(f"[CHANGES] Failed to publish {len(events)} events: {e}")
+        return None
+
+
+def get_change_version() -> int:
+    return int(redis_client.get(CHANGE_VERSION_KEY) or 0)
+
+
+def _decode(entries) -> List[Tuple[str, dict]]:
+    return [
+        (stream_id, {
+            "v": int(fields["v"]),
+            "type": fields["type"],
+            "id": fields["id"],
+            "data": json.loads(fields["data"]),
+        })
+        for stream_id, fields in entries
+        if fields
+    ]
+
+
+def read_changes_after(last_stream_id: str = "0", count: int = 1000) -> List[Tuple[str, dict]]:
+    """Stateless read for consumers that track their own position: entries strictly after last_stream_id."""
+    start = "-" if last_stream_id in ("0", "0-0") else f"({last_stream_id}"
+    return _decode(redis_client.xrange(CHANGE_STREAM_KEY, min=start, count=count))
+
+
+def ensure_consumer_group(group: str, start_id: str = "0"):
+    try:
+        redis_client.xgroup_create(CHANGE_STREAM_KEY, group, id=start_id, mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def read_changes(group: str, consumer: str, count: int = 100, block_ms: int = 5000) -> List[Tuple[str, dict]]:
+    """
+    Next batch for a consumer group member. Entries this consumer read but
+    never acknowledged are replayed first, so a consumer that crashed picks
+    up where it left off; then new entries, blocking up to block_ms.
+    """
+    pending = redis_client.xreadgroup(group, consumer, {CHANGE_STREAM_KEY: "0"}, count=count)
+    pending = pending[0][1] if pending else []
+    # Pending entries already trimmed from the stream come back without fields; drop them
+    ack_changes(group, [stream_id for stream_id, fields in pending if not fields])
+    entries = _decode(pending)
+    if entries:
+        return entries
+
+    fresh = redis_client.xreadgroup(group, consumer, {CHANGE_STREAM_KEY: ">"}, count=count, block=block_ms)
+    return _decode(fresh[0][1]) if fresh else []
+
+
+def ack_changes(group: str, stream_ids: List[str]) -> int:
+    if not stream_ids:
+        return 0
+    return redis_client.xack(CHANGE_STREAM_KEY, group, *stream_ids)
@@ -1,8 +1,13 @@
+import heapq
 import os
 import json
-from typing import List
+import tempfile
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 from model.artist_node import ArtistNode
+from services.entity_resolution import keyed_by_identity
+from utils.checkpoint import iter_json_array
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 data_dir = os.path.join(project_root, "data")
@@ -13,103 +18,237 @@ lastfm_path = os.path.join(temp_dir, "lastfmArtists.json")
 spotify_path = os.path.join(temp_dir, "spotifyArtists.json")
 musicbrainz_path = os.path.join(temp_dir, "musicBrainzArtists.json")
 genre_map_path = os.path.join(data_dir, "genreMap.json")
-output_path = os.path.join(temp_dir, "artistData.json")
 
+# Parsed once per process; implement_genre_data runs on the API event loop, so it must not re-read the file
+with open(genre_map_path, "r", encoding="utf-8") as f:
+    genre_map = json.load(f)
+output_path = os.path.join(temp_dir, "artistData.json")
 
-def normalize_name(name):
-    return ''.join(c.lower() for c in name if c.isalnum()).strip()
 
+# Build-side fields each source contributes to a merged artist; genres beyond the first three are never scored
+LASTFM_JOIN_FIELDS = ("name", "genres", "mbid", "similar", "imageUrl")
+MUSICBRAINZ_JOIN_FIELDS = ("name", "genres")
+# Build-side records held in memory before the join spills to disk partitions
+MERGE_MEMORY_LIMIT = int(os.getenv("MERGE_MEMORY_LIMIT", "200000"))
+MERGE_SPILL_PARTITIONS = int(os.getenv("MERGE_SPILL_PARTITIONS", "16"))
+
+
+def _source_records(records: Optional[Iterable[dict]], path: str) -> Iterable[dict]:
+    return iter_json_array(path) if records is None else records
+
+
+def _project(record: dict, fields: Tuple[str, ...]) -> dict:
+    projected = {field: record[field] for field in fields if field in record}
+    if "genres" in projected:
+        projected["genres"] = projected["genres"][:3]
+    return projected
+
+
+def _partition(key: str, partitions: int) -> int:
+    return zlib.crc32(key.encode("utf-8")) % partitions
+
+
+def merge_artist_record(spotify: dict, lastfm: Optional[dict], mb: Optional[dict], genre_map: dict) -> Optional[dict]:
+    """
+    Scores genres across the three sources and places the artist on the
+    genre map. Returns ArtistNode fields without a rank, or None when the
+    artist has no Last.fm/MusicBrainz match or no known genre.
+    """
+    if not lastfm and not mb:
+        return None
+
+    # Genre resolution
+    genre_scores = {}
+    for source in [lastfm, spotify, mb]:
+        if source and "genres" in source:
+            for idx, genre in enumerate(source["genres"][:3]):
+                g = genre.lower()
+                if g in genre_map:
+                    genre_scores[g] = genre_scores.get(g, 0) + (3 - idx)
+
+    genres = sorted(genre_scores.items(), key=lambda x: x[1], reverse=True)
+    genres = [g for g, _ in genres]
+
+    if not genres:
+        return None
+
+    top_genre = genres[0]
+    color = genre_map.get(top_genre, {}).get("color", "#cccccc")
+
+    # Coordinate calculation
+    x_total = 0
+    y_total = 0
+    weight_total = 0
+    for idx, g in enumerate(genres[:10]):
+        g_data = genre_map.get(g)
+        if g_data and "x" in g_data and "y" in g_data:
+            weight = 1 / (idx + 1)
+            x_total += g_data["x"] * weight
+            y_total += g_data["y"] * weight
+            weight_total += weight
+
+    x = x_total / weight_total if weight_total else None
+    y = y_total / weight_total if weight_total else None
+    image_url = spotify.get("imageUrl") or (lastfm.get("imageUrl") if lastfm else None)
+
+    return {
+        "id": spotify.get("spotifyId"),
+        "name": spotify["name"],
+        "genres": genres,
+        "popularity": spotify.get("popularity", 0),
+        "spotifyId": spotify.get("spotifyId"),
+        "spotifyUrl": spotify.get("spotifyUrl"),
+        "lastfmMBID": lastfm.get("mbid") if lastfm else None,
+        "imageUrl": image_url,
+        "relatedArtists": lastfm.get("similar", []) if lastfm else [],
+        "color": color,
+        "x": x,
+        "y": y,
+        "userTags": []
+    }
+
+
+class _SpillFiles:
+    """Append-only JSON-lines partition files for one side of the join."""
+
+    def __init__(self, directory: str, side: str, partitions: int):
+        self.paths = [os.path.join(directory, f"{side}_{i}.jsonl") for i in range(partitions)]
+        self.files = [open(path, "w", encoding="utf-8") for path in self.paths]
+
+    def write(self, key: str, value):
+        self.files[_partition(key, len(self.files))].write(json.dumps([key, value]) + "\n")
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+    def read(self, partition: int) -> Iterator[list]:
+        with open(self.paths[partition], "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def _build_tables(sources, spill_dir: str, memory_limit: int, partitions: int):
+    """
+    Hashes each build source by artist identity (see keyed_by_identity),
+    keeping the last record per identity. Returns (tables, spills): in-memory dicts while the combined size
+    stays under memory_limit, otherwise partitioned spill files.
+    """
+    tables = [{} for _ in sources]
+    spills = None
+    held = 0
+
+    for i, (records, fields) in enumerate(sources):
+        for key, record in keyed_by_identity(records):
+            value = _project(record, fields)
+            if spills is not None:
+                spills[i].write(key, value)
+                continue
+
+            held += key not in tables[i]
+            tables[i][key] = value
+            if held > memory_limit:
+                # Over budget: move everything held so far to disk and stream the rest straight there
+                spills = [_SpillFiles(spill_dir, f"build{j}", partitions) for j in range(len(sources))]
+                for table, spill in zip(tables, spills):
+                    for held_key, held_value in table.items():
+                        spill.write(held_key, held_value)
+                tables = None
+
+    if spills is not None:
+        for spill in spills:
+            spill.close()
+    return tables, spills
+
+
+def _join_partitioned(spotify_records: Iterable[dict], spills, spill_dir: str, partitions: int,
+                      genre_map: dict) -> Iterator[dict]:
+    probe = _SpillFiles(spill_dir, "probe", partitions)
+    for seq, (key, spotify) in enumerate(keyed_by_identity(spotify_records)):
+        probe.write(key, [seq, spotify])
+    probe.close()
+
+    # Join one partition at a time and write its output as a run sorted by Spotify position
+    runs = []
+    for partition in range(partitions):
+        lastfm_map = {key: value for key, value in spills[0].read(partition)}
+        musicbrainz_map = {key: value for key, value in spills[1].read(partition)}
+
+        seen = set()
+        merged = []
+        for key, (seq, spotify) in probe.read(partition):
+            if key in seen:
+                continue
+            seen.add(key)
+            fields = merge_artist_record(spotify, lastfm_map.get(key), musicbrainz_map.get(key), genre_map)
+            if fields:
+                merged.append((seq, fields))
+
+        run_path = os.path.join(spill_dir, f"run_{partition}.jsonl")
+        with open(run_path, "w", encoding="utf-8") as f:
+            for seq, fields in merged:
+                f.write(json.dumps([seq, fields]) + "\n")
+        runs.append(run_path)
+
+    def read_run(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    # Identities never span partitions, so merging the runs restores the original first-occurrence order
+    for _, fields in heapq.merge(*(read_run(path) for path in runs), key=lambda item: item[0]):
+        yield fields
 
 
 def combine_top_artist_data(
     write_to_file=False,
     lastfm_artists=None,
     spotify_artists=None,
-    musicbrainz_artists=None
+    musicbrainz_artists=None,
+    memory_limit: int = MERGE_MEMORY_LIMIT
 ) -> List[ArtistNode]:
-    if lastfm_artists is None:
-        with open(lastfm_path, "r", encoding="utf-8") as f:
-            lastfm_artists = json.load(f)
-    if spotify_artists is None:
-        with open(spotify_path, "r", encoding="utf-8") as f:
-            spotify_artists = json.load(f)
-    if musicbrainz_artists is None:
-        with open(musicbrainz_path, "r", encoding="utf-8") as f:
-            musicbrainz_artists = json.load(f)
-
-    with open(genre_map_path, "r", encoding="utf-8") as f:
-        genre_map = json.load(f)
-
-    lastfm_map = {normalize_name(a["name"]): a for a in lastfm_artists}
-    musicbrainz_map = {normalize_name(a["name"]): a for a in musicbrainz_artists}
-
-    seen = set()
-    merged: List[ArtistNode] = []
-    rankScore = 1
-
-    for spotify in spotify_artists:
-        norm_name = normalize_name(spotify["name"])
-        if norm_name in seen:
-            continue
-        seen.add(norm_name)
-
-        lastfm = lastfm_map.get(norm_name)
-        mb = musicbrainz_map.get(norm_name)
-        if not lastfm and not mb:
-            continue
-
-        # Genre resolution
-        genre_scores = {}
-        for source in [lastfm, spotify, mb]:
-            if source and "genres" in source:
-                for idx, genre in enumerate(source["genres"][:3]):
-                    g = genre.lower()
-                    if g in genre_map:
-                        genre_scores[g] = genre_scores.get(g, 0) + (3 - idx)
-
-        genres = sorted(genre_scores.items(), key=lambda x: x[1], reverse=True)
-        genres = [g for g, _ in genres]
-
-        if not genres:
-            continue
-
-        top_genre = genres[0]
-        color = genre_map.get(top_genre, {}).get("color", "#cccccc")
-
-        # Coordinate calculation
-        x_total = 0
-        y_total = 0
-        weight_total = 0
-        for idx, g in enumerate(genres[:10]):
-            g_data = genre_map.get(g)
-            if g_data and "x" in g_data and "y" in g_data:
-                weight = 1 / (idx + 1)
-                x_total += g_data["x"] * weight
-                y_total += g_data["y"] * weight
-                weight_total += weight
+    """
+    Joins the Spotify, Last.fm and MusicBrainz records on artist identity
+    (the entity index's canonical id, else the normalized name), in Spotify
+    order, keeping the first Spotify record and the last Last.fm/MusicBrainz
+    record per identity. Sources not passed in are streamed
+    from their temp files. Last.fm and MusicBrainz form the hash side, cut
+    down to the fields the merge reads; past memory_limit records both
+    sides are hash-partitioned to disk and joined one partition at a time.
+    """
+    spotify_records = _source_records(spotify_artists, spotify_path)
+    sources = [
+        (_source_records(lastfm_artists, lastfm_path), LASTFM_JOIN_FIELDS),
+        (_source_records(musicbrainz_artists, musicbrainz_path), MUSICBRAINZ_JOIN_FIELDS),
+    ]
+
+    with tempfile.TemporaryDirectory(dir=temp_dir, prefix="merge_") as spill_dir:
+        tables, spills = _build_tables(sources, spill_dir, memory_limit, MERGE_SPILL_PARTITIONS)
+
+        if spills is None:
+            lastfm_map, musicbrainz_map = tables
+
+            def in_memory():
+                seen = set()
+                for key, spotify in keyed_by_identity(spotify_records):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    fields = merge_artist_record(
+                        spotify, lastfm_map.get(key), musicbrainz_map.get(key), genre_map
+                    )
+                    if fields:
+                        yield fields
+
+            joined = in_memory()
+        else:
+            print(f"[MERGE] Build side exceeded {memory_limit} records, joining in {MERGE_SPILL_PARTITIONS} partitions.")
+            joined = _join_partitioned(spotify_records, spills, spill_dir, MERGE_SPILL_PARTITIONS, genre_map)
 
-        x = x_total / weight_total if weight_total else None
-        y = y_total / weight_total if weight_total else None
-        image_url = spotify.get("imageUrl") or (lastfm.get("imageUrl") if lastfm else None)
-
-        artist_node = ArtistNode(
-            id=spotify.get("spotifyId"),
-            name=spotify["name"],
-            genres=genres,
-            popularity=spotify.get("popularity", 0),
-            spotifyId=spotify.get("spotifyId"),
-            spotifyUrl=spotify.get("spotifyUrl"),
-            lastfmMBID=lastfm.get("mbid") if lastfm else None,
-            imageUrl=image_url,
-            relatedArtists=lastfm.get("similar", []) if lastfm else [],
-            color=color,
-            x=x,
-            y=y,
-            userTags=[],
-            rank=rankScore
-        )
-        rankScore += 1
-        merged.append(artist_node)
+        merged: List[ArtistNode] = [
+            ArtistNode(**fields, rank=rankScore)
+            for rankScore, fields in enumerate(joined, start=1)
+        ]
 
     # if write_to_file:
     #     with open(output_path, "w", encoding="utf-8") as f:
@@ -119,9 +258,6 @@ def combine_top_artist_data(
 
 
 def implement_genre_data(artists: List[ArtistNode], top_artists: bool = False) -> List[ArtistNode]:
-    with open(genre_map_path, "r", encoding="utf-8") as f:
-        genre_map = json.load(f)
-
     finalized = []
     rankScore = 1
 
@@ -0,0 +1,119 @@
+import asyncio
+import os
+from typing import List, Set, Tuple
+
+from dotenv import load_dotenv
+
+from model.artist_node import ArtistNode
+from services import http_client
+from services.entity_resolution import NORMALIZED_NAME, get_entity_index, normalize_name
+from services.lastfm import apply_artist_info, fetch_artist_info_async
+from services.musicbrainz import MAX_ARTIST_COUNT
+from services.spotify import MAX_ARTIST_LOOKUP
+
+load_dotenv()
+
+CRAWL_RELATED_ARTISTS = os.getenv("CRAWL_RELATED_ARTISTS", "false").lower() == "true"
+# Hops away from the chart; depth 1 adds the chart's similar artists, depth 2 theirs, and so on
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "2"))
+# Upper bound on newly discovered artists, which is also the bound on Last.fm lookups. Never more than
+# the MusicBrainz and Spotify stages will process, so nothing crawled is dropped afterwards
+CRAWL_MAX_ARTISTS = min(
+    int(os.getenv("CRAWL_MAX_ARTISTS", str(min(MAX_ARTIST_COUNT, MAX_ARTIST_LOOKUP)))),
+    MAX_ARTIST_COUNT,
+    MAX_ARTIST_LOOKUP
+)
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+
+
+async def _fetch_info(name: str, slots: asyncio.Semaphore) -> Tuple[dict, List[str]]:
+    async with slots:
+        try:
+            return await fetch_artist_info_async(name)
+        except Exception as e:
+            print(f"[CRAWL] Failed to fetch details for {name}: {e}")
+            return None, []
+
+
+def _known_names(keys: List[str]) -> Set[str]:
+    # Artists already in the graph are kept fresh by the refresh scheduler, not re-crawled every run
+    try:
+        return set(get_entity_index().lookup_many(NORMALIZED_NAME, keys))
+    except Exception as e:
+        print(f"[CRAWL] Entity index unavailable, not skipping known artists: {e}")
+        return set()
+
+
+async def crawl_related_artists_async(seeds: List[ArtistNode], max_depth: int = CRAWL_MAX_DEPTH,
+                                      max_artists: int = CRAWL_MAX_ARTISTS,
+                                      concurrency: int = CRAWL_CONCURRENCY) -> List[ArtistNode]:
+    """
+    Breadth-first expansion over Last.fm similar-artist links, starting from
+    the relatedArtists of the seeds. Each level is fetched concurrently
+    (artist.getinfo + artist.getsimilar) and deduped against everything seen
+    so far and against artists already in the graph (through the entity
+    index), by normalized name before fetching and by MBID after. Stops at
+    max_depth or once max_artists new artists have been queued. Returns the
+    new artists with Last.fm data applied, in discovery order, ready for the
+    MusicBrainz and Spotify stages.
+    """
+    seen_names = {normalize_name(artist.name) for artist in seeds if artist.name}
+    seen_mbids = {artist.lastfmMBID for artist in seeds if artist.lastfmMBID}
+    slots = asyncio.Semaphore(concurrency)
+
+    discovered: List[ArtistNode] = []
+    queued = 0
+    level = seeds
+
+    for depth in range(1, max_depth + 1):
+        candidates = {}
+        for artist in level:
+            for name in artist.relatedArtists or []:
+                key = normalize_name(name or "")
+                if key and key not in seen_names and key not in candidates:
+                    candidates[key] = name
+        known = _known_names(list(candidates))
+        seen_names.update(candidates)
+
+        frontier = [name for key, name in candidates.items() if key not in known][:max(max_artists - queued, 0)]
+        queued += len(frontier)
+
+        if not frontier:
+            break
+
+        results = await asyncio.gather(*(_fetch_info(name, slots) for name in frontier))
+
+        level = []
+        for name, (info, similar) in zip(frontier, results):
+            if not info:
+                continue
+            mbid = info.get("mbid")
+            if mbid and mbid in seen_mbids:
+                continue
+            if mbid:
+                seen_mbids.add(mbid)
+
+            artist = ArtistNode(id=None, name=name, genres=[], userTags=[], relatedArtists=[])
+            apply_artist_info(artist, info, similar)
+            level.append(artist)
+
+        discovered.extend(level)
+        print(f"[CRAWL] Depth {depth}: skipped {len(known)} known, fetched {len(frontier)}, kept {len(level)} "
+              f"(total discovered: {len(discovered)}).")
+
+        if queued >= max_artists:
+            print(f"[CRAWL] Reached the {max_artists} artist budget.")
+            break
+
+    return discovered
+
+
+def crawl_related_artists(seeds: List[ArtistNode], max_depth: int = CRAWL_MAX_DEPTH,
+                          max_artists: int = CRAWL_MAX_ARTISTS) -> List[ArtistNode]:
+    async def run():
+        try:
+            return await crawl_related_artists_async(seeds, max_depth=max_depth, max_artists=max_artists)
+        finally:
+            await http_client.close_async_client()
+
+    return asyncio.run(run())
@@ -0,0 +1,222 @@
+import os
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from model.artist_node import ArtistNode
+from services.redis import redis_client
+
+load_dotenv()
+
+NORMALIZE_CACHE_SIZE = int(os.getenv("NORMALIZE_CACHE_SIZE", "262144"))
+
+ALIAS_KEY_PREFIX = "entity:alias:"
+# Fields per HSET/HMGET, so a large export does not hold Redis for one long command
+ALIAS_BATCH_SIZE = 1000
+
+# Alias kinds, in the order resolve() trusts them
+SPOTIFY_ID = "spotify"
+MBID = "mbid"
+LASTFM_NAME = "lastfm"
+NORMALIZED_NAME = "name"
+ALIAS_KINDS = (SPOTIFY_ID, MBID, LASTFM_NAME, NORMALIZED_NAME)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_name(name):
+    """
+    Identity key for an artist name: NFKC-folded (so full-width and
+    compatibility forms match their plain forms), case-folded, and reduced
+    to letters and digits. Plain ASCII names normalize exactly as before.
+    """
+    folded = unicodedata.normalize("NFKC", name or "").casefold()
+    return ''.join(c for c in folded if c.isalnum()).strip()
+
+
+class EntityIndex:
+    """
+    Shared map from every identifier a source gives an artist (Spotify ID,
+    MBID, Last.fm name, normalized name) to its canonical id, the id the
+    graph uses. Backed by one Redis hash per alias kind, so every worker,
+    container and cron run sees the same aliases. Writes are buffered until
+    flush().
+    """
+
+    def __init__(self, client=redis_client):
+        self.client = client
+        # API workers call the sync exporter from a thread pool, so buffer writes under a lock
+        self.lock = threading.Lock()
+        self.pending: Dict[Tuple[str, str], str] = {}
+
+    def __len__(self):
+        pipe = self.client.pipeline()
+        for kind in ALIAS_KINDS:
+            pipe.hlen(alias_key(kind))
+        return sum(pipe.execute())
+
+    def lookup(self, kind: str, value: Optional[str]) -> Optional[str]:
+        return self.client.hget(alias_key(kind), value) if value else None
+
+    def lookup_many(self, kind: str, values: Iterable[Optional[str]]) -> Dict[str, str]:
+        values = list({value for value in values if value})
+        found = {}
+        for start in range(0, len(values), ALIAS_BATCH_SIZE):
+            chunk = values[start:start + ALIAS_BATCH_SIZE]
+            for value, canonical_id in zip(chunk, self.client.hmget(alias_key(kind), chunk)):
+                if canonical_id:
+                    found[value] = canonical_id
+        return found
+
+    def resolve(self, name: Optional[str] = None, mbid: Optional[str] = None,
+                spotify_id: Optional[str] = None) -> Optional[str]:
+        return (
+            self.lookup(SPOTIFY_ID, spotify_id)
+            or self.lookup(MBID, mbid)
+            or self.lookup(LASTFM_NAME, name)
+            or self.lookup(NORMALIZED_NAME, normalize_name(name) if name else None)
+        )
+
+    def resolve_artist(self, artist: ArtistNode) -> Optional[str]:
+        return self.resolve(name=artist.name, mbid=artist.lastfmMBID, spotify_id=artist.spotifyId)
+
+    def resolve_artists(self, artists: List[ArtistNode]) -> List[Optional[str]]:
+        """resolve_artist for many artists, with one HMGET per alias kind instead of a round trip each."""
+        return self._resolve_many([(artist.name, artist.lastfmMBID, artist.spotifyId) for artist in artists])
+
+    def resolve_records(self, records: List[dict]) -> List[Optional[str]]:
+        """resolve_artists for source records (checkpoint dicts or raw Last.fm entries)."""
+        return self._resolve_many([
+            (record.get("name"), record.get("lastfmMBID") or record.get("mbid"), record.get("spotifyId"))
+            for record in records
+        ])
+
+    def _resolve_many(self, identities: List[Tuple[Optional[str], Optional[str], Optional[str]]]) -> List[Optional[str]]:
+        by_spotify_id = self.lookup_many(SPOTIFY_ID, (spotify_id for _, _, spotify_id in identities))
+        by_mbid = self.lookup_many(MBID, (mbid for _, mbid, _ in identities))
+        by_name = self.lookup_many(LASTFM_NAME, (name for name, _, _ in identities))
+        by_normalized = self.lookup_many(NORMALIZED_NAME, (normalize_name(name or "") for name, _, _ in identities))
+        return [
+            by_spotify_id.get(spotify_id)
+            or by_mbid.get(mbid)
+            or by_name.get(name)
+            or (by_normalized.get(normalize_name(name)) if name else None)
+            for name, mbid, spotify_id in identities
+        ]
+
+    def register(self, canonical_id: str, name: Optional[str] = None, mbid: Optional[str] = None,
+                 spotify_id: Optional[str] = None):
+        if not canonical_id:
+            return
+        with self.lock:
+            self._register(canonical_id, name, mbid, spotify_id)
+
+    def _register(self, canonical_id: str, name: Optional[str], mbid: Optional[str], spotify_id: Optional[str]):
+        for kind, value in (
+            (SPOTIFY_ID, spotify_id),
+            (MBID, mbid),
+            (LASTFM_NAME, name),
+            (NORMALIZED_NAME, normalize_name(name) if name else None),
+        ):
+            if value:
+                self.pending[(kind, value)] = canonical_id
+
+    def register_artists(self, artists: Iterable[ArtistNode]):
+        for artist in artists:
+            self.register(artist.id, name=artist.name, mbid=artist.lastfmMBID, spotify_id=artist.spotifyId)
+
+    def flush(self) -> int:
+        with self.lock:
+            if not self.pending:
+                return 0
+            by_kind: Dict[str, Dict[str, str]] = {}
+            for (kind, value), canonical_id in self.pending.items():
+                by_kind.setdefault(kind, {})[value] = canonical_id
+
+            pipe = self.client.pipeline(transaction=False)
+            for kind, mapping in by_kind.items():
+                items = list(mapping.items())
+                for start in range(0, len(items), ALIAS_BATCH_SIZE):
+                    pipe.hset(alias_key(kind), mapping=dict(items[start:start + ALIAS_BATCH_SIZE]))
+            pipe.execute()
+
+            written = len(self.pending)
+            self.pending.clear()
+            return written
+
+
+def alias_key(kind: str) -> str:
+    return f"{ALIAS_KEY_PREFIX}{kind}"
+
+
+_entity_index: Optional[EntityIndex] = None
+
+
+def get_entity_index() -> EntityIndex:
+    global _entity_index
+    if _entity_index is None:
+        _entity_index = EntityIndex()
+    return _entity_index
+
+
+def record_exported_artists(artists: Iterable[ArtistNode]):
+    # The graph is the source of truth; the index only remembers identities it has accepted
+    try:
+        index = get_entity_index()
+        index.register_artists(artists)
+        written = index.flush()
+        if written:
+            print(f"[ENTITY] Recorded {written} new aliases ({len(index)} total).")
+    except Exception as e:
+        print(f"[ENTITY] Failed to update entity index: {e}")
+
+
+def _identity_keys(canonical_ids: List[Optional[str]], names: List[Optional[str]]) -> List[str]:
+    # Canonical ids and name keys live in one key space, so prefix the fallback
+    return [
+        canonical_id or f"name:{normalize_name(name or '')}"
+        for canonical_id, name in zip(canonical_ids, names)
+    ]
+
+
+def identity_keys(artists: List[ArtistNode]) -> List[str]:
+    """
+    Dedupe key per artist for the pipeline stages: the canonical id the
+    entity index resolves it to, so aliases of an exported artist (another
+    spelling, the same MBID or Spotify ID) collapse onto one key. Artists
+    the index has not seen, or every artist while Redis is down, fall back
+    to their normalized name.
+    """
+    canonical_ids: List[Optional[str]] = [None] * len(artists)
+    try:
+        canonical_ids = get_entity_index().resolve_artists(artists)
+    except Exception as e:
+        print(f"[ENTITY] Entity index unavailable, deduping by name: {e}")
+    return _identity_keys(canonical_ids, [artist.name for artist in artists])
+
+
+def keyed_by_identity(records: Iterable[dict]) -> Iterator[Tuple[str, dict]]:
+    """identity_keys for a stream of source records, resolved ALIAS_BATCH_SIZE records at a time."""
+    index_available = True
+    batch: List[dict] = []
+
+    def resolve(chunk: List[dict]) -> List[Tuple[str, dict]]:
+        nonlocal index_available
+        canonical_ids: List[Optional[str]] = [None] * len(chunk)
+        if index_available:
+            try:
+                canonical_ids = get_entity_index().resolve_records(chunk)
+            except Exception as e:
+                index_available = False
+                print(f"[ENTITY] Entity index unavailable, joining by name: {e}")
+        return list(zip(_identity_keys(canonical_ids, [record.get("name") for record in chunk]), chunk))
+
+    for record in records:
+        batch.append(record)
+        if len(batch) >= ALIAS_BATCH_SIZE:
+            yield from resolve(batch)
+            batch = []
+    if batch:
+        yield from resolve(batch)
@@ -0,0 +1,286 @@
+import gzip
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import neo4j
+from dotenv import load_dotenv
+
+from services.redis import async_binary_redis_client, binary_redis_client
+from services.tile_index import TileIndex, encode_tiles, nodes_from_snapshot_json, tile_field, tiles_key
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USER = os.getenv("NEO4J_USER")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_ARTISTS_DB = os.getenv("NEO4J_ARTISTS_DB")
+
+SNAPSHOT_TTL_SECONDS = int(os.getenv("GRAPH_SNAPSHOT_TTL_SECONDS", str(7 * 24 * 3600)))
+SNAPSHOT_CURRENT_KEY = "graph:snapshot:current"
+# How long API replicas trust their cached copy of the current version pointer
+SNAPSHOT_POINTER_CACHE_SECONDS = float(os.getenv("GRAPH_SNAPSHOT_POINTER_CACHE_SECONDS", "5"))
+
+SNAPSHOT_FORMATS = ("json", "binary")
+SNAPSHOT_ENCODINGS = ("br", "gzip", "identity") if brotli else ("gzip", "identity")
+
+# Binary layout (little endian): header, then one column per field, then edges, then strings.
+#   header   magic "SWG1", uint16 format version, uint32 node count, uint32 edge count
+#   float32  x[n], y[n]
+#   uint8    popularity[n]
+#   uint32   rank[n] (0 = unranked), color[n] as 0xRRGGBB
+#   uint32   edges[2 * e] as (source index, target index) pairs
+#   strings  id, name, imageUrl per node, each uint16 byte length + utf-8 bytes
+BINARY_MAGIC = b"SWG1"
+BINARY_VERSION = 1
+_BINARY_HEADER = struct.Struct("<4sHII")
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+snapshot_dir = os.path.join(project_root, "data", "snapshots")
+
+TOP_ARTIST_NODES_QUERY = """
+MATCH (a:Artist:TopArtist)
+RETURN a.id AS id, a.name AS name, a.x AS x, a.y AS y, a.color AS color,
+       a.popularity AS popularity, a.rank AS rank, a.imageUrl AS imageUrl
+ORDER BY a.rank, a.id
+"""
+
+TOP_ARTIST_EDGES_QUERY = """
+MATCH (a:Artist:TopArtist)-[:RELATED_TO]->(b:Artist:TopArtist)
+RETURN a.id AS source, b.id AS target
+"""
+
+VERSIONED_NODES_QUERY = """
+MATCH (:TopArtistSet {version: $version})-[m:INCLUDES]->(a:Artist)
+RETURN a.id AS id, a.name AS name, a.x AS x, a.y AS y, a.color AS color,
+       a.popularity AS popularity, m.rank AS rank, a.imageUrl AS imageUrl
+ORDER BY m.rank, a.id
+"""
+
+VERSIONED_EDGES_QUERY = """
+MATCH (a:Artist)-[:RELATED_TO {version: $version}]->(b:Artist)
+RETURN a.id AS source, b.id AS target
+"""
+
+
+def snapshot_key(version: str, fmt: str, encoding: str) -> str:
+    return f"graph:snapshot:{version}:{fmt}:{encoding}"
+
+
+def snapshot_etag(version: str, fmt: str, encoding: str) -> str:
+    return f"\"{version}-{fmt}-{encoding}\""
+
+
+def load_top_artist_graph(session, version: Optional[str] = None) -> Tuple[List[dict], List[Tuple[int, int]]]:
+    """
+    Reads the published top-artist graph: the given TopArtistSet version when
+    publishing is versioned, otherwise every TopArtist. Edges are returned as
+    index pairs into the node list.
+    """
+    params = {"version": version} if version else {}
+    nodes_query = VERSIONED_NODES_QUERY if version else TOP_ARTIST_NODES_QUERY
+    nodes = [record.data() for record in session.run(nodes_query, params)]
+    index = {node["id"]: i for i, node in enumerate(nodes)}
+
+    edges = set()
+    for record in session.run(VERSIONED_EDGES_QUERY if version else TOP_ARTIST_EDGES_QUERY, params):
+        source, target = index.get(record["source"]), index.get(record["target"])
+        if source is not None and target is not None and source != target:
+            edges.add((min(source, target), max(source, target)))
+    return nodes, sorted(edges)
+
+
+def encode_snapshot_json(version: str, nodes: List[dict], edges: List[Tuple[int, int]]) -> bytes:
+    # Columnar arrays and flat edge pairs keep the payload small and fast to parse
+    payload = {
+        "version": version,
+        "nodes": {
+            field: [node.get(field) for node in nodes]
+            for field in ("id", "name", "x", "y", "color", "popularity", "rank", "imageUrl")
+        },
+        "edges": [i for edge in edges for i in edge]
+    }
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def _color_to_int(color: Optional[str]) -> int:
+    try:
+        return int((color or "").lstrip("#")[:6], 16)
+    except ValueError:
+        return 0
+
+
+def _pack_string(value: Optional[str]) -> bytes:
+    raw = (value or "").encode("utf-8")[:0xFFFF]
+    return struct.pack("<H", len(raw)) + raw
+
+
+def encode_snapshot_binary(nodes: List[dict], edges: List[Tuple[int, int]]) -> bytes:
+    columns = [
+        array("f", (float(node.get("x") or 0.0) for node in nodes)),
+        array("f", (float(node.get("y") or 0.0) for node in nodes)),
+        array("B", (max(0, min(int(node.get("popularity") or 0), 255)) for node in nodes)),
+        array("I", (int(node.get("rank") or 0) for node in nodes)),
+        array("I", (_color_to_int(node.get("color")) for node in nodes)),
+        array("I", (i for edge in edges for i in edge)),
+    ]
+    parts = [_BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(nodes), len(edges))]
+    for column in columns:
+        if column.itemsize > 1 and sys.byteorder == "big":
+            column.byteswap()
+        parts.append(column.tobytes())
+    for field in ("id", "name", "imageUrl"):
+        parts.extend(_pack_string(node.get(field)) for node in nodes)
+    return b"".join(parts)
+
+
+def compress_variants(raw: bytes) -> Dict[str, bytes]:
+    variants = {"identity": raw, "gzip": gzip.compress(raw, compresslevel=9)}
+    if brotli:
+        variants["br"] = brotli.compress(raw, quality=11)
+    return variants
+
+
+def publish_graph_snapshot(version: str, versioned: bool = False, write_to_file: bool = False) -> Optional[str]:
+    """
+    Materializes the published top-artist graph as JSON and binary snapshots,
+    pre-compressed, stores them in Redis under the version and points the
+    current key at it. Returns the version, or None on failure.
+    """
+    driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    session = driver.session(database=NEO4J_ARTISTS_DB)
+
+    try:
+        nodes, edges = load_top_artist_graph(session, version if versioned else None)
+    except Exception as e:
+        print(f"[SNAPSHOT] Failed to read top artist graph for version {version}: {e}")
+        return None
+    finally:
+        session.close()
+        driver.close()
+
+    encoded = {
+        "json": encode_snapshot_json(version, nodes, edges),
+        "binary": encode_snapshot_binary(nodes, edges),
+    }
+
+    variants = [
+        (fmt, encoding, body)
+        for fmt, raw in encoded.items()
+        for encoding, body in compress_variants(raw).items()
+    ]
+
+    tiles = encode_tiles(TileIndex(nodes))
+
+    try:
+        pipe = binary_redis_client.pipeline(transaction=False)
+        for fmt, encoding, body in variants:
+            pipe.set(snapshot_key(version, fmt, encoding), body, ex=SNAPSHOT_TTL_SECONDS)
+        if tiles:
+            pipe.hset(tiles_key(version), mapping=tiles)
+            pipe.expire(tiles_key(version), SNAPSHOT_TTL_SECONDS)
+        # Flip the pointer last so readers never see a version whose payloads are missing
+        pipe.set(SNAPSHOT_CURRENT_KEY, version)
+        pipe.execute()
+    except Exception as e:
+        print(f"[SNAPSHOT] Failed to store snapshot {version} in Redis: {e}")
+        return None
+
+    if write_to_file:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        for fmt, encoding, body in variants:
+            suffix = {"identity": "", "gzip": ".gz", "br": ".br"}[encoding]
+            with open(os.path.join(snapshot_dir, f"graph.{fmt}{suffix}"), "wb") as f:
+                f.write(body)
+
+    sizes = ", ".join(f"{fmt} {len(raw)}B" for fmt, raw in encoded.items())
+    print(f"[SNAPSHOT] Published version {version}: {len(nodes)} artists, {len(edges)} edges, {len(tiles)} tiles "
+          f"({sizes}, hash {hashlib.sha1(encoded['json']).hexdigest()[:12]}).")
+    return version
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> str:
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+
+    for encoding in SNAPSHOT_ENCODINGS:
+        if encoding == "identity":
+            return encoding
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+# Per-process copy of the current snapshot bodies; replaced wholesale when the version changes
+_served = {"version": None, "checkedAt": 0.0, "bodies": {}, "tileIndex": None}
+
+
+async def get_current_snapshot_version() -> Optional[str]:
+    if _served["version"] and time.monotonic() - _served["checkedAt"] < SNAPSHOT_POINTER_CACHE_SECONDS:
+        return _served["version"]
+
+    version = await async_binary_redis_client.get(SNAPSHOT_CURRENT_KEY)
+    version = version.decode("utf-8") if version else None
+    if version != _served["version"]:
+        _served["bodies"] = {}
+        _served["tileIndex"] = None
+    _served["version"] = version
+    _served["checkedAt"] = time.monotonic()
+    return version
+
+
+async def get_snapshot_body(version: str, fmt: str, encoding: str) -> Optional[bytes]:
+    cache_key = (version, fmt, encoding)
+    body = _served["bodies"].get(cache_key)
+    if body is None:
+        body = await async_binary_redis_client.get(snapshot_key(version, fmt, encoding))
+        if body is not None and version == _served["version"]:
+            _served["bodies"][cache_key] = body
+    return body
+
+
+async def get_tile_body(version: str, z: int, x: int, y: int) -> Optional[bytes]:
+    return await async_binary_redis_client.hget(tiles_key(version), tile_field(z, x, y))
+
+
+async def get_tile_index(version: str) -> Optional[TileIndex]:
+    # Built once per version from the stored snapshot, then every viewport query is in-memory
+    index = _served["tileIndex"]
+    if index is not None and index.version == version:
+        return index
+
+    body = await get_snapshot_body(version, "json", "identity")
+    if body is None:
+        return None
+    index = TileIndex(nodes_from_snapshot_json(body))
+    index.version = version
+    if version == _served["version"]:
+        _served["tileIndex"] = index
+    return index
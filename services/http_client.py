@@ -0,0 +1,71 @@
+from typing import Optional
+from urllib.parse import urlparse
+
+import httpx
+import requests
+
+from services.rate_limiter import acquire, acquire_async, report_throttled, report_throttled_async
+
+ASYNC_MAX_CONNECTIONS = 200
+
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _retry_after_seconds(response) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def request(method: str, url: str, credential: Optional[str] = None, **kwargs) -> requests.Response:
+    # Every upstream call goes through the shared limiter keyed by host + credential
+    host = urlparse(url).hostname or ""
+    acquire(host, credential)
+    response = requests.request(method, url, **kwargs)
+    if response.status_code == 429:
+        report_throttled(host, credential, _retry_after_seconds(response))
+    return response
+
+
+def get(url: str, credential: Optional[str] = None, **kwargs) -> requests.Response:
+    return request("GET", url, credential=credential, **kwargs)
+
+
+def post(url: str, credential: Optional[str] = None, **kwargs) -> requests.Response:
+    return request("POST", url, credential=credential, **kwargs)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    # One pooled client per process so concurrent ingestions reuse upstream connections
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=50)
+        )
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def request_async(method: str, url: str, credential: Optional[str] = None, **kwargs) -> httpx.Response:
+    host = urlparse(url).hostname or ""
+    await acquire_async(host, credential)
+    response = await get_async_client().request(method, url, **kwargs)
+    if response.status_code == 429:
+        await report_throttled_async(host, credential, _retry_after_seconds(response))
+    return response
+
+
+async def get_async(url: str, credential: Optional[str] = None, **kwargs) -> httpx.Response:
+    return await request_async("GET", url, credential=credential, **kwargs)
+
+
+async def post_async(url: str, credential: Optional[str] = None, **kwargs) -> httpx.Response:
+    return await request_async("POST", url, credential=credential, **kwargs)
@@ -0,0 +1,87 @@
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import neo4j
+from dotenv import load_dotenv
+
+from main import ingest_artist_coalesced
+from services.job_queue import dequeue_ingest_item, mark_job_started, record_job_result
+
+load_dotenv()
+
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USER = os.getenv("NEO4J_USER")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_ARTISTS_DB = os.getenv("NEO4J_ARTISTS_DB")
+
+INGEST_WORKER_CONCURRENCY = int(os.getenv("INGEST_WORKER_CONCURRENCY", "4"))
+INGEST_WORKER_POLL_INTERVAL_SECONDS = float(os.getenv("INGEST_WORKER_POLL_INTERVAL_SECONDS", "1"))
+
+stop_event = threading.Event()
+
+
+def process_ingest_item(driver, item: dict):
+    job_id = item["jobId"]
+    started = time.perf_counter()
+    succeeded = False
+    try:
+        mark_job_started(job_id)
+        with driver.session(database=NEO4J_ARTISTS_DB) as session:
+            succeeded = ingest_artist_coalesced(
+                item["spotifyId"],
+                item["userTag"],
+                session=session,
+                already_exists=item.get("alreadyExists", False)
+            )
+    except Exception as e:
+        print(f"[WORKER] Unexpected error ingesting {item['spotifyId']} for job {job_id}: {e}")
+    finally:
+        progress = record_job_result(job_id, succeeded, receipt=item.get("receipt"))
+        print(f"[WORKER] Job {job_id}: {item['spotifyId']} {'ok' if succeeded else 'failed'} "
+              f"in {time.perf_counter() - started:.1f}s ({progress['processed']}/{progress['total']})")
+
+
+def run_ingest_worker(concurrency: int = INGEST_WORKER_CONCURRENCY):
+    print(f"[WORKER] Ingest worker started with concurrency {concurrency}.")
+    driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def run(item):
+        try:
+            process_ingest_item(driver, item)
+        finally:
+            slots.release()
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while not stop_event.is_set():
+                slots.acquire()
+                try:
+                    item = dequeue_ingest_item()
+                except Exception as e:
+                    print(f"[WORKER] Failed to dequeue: {e}")
+                    item = None
+
+                if item is None:
+                    slots.release()
+                    stop_event.wait(INGEST_WORKER_POLL_INTERVAL_SECONDS)
+                    continue
+
+                pool.submit(run, item)
+    finally:
+        driver.close()
+        print("[WORKER] Ingest worker stopped.")
+
+
+def _handle_stop(signum, frame):
+    print(f"[WORKER] Received signal {signum}, draining in-flight ingestions...")
+    stop_event.set()
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+    run_ingest_worker()
@@ -0,0 +1,175 @@
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from services.redis import redis_client
+
+JOB_TTL_SECONDS = int(os.getenv("INGEST_JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+# An item not acknowledged within this long is assumed lost with its worker and handed out again
+INGEST_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("INGEST_VISIBILITY_TIMEOUT_SECONDS", "900"))
+
+JOB_KEY_PREFIX = "ingest:job:"
+QUEUE_KEY_PREFIX = "ingest:queue:"
+ACTIVE_USERS_KEY = "ingest:active_users"
+ACTIVE_USERS_SET_KEY = "ingest:active_users:set"
+PROCESSING_KEY = "ingest:processing"
+
+# Per-user FIFO queues plus a ring of users that have pending work. Enqueue adds the user to
+# the ring once; dequeue rotates the ring and pops one item from the next user's queue, so a
+# 500-artist list from one user cannot starve a 5-artist list from another.
+# A dequeued item moves into a processing set scored by its deadline until record_job_result
+# acknowledges it; expired items go back to the front of their user's queue on the next dequeue.
+_enqueue_script = redis_client.register_script("""
+for i = 2, #ARGV do
+    redis.call('RPUSH', KEYS[1], ARGV[i])
+end
+if redis.call('SADD', KEYS[3], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+end
+return #ARGV - 1
+""")
+
+_dequeue_script = redis_client.register_script("""
+local now = tonumber(ARGV[2])
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now, 'LIMIT', 0, 100)
+for _, item in ipairs(expired) do
+    redis.call('ZREM', KEYS[3], item)
+    local user = cjson.decode(item)['userTag']
+    redis.call('LPUSH', ARGV[1] .. user, item)
+    if redis.call('SADD', KEYS[2], user) == 1 then
+        redis.call('RPUSH', KEYS[1], user)
+    end
+end
+
+local users = redis.call('LLEN', KEYS[1])
+for i = 1, users do
+    local user = redis.call('RPOPLPUSH', KEYS[1], KEYS[1])
+    local queue = ARGV[1] .. user
+    local item = redis.call('LPOP', queue)
+    if redis.call('LLEN', queue) == 0 then
+        redis.call('LREM', KEYS[1], 0, user)
+        redis.call('SREM', KEYS[2], user)
+    end
+    if item then
+        redis.call('ZADD', KEYS[3], now + tonumber(ARGV[3]), item)
+        return item
+    end
+end
+return false
+""")
+
+# Only a queued job becomes running, and only while its hash exists: a lease handed out again after
+# the job completed (or expired) must neither reopen it nor recreate it without a TTL.
+_mark_started_script = redis_client.register_script("""
+if redis.call('HGET', KEYS[1], 'status') == 'queued' then
+    redis.call('HSET', KEYS[1], 'status', 'running', 'updatedAt', ARGV[1])
+    return 1
+end
+return 0
+""")
+
+# Acknowledges the item and updates the counters and status together. An item that is no longer
+# in the processing set was requeued and acknowledged by another worker, so it is not counted twice.
+_record_result_script = redis_client.register_script("""
+if ARGV[3] ~= '' and redis.call('ZREM', KEYS[2], ARGV[3]) == 0 then
+    local job = redis.call('HMGET', KEYS[1], 'processed', 'total', 'status')
+    return {tonumber(job[1] or '0'), tonumber(job[2] or '0'), job[3] or 'running'}
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {0, 0, 'expired'}
+end
+local processed = redis.call('HINCRBY', KEYS[1], 'processed', 1)
+redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+local total = tonumber(redis.call('HGET', KEYS[1], 'total') or '0')
+local status = 'running'
+if processed >= total then
+    status = 'completed'
+end
+redis.call('HSET', KEYS[1], 'status', status, 'updatedAt', ARGV[2])
+return {processed, total, status}
+""")
+
+
+def job_key(job_id: str) -> str:
+    return f"{JOB_KEY_PREFIX}{job_id}"
+
+
+def queue_key(user_tag: str) -> str:
+    return f"{QUEUE_KEY_PREFIX}{user_tag}"
+
+
+def enqueue_ingest_job(user_tag: str, spotify_ids: List[str], existing_ids: Optional[set] = None) -> str:
+    job_id = uuid.uuid4().hex
+    now = datetime.now(timezone.utc).isoformat()
+    existing_ids = existing_ids or set()
+
+    pipe = redis_client.pipeline()
+    pipe.hset(job_key(job_id), mapping={
+        "jobId": job_id,
+        "userTag": user_tag,
+        "status": "queued" if spotify_ids else "completed",
+        "total": len(spotify_ids),
+        "processed": 0,
+        "succeeded": 0,
+        "failed": 0,
+        "createdAt": now,
+        "updatedAt": now
+    })
+    pipe.expire(job_key(job_id), JOB_TTL_SECONDS)
+    pipe.execute()
+
+    if spotify_ids:
+        items = [
+            json.dumps({
+                "jobId": job_id,
+                "item": index,
+                "userTag": user_tag,
+                "spotifyId": sid,
+                "alreadyExists": sid in existing_ids
+            })
+            for index, sid in enumerate(spotify_ids)
+        ]
+        _enqueue_script(keys=[queue_key(user_tag), ACTIVE_USERS_KEY, ACTIVE_USERS_SET_KEY], args=[user_tag, *items])
+
+    print(f"[QUEUE] Enqueued job {job_id} with {len(spotify_ids)} artists for user {user_tag}")
+    return job_id
+
+
+def dequeue_ingest_item() -> Optional[dict]:
+    """
+    Next item in round-robin order, or None. The item stays leased until
+    record_job_result acknowledges it with item["receipt"].
+    """
+    item = _dequeue_script(
+        keys=[ACTIVE_USERS_KEY, ACTIVE_USERS_SET_KEY, PROCESSING_KEY],
+        args=[QUEUE_KEY_PREFIX, time.time(), INGEST_VISIBILITY_TIMEOUT_SECONDS]
+    )
+    if not item:
+        return None
+    return {**json.loads(item), "receipt": item}
+
+
+def mark_job_started(job_id: str) -> bool:
+    return bool(_mark_started_script(keys=[job_key(job_id)], args=[datetime.now(timezone.utc).isoformat()]))
+
+
+def record_job_result(job_id: str, succeeded: bool, receipt: Optional[str] = None) -> dict:
+    processed, total, status = _record_result_script(
+        keys=[job_key(job_id), PROCESSING_KEY],
+        args=["succeeded" if succeeded else "failed", datetime.now(timezone.utc).isoformat(), receipt or ""]
+    )
+    return {"processed": int(processed), "total": int(total), "status": status}
+
+
+def get_job_status(job_id: str) -> Optional[dict]:
+    job = redis_client.hgetall(job_key(job_id))
+    if not job:
+        return None
+
+    for field in ("total", "processed", "succeeded", "failed"):
+        job[field] = int(job.get(field, 0))
+    job["progress"] = round(job["processed"] / job["total"], 4) if job["total"] else 1.0
+    return job
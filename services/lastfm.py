@@ -1,11 +1,13 @@
+import asyncio
 import os
 import json
 from typing import List, Optional
 
-import requests
 from dotenv import load_dotenv
 
 from model.artist_node import ArtistNode
+from services import http_client
+from services.entity_resolution import identity_keys, keyed_by_identity
 
 load_dotenv()
 
@@ -19,18 +21,37 @@ top_artists_path = os.path.join(project_root, 'data', 'temp', 'lastfmTopArtists.
 detailed_artists_path = os.path.join(project_root, 'data', 'temp', 'lastfmArtists.json')
 genre_map_path = os.path.join(project_root, 'data', 'genreMap.json')
 
-def normalize_name(name):
-    return ''.join(c.lower() for c in name if c.isalnum()).strip()
+
+def _similar_params(name):
+    return {
+        "method": "artist.getsimilar",
+        "artist": name,
+        "api_key": API_KEY,
+        "format": "json",
+        "limit": 10
+    }
+
+def _info_params(name):
+    return {
+        "method": "artist.getinfo",
+        "artist": name,
+        "api_key": API_KEY,
+        "format": "json"
+    }
 
 def get_similar_artists(name):
     try:
-        response = requests.get(BASE_URL, params={
-            "method": "artist.getsimilar",
-            "artist": name,
-            "api_key": API_KEY,
-            "format": "json",
-            "limit": 10
-        })
+        response = http_client.get(BASE_URL, credential=API_KEY, params=_similar_params(name))
+        response.raise_for_status()
+        data = response.json()
+        return [a["name"] for a in data.get("similarartists", {}).get("artist", [])]
+    except Exception as e:
+        print(f"[LASTFM] Failed to fetch similar artists for {name}: {e}")
+        return []
+
+async def get_similar_artists_async(name):
+    try:
+        response = await http_client.get_async(BASE_URL, credential=API_KEY, params=_similar_params(name))
         response.raise_for_status()
         data = response.json()
         return [a["name"] for a in data.get("similarartists", {}).get("artist", [])]
@@ -38,13 +59,34 @@ def get_similar_artists(name):
         print(f"[LASTFM] Failed to fetch similar artists for {name}: {e}")
         return []
 
+async def fetch_artist_info_async(name):
+    """
+    Fetches artist.getinfo and artist.getsimilar concurrently.
+    Returns (info, similar); info is None when Last.fm has no match.
+    """
+    async def info():
+        response = await http_client.get_async(BASE_URL, credential=API_KEY, params=_info_params(name))
+        response.raise_for_status()
+        return response.json().get("artist")
+
+    return await asyncio.gather(info(), get_similar_artists_async(name))
+
+def apply_artist_info(artist: ArtistNode, data: dict, similar: List[str]):
+    images = data.get("image", [])
+    image_url = next((img["#text"] for img in images if img.get("size") == "extralarge"), None)
+
+    artist.lastfmMBID = data.get("mbid") or artist.lastfmMBID
+    artist.imageUrl = artist.imageUrl or image_url
+    artist.append_genres(data.get("tags", {}).get("tag", []))
+    artist.relatedArtists = similar or artist.relatedArtists
+
 def fetch_top_artists(write_to_file=False, max_artists:int=1000) -> List[ArtistNode]:
     all_artists = {}
     page = 1
 
     while len(all_artists) < max_artists:
         try:
-            response = requests.get(BASE_URL, params={
+            response = http_client.get(BASE_URL, credential=API_KEY, params={
                 "method": "chart.gettopartists",
                 "api_key": API_KEY,
                 "format": "json",
@@ -58,8 +100,8 @@ def fetch_top_artists(write_to_file=False, max_artists:int=1000) -> List[ArtistN
                 print(f"[LASTFM] No more artists returned at page {page}. Stopping.")
                 break
 
-            for artist in fetched_artists:
-                key = normalize_name(artist["name"])
+            # Chart entries that are aliases of one artist the graph already holds share a key
+            for key, artist in keyed_by_identity(fetched_artists):
                 if key not in all_artists:
                     all_artists[key] = {
                         "id": None,
@@ -114,21 +156,15 @@ def fetch_artist_details(
     seen = set()
     i = 1
 
-    for artist in artists:
+    for artist, key in zip(artists, identity_keys(artists)):
 
         name = artist.name
-        norm_name = normalize_name(name)
-        if norm_name in seen:
+        if key in seen:
             continue
-        seen.add(norm_name)
+        seen.add(key)
 
         try:
-            response = requests.get(BASE_URL, params={
-                "method": "artist.getinfo",
-                "artist": name,
-                "api_key": API_KEY,
-                "format": "json"
-            })
+            response = http_client.get(BASE_URL, credential=API_KEY, params=_info_params(name))
             response.raise_for_status()
             data = response.json().get("artist")
 
@@ -138,14 +174,7 @@ def fetch_artist_details(
 
             # Update the existing artist object
             similar = get_similar_artists(name)
-
-            images = data.get("image", [])
-            image_url = next((img["#text"] for img in images if img.get("size") == "extralarge"), None)
-
-            artist.lastfmMBID = data.get("mbid") or artist.lastfmMBID
-            artist.imageUrl = artist.imageUrl or image_url
-            artist.append_genres(data.get("tags", {}).get("tag", []))
-            artist.relatedArtists = similar or artist.relatedArtists
+            apply_artist_info(artist, data, similar)
 
             tags_list = [tag["name"] for tag in data.get("tags", {}).get("tag", []) if tag.get("name")]
             print(f"[LASTFM] ({i}/{len(artists)}) Processed: {name} ({', '.join(tags_list)})")
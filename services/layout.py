@@ -0,0 +1,285 @@
+import os
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import neo4j
+import numpy as np
+from dotenv import load_dotenv
+
+from model.artist_node import ArtistNode
+from services.artist_lookup import normalize_name, prefetch_graph_index
+
+load_dotenv()
+
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USER = os.getenv("NEO4J_USER")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_ARTISTS_DB = os.getenv("NEO4J_ARTISTS_DB")
+
+LAYOUT_REFINEMENT = os.getenv("LAYOUT_REFINEMENT", "false").lower() == "true"
+LAYOUT_TIME_BUDGET_SECONDS = float(os.getenv("LAYOUT_TIME_BUDGET_SECONDS", "120"))
+LAYOUT_MAX_ITERATIONS = int(os.getenv("LAYOUT_MAX_ITERATIONS", "200"))
+# Preferred distance between neighbouring artists and rest length of RELATED_TO springs, in plane units
+LAYOUT_NODE_SPACING = float(os.getenv("LAYOUT_NODE_SPACING", "40"))
+LAYOUT_EDGE_LENGTH = float(os.getenv("LAYOUT_EDGE_LENGTH", "250"))
+LAYOUT_EDGE_STRENGTH = float(os.getenv("LAYOUT_EDGE_STRENGTH", "0.01"))
+# Pull back towards the genre centroid, as a fraction of the offset per iteration
+LAYOUT_ANCHOR_STRENGTH = float(os.getenv("LAYOUT_ANCHOR_STRENGTH", "0.05"))
+# Warm-started artists move at this fraction of the step size new artists get
+LAYOUT_WARM_TEMPERATURE = float(os.getenv("LAYOUT_WARM_TEMPERATURE", "0.1"))
+# Warm-started artists that end up closer than this to their old position keep it exactly,
+# so their content hash (and the export) stays unchanged
+LAYOUT_SNAP_DISTANCE = float(os.getenv("LAYOUT_SNAP_DISTANCE", "2"))
+
+# Target artists per finest grid cell, and pair interactions evaluated per near-field chunk
+LEAF_OCCUPANCY = 4
+NEAR_FIELD_CHUNK = 1 << 20
+MIN_LEVEL = 2
+MAX_LEVEL = 10
+
+# Offsets of the 6x6 children of a cell's parent neighbourhood, relative to 2 * parent - 2
+_CHILD_OFFSETS = [(a, b) for a in range(6) for b in range(6)]
+
+
+def fetch_previous_positions(artist_ids: List[str]) -> Dict[str, Tuple[float, float]]:
+    driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    session = driver.session(database=NEO4J_ARTISTS_DB)
+    try:
+        index = prefetch_graph_index(session, ids=artist_ids)
+    except Exception as e:
+        print(f"[LAYOUT] Could not load previous positions, starting cold: {e}")
+        return {}
+    finally:
+        session.close()
+        driver.close()
+
+    return {
+        snapshot.id: (snapshot.x, snapshot.y)
+        for snapshot in index.by_id.values()
+        if snapshot.x is not None and snapshot.y is not None
+    }
+
+
+def _related_edges(artists: List[ArtistNode]) -> np.ndarray:
+    by_name = {normalize_name(artist.name or ""): i for i, artist in enumerate(artists)}
+    edges = set()
+    for i, artist in enumerate(artists):
+        for name in artist.relatedArtists or []:
+            j = by_name.get(normalize_name(name or ""))
+            if j is not None and j != i:
+                edges.add((min(i, j), max(i, j)))
+    return np.array(sorted(edges), dtype=np.int64).reshape(-1, 2)
+
+
+def _jitter(artist_id: str) -> Tuple[float, float]:
+    # Deterministic per artist, so reruns with the same input produce the same layout
+    h = zlib.crc32((artist_id or "").encode("utf-8"))
+    angle = (h & 0xFFFF) / 0xFFFF * 2 * np.pi
+    radius = ((h >> 16) & 0xFFFF) / 0xFFFF * LAYOUT_NODE_SPACING
+    return radius * np.cos(angle), radius * np.sin(angle)
+
+
+def _accumulate(force: np.ndarray, idx: np.ndarray, fx: np.ndarray, fy: np.ndarray):
+    n = force.shape[0]
+    force[:, 0] += np.bincount(idx, weights=fx, minlength=n)
+    force[:, 1] += np.bincount(idx, weights=fy, minlength=n)
+
+
+def _cell_repulsion(force, jacobian, pos, cx, cy, g, mass, com, offsets, include, k3, eps2):
+    # Repulsion from whole cells through their centre of mass: F = m * k^3 / d^2 along (pos - com).
+    # The field's Jacobian (xx, xy, yy) is summed too, so callers can move F from pos to nearby points.
+    for ox, oy in offsets:
+        tx, ty = include(cx, cy, ox, oy)
+        valid = (tx >= 0) & (tx < g) & (ty >= 0) & (ty < g)
+        cells = np.where(valid, tx * g + ty, 0)
+        m = np.where(valid, mass[cells], 0.0)
+        delta = pos - com[cells]
+        d2 = np.einsum("ij,ij->i", delta, delta) + eps2
+        scale = m * k3 / (d2 * np.sqrt(d2))
+        force += delta * scale[:, None]
+        curvature = 3 * scale / d2
+        jacobian[:, 0] += scale - curvature * delta[:, 0] ** 2
+        jacobian[:, 1] -= curvature * delta[:, 0] * delta[:, 1]
+        jacobian[:, 2] += scale - curvature * delta[:, 1] ** 2
+
+
+def _pair_repulsion(force, pos, i, j, k3, eps2):
+    delta = pos[i] - pos[j]
+    d2 = np.einsum("ij,ij->i", delta, delta) + eps2
+    f = delta * (k3 / (d2 * np.sqrt(d2)))[:, None]
+    _accumulate(force, i, f[:, 0], f[:, 1])
+    _accumulate(force, j, -f[:, 0], -f[:, 1])
+
+
+def _near_field(force, pos, cx, cy, g, k3, eps2):
+    # Exact repulsion between artists in the same or adjacent finest cells. Artists are sorted by cell,
+    # so each cell is a contiguous range; every pair is visited once, through the cell itself and the
+    # four neighbours that come after it, in chunks of about NEAR_FIELD_CHUNK pairs.
+    cell = cx * g + cy
+    order = np.argsort(cell, kind="stable")
+    sorted_cells = cell[order]
+    starts = np.searchsorted(sorted_cells, np.arange(g * g), side="left")
+    ends = np.searchsorted(sorted_cells, np.arange(g * g), side="right")
+    ranks = np.arange(len(order))
+    scx, scy = cx[order], cy[order]
+
+    for ox, oy in [(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)]:
+        tx, ty = scx + ox, scy + oy
+        valid = (tx >= 0) & (tx < g) & (ty >= 0) & (ty < g)
+        target = np.where(valid, tx * g + ty, 0)
+        lo = np.where(valid, starts[target], 0)
+        hi = np.where(valid, ends[target], 0)
+        if (ox, oy) == (0, 0):
+            lo = ranks + 1
+        counts = np.maximum(hi - lo, 0)
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+
+        first = 0
+        while first < len(order):
+            last = int(np.searchsorted(bounds, bounds[first] + NEAR_FIELD_CHUNK, side="right")) - 1
+            last = min(max(last, first + 1), len(order))
+            total = int(bounds[last] - bounds[first])
+            if total:
+                owners = np.repeat(np.arange(first, last), counts[first:last])
+                partners = np.arange(total) + np.repeat(lo[first:last] - (bounds[first:last] - bounds[first]),
+                                                        counts[first:last])
+                _pair_repulsion(force, pos, order[owners], order[partners], k3, eps2)
+            first = last
+
+
+def _repulsion(pos: np.ndarray, k: float) -> np.ndarray:
+    """
+    Barnes-Hut style repulsion on a quadtree flattened into grid levels.
+    At each level every occupied cell interacts with the centre of mass of
+    the cells in its interaction list (children of its parent's neighbours
+    that are not its own neighbours) and passes the result to its artists,
+    corrected to first order for each artist's offset from the cell's
+    centre of mass. A level costs O(occupied cells) and there are O(log n)
+    levels. At the finest level artists in the same or adjacent cells repel
+    exactly.
+    """
+    n = pos.shape[0]
+    force = np.zeros_like(pos)
+    k3 = k ** 3
+    eps2 = (0.1 * k) ** 2
+
+    lo = pos.min(axis=0)
+    span = max(float((pos.max(axis=0) - lo).max()), k) * (1 + 1e-9)
+    unit = (pos - lo) / span
+
+    levels = int(np.clip(np.ceil(np.log(max(n / LEAF_OCCUPANCY, 1)) / np.log(4)), MIN_LEVEL, MAX_LEVEL))
+
+    def interaction_list(cx, cy, a, b):
+        tx = 2 * (cx >> 1) - 2 + a
+        ty = 2 * (cy >> 1) - 2 + b
+        near = (np.abs(tx - cx) <= 1) & (np.abs(ty - cy) <= 1)
+        return np.where(near, -1, tx), ty
+
+    for level in range(MIN_LEVEL, levels + 1):
+        g = 1 << level
+        cx = np.minimum((unit[:, 0] * g).astype(np.int64), g - 1)
+        cy = np.minimum((unit[:, 1] * g).astype(np.int64), g - 1)
+        cell = cx * g + cy
+        mass = np.bincount(cell, minlength=g * g).astype(np.float64)
+        com = np.zeros((g * g, 2))
+        np.divide(np.bincount(cell, weights=pos[:, 0], minlength=g * g), mass, out=com[:, 0], where=mass > 0)
+        np.divide(np.bincount(cell, weights=pos[:, 1], minlength=g * g), mass, out=com[:, 1], where=mass > 0)
+
+        occupied = np.nonzero(mass)[0]
+        cell_force = np.zeros((len(occupied), 2))
+        cell_jacobian = np.zeros((len(occupied), 3))
+        _cell_repulsion(
+            cell_force, cell_jacobian, com[occupied], occupied // g, occupied % g, g, mass, com,
+            _CHILD_OFFSETS, interaction_list, k3, eps2
+        )
+        level_force = np.zeros((g * g, 2))
+        level_force[occupied] = cell_force
+        level_jacobian = np.zeros((g * g, 3))
+        level_jacobian[occupied] = cell_jacobian
+
+        offset = pos - com[cell]
+        jacobian = level_jacobian[cell]
+        force[:, 0] += level_force[cell, 0] + jacobian[:, 0] * offset[:, 0] + jacobian[:, 1] * offset[:, 1]
+        force[:, 1] += level_force[cell, 1] + jacobian[:, 1] * offset[:, 0] + jacobian[:, 2] * offset[:, 1]
+
+        if level == levels:
+            _near_field(force, pos, cx, cy, g, k3, eps2)
+
+    return force
+
+
+def _attraction(pos: np.ndarray, edges: np.ndarray, length: float, strength: float) -> np.ndarray:
+    # Linear springs that only pull, and only beyond their rest length
+    force = np.zeros_like(pos)
+    if not len(edges):
+        return force
+    src, dst = edges[:, 0], edges[:, 1]
+    delta = pos[dst] - pos[src]
+    d = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+    stretch = np.maximum(d - length, 0.0) / np.maximum(d, 1e-9)
+    f = delta * (strength * stretch)[:, None]
+    _accumulate(force, src, f[:, 0], f[:, 1])
+    _accumulate(force, dst, -f[:, 0], -f[:, 1])
+    return force
+
+
+def refine_layout(artists: List[ArtistNode], previous_positions: Optional[Dict[str, Tuple[float, float]]] = None,
+                  time_budget_seconds: float = LAYOUT_TIME_BUDGET_SECONDS,
+                  max_iterations: int = LAYOUT_MAX_ITERATIONS) -> List[ArtistNode]:
+    """
+    Force-directed refinement of the genre-centroid positions set by
+    implement_genre_data: RELATED_TO springs pull similar artists together,
+    repulsion separates artists stacked on the same centroid, and a spring
+    to the centroid keeps genre regions intact. Artists with a previous
+    position start there at a low temperature, so only new artists move
+    much. Stops at max_iterations or when the time budget runs out.
+    """
+    placed = [artist for artist in artists if artist.x is not None and artist.y is not None]
+    if len(placed) < 2:
+        return artists
+
+    previous_positions = previous_positions or {}
+    started = time.perf_counter()
+
+    anchors = np.array([[artist.x, artist.y] for artist in placed], dtype=np.float64)
+    pos = anchors.copy()
+    temperature = np.ones(len(placed))
+    warm = np.zeros(len(placed), dtype=bool)
+    for i, artist in enumerate(placed):
+        previous = previous_positions.get(artist.id)
+        if previous:
+            pos[i] = previous
+            temperature[i] = LAYOUT_WARM_TEMPERATURE
+            warm[i] = True
+        else:
+            pos[i] += _jitter(artist.id)
+    start = pos.copy()
+
+    edges = _related_edges(placed)
+    max_step = 4 * LAYOUT_NODE_SPACING
+    iteration = 0
+
+    while iteration < max_iterations and time.perf_counter() - started < time_budget_seconds:
+        force = _repulsion(pos, LAYOUT_NODE_SPACING)
+        force += _attraction(pos, edges, LAYOUT_EDGE_LENGTH, LAYOUT_EDGE_STRENGTH)
+        force += LAYOUT_ANCHOR_STRENGTH * (anchors - pos)
+
+        # Linear cooling; each artist's step is also capped by its own temperature
+        limit = max_step * (1 - iteration / max_iterations) * temperature
+        magnitude = np.sqrt(np.einsum("ij,ij->i", force, force))
+        scale = np.minimum(1.0, limit / np.maximum(magnitude, 1e-9))
+        pos += force * scale[:, None]
+        iteration += 1
+
+    moved = np.sqrt(((pos - start) ** 2).sum(axis=1))
+    snapped = warm & (moved < LAYOUT_SNAP_DISTANCE)
+    pos[snapped] = start[snapped]
+
+    for artist, (x, y) in zip(placed, np.round(pos, 2)):
+        artist.x = float(x)
+        artist.y = float(y)
+
+    print(f"[LAYOUT] Refined {len(placed)} artists ({int(warm.sum())} warm, {len(edges)} edges) in {iteration} "
+          f"iterations, {time.perf_counter() - started:.1f}s; {int(snapped.sum())} kept their previous position.")
+    return artists
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import json
 import time
@@ -7,13 +8,15 @@ import requests
 from dotenv import load_dotenv
 
 from model.artist_node import ArtistNode
+from services import http_client
+from services.entity_resolution import identity_keys
 
 load_dotenv()
 
 BASE_URL = "https://musicbrainz.org/ws/2/artist/"
 MAX_RETRIES = 3
 DELAY_MS = 5000
-MAX_ARTIST_COUNT = 1000
+MAX_ARTIST_COUNT = int(os.getenv("MUSICBRAINZ_MAX_ARTISTS", "1000"))
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 data_dir = os.path.join(project_root, "data")
@@ -24,8 +27,6 @@ top_artists_path = os.path.join(temp_dir, "lastfmTopArtists.json")
 genre_map_path = os.path.join(data_dir, "genreMap.json")
 musicbrainz_output_path = os.path.join(temp_dir, "musicBrainzArtists.json")
 
-def normalize_name(name):
-    return ''.join(c.lower() for c in name if c.isalnum()).strip()
 
 def delay(ms):
     time.sleep(ms / 1000)
@@ -37,7 +38,7 @@ def fetch_with_retry(url, retries=MAX_RETRIES, delay_ms=DELAY_MS):
 
     for attempt in range(retries):
         try:
-            res = requests.get(url, headers=headers, timeout=10)
+            res = http_client.get(url, headers=headers, timeout=10)
             res.raise_for_status()
             return res.json()
         except Exception as e:
@@ -47,6 +48,37 @@ def fetch_with_retry(url, retries=MAX_RETRIES, delay_ms=DELAY_MS):
                 print(f"[MUSICBRAINZ] Failed after {retries} attempts: {e}")
                 return None
 
+async def fetch_with_retry_async(url, retries=MAX_RETRIES, delay_ms=DELAY_MS):
+    headers = {
+        "User-Agent": "SoundWebIngestor/1.0"
+    }
+
+    for attempt in range(retries):
+        try:
+            res = await http_client.get_async(url, headers=headers)
+            res.raise_for_status()
+            return res.json()
+        except Exception as e:
+            if attempt < retries - 1:
+                await asyncio.sleep(delay_ms / 1000)
+            else:
+                print(f"[MUSICBRAINZ] Failed after {retries} attempts: {e}")
+                return None
+
+def artist_search_url(name):
+    return f"{BASE_URL}?query=artist:{requests.utils.quote(name)}&fmt=json"
+
+async def fetch_artist_match_async(name):
+    data = await fetch_with_retry_async(artist_search_url(name))
+    if not data or not data.get("artists"):
+        return None
+    return data["artists"][0]
+
+def apply_artist_match(artist: ArtistNode, artist_data: dict):
+    artist.append_genres(artist_data.get("tags", []))
+    if not artist.lastfmMBID:
+        artist.lastfmMBID = artist_data.get("id")
+
 def fetch_artist_genre_data(
     artists: List[ArtistNode],
     write_to_file=False
@@ -62,28 +94,23 @@ def fetch_artist_genre_data(
     seen = set()
     i = 1
 
-    for artist in artists:
+    for artist, key in zip(artists, identity_keys(artists)):
         if i > MAX_ARTIST_COUNT:
             break
 
         name = artist.name
-        norm_name = normalize_name(name)
-        if norm_name in seen:
+        if key in seen:
             continue
-        seen.add(norm_name)
+        seen.add(key)
 
-        url = f"{BASE_URL}?query=artist:{requests.utils.quote(name)}&fmt=json"
-        data = fetch_with_retry(url)
+        data = fetch_with_retry(artist_search_url(name))
 
         if not data or not data.get("artists"):
             print(f"No match for {name}")
             continue
 
         artist_data = data["artists"][0]
-
-        artist.append_genres(artist_data.get("tags", []))
-        if not artist.lastfmMBID:
-            artist.lastfmMBID = artist_data.get("id")
+        apply_artist_match(artist, artist_data)
         tags_list = [tag.get("name", "") for tag in artist_data.get('tags', [])]
         print(f"[MUSICBRAINZ] ({i}/{len(artists)}) Processed: {artist.name} ({', '.join(tags_list)})")
         i += 1
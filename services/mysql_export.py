@@ -1,9 +1,13 @@
 import os
 import json
-import mysql.connector
+import math
+from decimal import Decimal
+from typing import Dict, List, Set
+
 from dotenv import load_dotenv
 
 from model.incomplete_artist import IncompleteArtist
+from services.mysql_pool import get_mysql_connection, mysql_connection
 
 load_dotenv()
 
@@ -11,26 +15,66 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 data_dir = os.path.join(project_root, "data")
 genre_map_path = os.path.join(data_dir, "genreMap.json")
 
-db_config = {
-    "host": os.getenv("MYSQL_HOST"),
-    "port": int(os.getenv("MYSQL_PORT", 3306)),
-    "user": os.getenv("MYSQL_USER"),
-    "password": os.getenv("MYSQL_PASSWORD"),
-    "database": os.getenv("MYSQL_DATABASE")
-}
+MYSQL_BATCH_SIZE = int(os.getenv("MYSQL_BATCH_SIZE", "500"))
+INCOMPLETE_ARTISTS_UNIQUE_KEY = "uq_incomplete_spotify_user"
+
+_incomplete_schema_ready = False
+
+def _genre_row(data: dict) -> tuple:
+    return data.get("x"), data.get("y"), data.get("color"), data.get("count", 0)
+
+
+def _genre_row_changed(existing: tuple, desired: tuple) -> bool:
+    for current, wanted in zip(existing, desired):
+        if isinstance(wanted, float) or isinstance(current, (float, Decimal)):
+            if current is None or wanted is None:
+                if current is not wanted:
+                    return True
+            # FLOAT/DECIMAL columns round, so compare numerically instead of exactly
+            elif not math.isclose(float(current), float(wanted), rel_tol=1e-5, abs_tol=1e-3):
+                return True
+        elif current != wanted:
+            return True
+    return False
+
+
+def _chunks(items: list, size: int = MYSQL_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 
 def export_genres_to_mysql(genre_map=None):
     if genre_map is None:
         with open(genre_map_path, "r", encoding="utf-8") as f:
             genre_map = json.load(f)
 
+    conn = None
+    cursor = None
     try:
-        conn = mysql.connector.connect(**db_config)
+        conn = get_mysql_connection()
         cursor = conn.cursor()
 
-        cursor.execute("DELETE FROM genres")
+        cursor.execute("SELECT name, x, y, color, count FROM genres")
+        existing = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
 
-        insert_query = """
+        upserts = []
+        inserted = 0
+        for name, data in genre_map.items():
+            desired = _genre_row(data)
+            current = existing.get(name)
+            if current is None:
+                inserted += 1
+                upserts.append((name, *desired))
+            elif _genre_row_changed(current, desired):
+                upserts.append((name, *desired))
+
+        deletes = [name for name in existing if name not in genre_map]
+
+        if not upserts and not deletes:
+            print(f"[MYSQL] Genres already in sync ({len(genre_map)} genres), nothing to write.")
+            return
+
+        upsert_query = """
             INSERT INTO genres (name, x, y, color, count)
             VALUES (%s, %s, %s, %s, %s)
             ON DUPLICATE KEY UPDATE
@@ -40,16 +84,16 @@ def export_genres_to_mysql(genre_map=None):
                 count = VALUES(count)
         """
 
-        for name, data in genre_map.items():
-            x = data.get("x")
-            y = data.get("y")
-            color = data.get("color")
-            count = data.get("count", 0)
+        # executemany rewrites INSERT ... VALUES into multi-row statements
+        for chunk in _chunks(upserts):
+            cursor.executemany(upsert_query, chunk)
 
-            cursor.execute(insert_query, (name, x, y, color, count))
+        for chunk in _chunks(deletes):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM genres WHERE name IN ({placeholders})", tuple(chunk))
 
         conn.commit()
-        print(f"[MYSQL] Exported {len(genre_map)} genres to MySQL.")
+        print(f"[MYSQL] Synced genres: {inserted} inserted, {len(upserts) - inserted} updated, {len(deletes)} deleted.")
     except Exception as e:
         print(f"[MYSQL] Error exporting genres to MySQL: {e}")
     finally:
@@ -58,29 +102,199 @@ def export_genres_to_mysql(genre_map=None):
         if conn:
             conn.close()
 
-def save_incomplete_artist(mysql_conn, artist: IncompleteArtist):
+def _delete_duplicate_incomplete_artists(cursor) -> int:
+    # Rows written before the unique key existed can repeat (spotify_id, user_tag); keep the newest attempt of each
+    cursor.execute(
+        """
+        SELECT spotify_id, user_tag, COUNT(*) FROM incomplete_artists
+        WHERE spotify_id IS NOT NULL AND user_tag IS NOT NULL
+        GROUP BY spotify_id, user_tag
+        HAVING COUNT(*) > 1
+        """
+    )
+    removed = 0
+    for spotify_id, user_tag, count in cursor.fetchall():
+        cursor.execute(
+            """
+            DELETE FROM incomplete_artists
+            WHERE spotify_id = %s AND user_tag = %s
+            ORDER BY last_attempted ASC, attempt_count ASC
+            LIMIT %s
+            """,
+            (spotify_id, user_tag, count - 1)
+        )
+        removed += cursor.rowcount
+    return removed
+
+
+def ensure_incomplete_artists_schema(mysql_conn):
+    global _incomplete_schema_ready
+    if _incomplete_schema_ready:
+        return
+
     cursor = mysql_conn.cursor()
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = 'incomplete_artists' AND column_name = 'attempt_count'
+        """
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute("ALTER TABLE incomplete_artists ADD COLUMN attempt_count INT NOT NULL DEFAULT 1")
+        print("[MYSQL] Added attempt_count column to incomplete_artists.")
 
-    # Avoid inserting duplicates for the same (spotify_id, user_tag)
     cursor.execute(
         """
-        SELECT 1 FROM incomplete_artists
-        WHERE spotify_id = %s AND user_tag = %s
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = 'incomplete_artists' AND index_name = %s
         """,
-        (artist.spotify_id, artist.user_tag)
+        (INCOMPLETE_ARTISTS_UNIQUE_KEY,)
     )
-    if cursor.fetchone():
-        print(f"[SKIP] IncompleteArtist {artist.spotify_id} for user {artist.user_tag} already exists.")
-        cursor.close()
-        return
-
-    cursor.execute("""
-        INSERT INTO incomplete_artists
-        (spotify_id, user_tag, name, popularity, image_url, failure_reason, last_attempted)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-    """, artist.to_sql_tuple())
+    if not cursor.fetchone()[0]:
+        removed = _delete_duplicate_incomplete_artists(cursor)
+        if removed:
+            print(f"[MYSQL] Removed {removed} duplicate incomplete_artists rows before adding the unique key.")
+        cursor.execute(
+            f"ALTER TABLE incomplete_artists ADD UNIQUE KEY {INCOMPLETE_ARTISTS_UNIQUE_KEY} (spotify_id, user_tag)"
+        )
+        print("[MYSQL] Added unique key (spotify_id, user_tag) to incomplete_artists.")
 
     mysql_conn.commit()
     cursor.close()
+    _incomplete_schema_ready = True
 
 
+def upsert_incomplete_artists(mysql_conn, artists: List[IncompleteArtist], count_attempt: bool = True) -> int:
+    # One row per (spotify_id, user_tag), the latest failure wins. Retries pass count_attempt=False,
+    # since claiming the row already counted the attempt
+    unique = {(a.spotify_id, a.user_tag): a for a in artists}
+    if not unique:
+        return 0
+
+    attempt_increment = 1 if count_attempt else 0
+    with mysql_connection(mysql_conn) as conn:
+        ensure_incomplete_artists_schema(conn)
+        cursor = conn.cursor()
+
+        for chunk in _chunks(list(unique.values())):
+            placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, 1)"] * len(chunk))
+            params = [value for artist in chunk for value in artist.to_sql_tuple()]
+            cursor.execute(f"""
+                INSERT INTO incomplete_artists
+                (spotify_id, user_tag, name, popularity, image_url, failure_reason, last_attempted, attempt_count)
+                VALUES {placeholders}
+                ON DUPLICATE KEY UPDATE
+                    name = VALUES(name),
+                    popularity = VALUES(popularity),
+                    image_url = VALUES(image_url),
+                    failure_reason = VALUES(failure_reason),
+                    last_attempted = VALUES(last_attempted),
+                    attempt_count = attempt_count + {attempt_increment}
+            """, params)
+
+        conn.commit()
+        cursor.close()
+
+    print(f"[MYSQL] Recorded {len(unique)} incomplete artists.")
+    return len(unique)
+
+
+def save_incomplete_artist(mysql_conn, artist: IncompleteArtist):
+    # mysql_conn may be None, in which case a pooled connection is borrowed
+    upsert_incomplete_artists(mysql_conn, [artist])
+
+
+def fetch_incomplete_tags(mysql_conn, spotify_ids: List[str]) -> Dict[str, Set[str]]:
+    tags = {}
+    ids = list(dict.fromkeys(spotify_ids))
+    if not ids:
+        return tags
+
+    with mysql_connection(mysql_conn) as conn:
+        cursor = conn.cursor()
+        for chunk in _chunks(ids):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(
+                f"SELECT spotify_id, user_tag FROM incomplete_artists WHERE spotify_id IN ({placeholders})",
+                tuple(chunk)
+            )
+            for spotify_id, user_tag in cursor.fetchall():
+                tags.setdefault(spotify_id, set()).add(user_tag)
+        cursor.close()
+    return tags
+
+
+def delete_incomplete_artists(mysql_conn, spotify_ids: List[str]) -> int:
+    ids = list(dict.fromkeys(spotify_ids))
+    if not ids:
+        return 0
+
+    deleted = 0
+    with mysql_connection(mysql_conn) as conn:
+        cursor = conn.cursor()
+        for chunk in _chunks(ids):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM incomplete_artists WHERE spotify_id IN ({placeholders})", tuple(chunk))
+            deleted += cursor.rowcount
+        conn.commit()
+        cursor.close()
+
+    print(f"[CLEANUP] Removed {deleted} rows for {len(ids)} artists from incomplete_artists")
+    return deleted
+
+
+def fetch_due_incomplete_artists(mysql_conn, limit: int, base_delay_seconds: int, max_delay_seconds: int,
+                                 max_attempts: int) -> List[IncompleteArtist]:
+    # A row is due once base_delay * 2^(attempts - 1) seconds (capped) have passed since its last attempt.
+    # Claimed rows are stamped as attempted in the same transaction, which is the lease: other workers skip
+    # them while locked and find them not due once committed.
+    with mysql_connection(mysql_conn) as conn:
+        ensure_incomplete_artists_schema(conn)
+        cursor = conn.cursor()
+        try:
+            # autocommit is off, so the locking read opens the claim transaction
+            cursor.execute(
+                """
+                SELECT spotify_id, user_tag, name, popularity, image_url, failure_reason, last_attempted, attempt_count
+                FROM incomplete_artists
+                WHERE attempt_count < %s
+                  AND last_attempted <= UTC_TIMESTAMP()
+                      - INTERVAL LEAST(%s * POW(2, GREATEST(attempt_count - 1, 0)), %s) SECOND
+                ORDER BY attempt_count ASC, popularity DESC, last_attempted ASC
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (max_attempts, base_delay_seconds, max_delay_seconds, limit)
+            )
+            rows = cursor.fetchall()
+
+            if rows:
+                conditions = " OR ".join(["(spotify_id = %s AND user_tag <=> %s)"] * len(rows))
+                cursor.execute(
+                    f"""
+                    UPDATE incomplete_artists
+                    SET last_attempted = UTC_TIMESTAMP(), attempt_count = attempt_count + 1
+                    WHERE {conditions}
+                    """,
+                    tuple(value for row in rows for value in row[:2])
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    return [
+        IncompleteArtist(
+            spotify_id=row[0],
+            user_tag=row[1],
+            name=row[2] or "",
+            popularity=row[3] or 0,
+            image_url=row[4] or "",
+            failure_reason=row[5] or "unknown",
+            last_attempted=row[6],
+            attempt_count=row[7] + 1
+        )
+        for row in rows
+    ]
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+
+load_dotenv()
+
+db_config = {
+    "host": os.getenv("MYSQL_HOST"),
+    "port": int(os.getenv("MYSQL_PORT", 3306)),
+    "user": os.getenv("MYSQL_USER"),
+    "password": os.getenv("MYSQL_PASSWORD"),
+    "database": os.getenv("MYSQL_DATABASE")
+}
+
+# mysql-connector caps a single pool at 32 connections
+MYSQL_POOL_SIZE = min(int(os.getenv("MYSQL_POOL_SIZE", "8")), 32)
+MYSQL_POOL_NAME = os.getenv("MYSQL_POOL_NAME", "soundweb")
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "10"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_mysql_pool() -> pooling.MySQLConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=MYSQL_POOL_NAME,
+                    pool_size=MYSQL_POOL_SIZE,
+                    pool_reset_session=True,
+                    **db_config
+                )
+                print(f"[MYSQL] Created connection pool '{MYSQL_POOL_NAME}' with {MYSQL_POOL_SIZE} connections.")
+    return _pool
+
+
+def get_mysql_connection():
+    """
+    Borrows a healthy connection from the shared pool, waiting up to
+    MYSQL_POOL_TIMEOUT seconds when every connection is in use.
+    Calling close() on it returns it to the pool (the session is reset on return).
+    """
+    pool = get_mysql_pool()
+    deadline = time.monotonic() + MYSQL_POOL_TIMEOUT
+
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+    try:
+        conn.ping(reconnect=True, attempts=2, delay=0)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+@contextmanager
+def mysql_connection(existing=None):
+    # Reuse a caller-provided connection, otherwise borrow one for the duration of the block
+    if existing is not None:
+        yield existing
+        return
+
+    conn = get_mysql_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,163 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+import neo4j
+from dotenv import load_dotenv
+
+from model.artist_node import ArtistNode
+from model.graph_index import GraphIndex
+from services.artist_cache import (
+    cache_artist_metadata_async,
+    invalidate_artist_metadata_async,
+    invalidate_user_tagged_ids_async,
+)
+from services.artist_lookup import (
+    BACKFILL_NORMALIZED_NAME_QUERY,
+    EXISTING_ARTIST_QUERY,
+    add_snapshot_record,
+    graph_index_query,
+    normalize_name,
+)
+from services.neo4j_export import (
+    ARTIST_UPSERT_QUERY,
+    EXISTING_LINKS_QUERY,
+    RELATED_TO_QUERY,
+    TOUCH_ARTIST_QUERY,
+    artist_cache_entries,
+    artist_to_row,
+    export_change_events,
+    link_rows,
+    resolve_related_artist_links,
+    split_changed_rows,
+)
+from services.change_feed import TAG_ADDED, publish_changes_async
+from services.entity_resolution import record_exported_artists
+from services.user_tags import ADD_USER_TAG_QUERY, tag_change_events
+
+load_dotenv()
+
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USER = os.getenv("NEO4J_USER")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_ARTISTS_DB = os.getenv("NEO4J_ARTISTS_DB")
+
+# Async counterparts of the custom-artist reads and writes, sharing their Cypher with the sync modules.
+# The driver is created once per process and pooled across every in-flight ingestion.
+_async_driver: Optional[neo4j.AsyncDriver] = None
+
+
+def get_async_driver() -> neo4j.AsyncDriver:
+    global _async_driver
+    if _async_driver is None:
+        _async_driver = neo4j.AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    return _async_driver
+
+
+def async_session() -> neo4j.AsyncSession:
+    return get_async_driver().session(database=NEO4J_ARTISTS_DB)
+
+
+async def close_async_driver():
+    global _async_driver
+    if _async_driver is not None:
+        await _async_driver.close()
+        _async_driver = None
+
+
+async def get_existing_artist_by_spotify_id_async(session: neo4j.AsyncSession,
+                                                  spotify_id: str) -> Optional[Tuple[dict, list, bool]]:
+    result = await session.run(EXISTING_ARTIST_QUERY, {"spotifyId": spotify_id})
+    record = await result.single()
+    if record:
+        return record["a"]._properties, record["userTags"] or [], record["isTopArtist"]
+    return None
+
+
+async def add_user_tag_async(session: neo4j.AsyncSession, spotify_ids: List[str], user_tag: str) -> List[dict]:
+    result = await session.run(ADD_USER_TAG_QUERY, spotify_ids=list(spotify_ids), user_tag=user_tag)
+    records = [record.data() async for record in result]
+    await invalidate_artist_metadata_async(record["spotifyId"] for record in records)
+    await invalidate_user_tagged_ids_async([user_tag])
+    await publish_changes_async(tag_change_events(records, TAG_ADDED, user_tag))
+    return records
+
+
+async def prefetch_graph_index_async(session: neo4j.AsyncSession, ids: Optional[Iterable[str]] = None,
+                                     normalized_names: Optional[Iterable[str]] = None) -> GraphIndex:
+    query, params = graph_index_query(ids, normalized_names)
+    result = await session.run(query, params)
+
+    index = GraphIndex()
+    backfill = []
+    async for record in result:
+        add_snapshot_record(index, record, backfill)
+
+    if backfill:
+        await session.run(BACKFILL_NORMALIZED_NAME_QUERY, {"rows": backfill})
+        print(f"[NEO4J] Backfilled normalizedName on {len(backfill)} artists.")
+    return index
+
+
+async def _write_rows(tx, query: str, rows: List[dict]):
+    result = await tx.run(query, rows=rows)
+    await result.consume()
+
+
+async def _read_links(tx, query: str, rows: List[dict]) -> set:
+    result = await tx.run(query, rows=rows)
+    return {tuple(sorted([record["id1"], record["id2"]])) async for record in result}
+
+
+async def export_artist_data_to_neo4j_async(artist_data: List[ArtistNode]) -> bool:
+    """
+    Async export of custom (non-top) artists: one session, one write
+    transaction per statement, same upsert/touch/RELATED_TO queries as
+    export_artist_data_to_neo4j.
+    """
+    artist_data = [artist for artist in artist_data if artist.id is not None]
+    if not artist_data:
+        return False
+
+    try:
+        async with async_session() as session:
+            related_names = {
+                normalize_name(name)
+                for artist in artist_data
+                for name in artist.relatedArtists or []
+                if name
+            }
+            graph_index = await prefetch_graph_index_async(
+                session,
+                ids=[a.id for a in artist_data],
+                normalized_names=related_names
+            )
+
+            last_updated = datetime.now(timezone.utc).isoformat()
+            rows = [artist_to_row(artist, last_updated) for artist in artist_data]
+            changed_rows, unchanged_rows = split_changed_rows(rows, graph_index, False)
+            if changed_rows:
+                await session.execute_write(_write_rows, ARTIST_UPSERT_QUERY, changed_rows)
+            if unchanged_rows:
+                await session.execute_write(_write_rows, TOUCH_ARTIST_QUERY, unchanged_rows)
+
+            await cache_artist_metadata_async(artist_cache_entries(rows, graph_index, False))
+            await invalidate_user_tagged_ids_async(tag for row in rows for tag in row["userTags"])
+
+            links = resolve_related_artist_links(graph_index, artist_data)
+            previous_links = set()
+            if links:
+                previous_links = await session.execute_read(_read_links, EXISTING_LINKS_QUERY, link_rows(links))
+                await session.execute_write(_write_rows, RELATED_TO_QUERY, link_rows(links))
+
+        print(f"[NEO4J] Synced {len(artist_data)} artists ({len(unchanged_rows)} unchanged) "
+              f"and {len(links)} relationships.")
+        await publish_changes_async(export_change_events(rows, changed_rows, graph_index, False, links, previous_links))
+        # The entity index is on the sync Redis client, so keep its round trips off the event loop
+        await asyncio.to_thread(record_exported_artists, artist_data)
+        return True
+
+    except Exception as e:
+        print(f"[NEO4J] Error exporting to Neo4j: {e}")
+        return False
@@ -0,0 +1,181 @@
+import csv
+import os
+import sys
+from datetime import datetime, timezone
+
+from services.entity_resolution import normalize_name
+from utils.checkpoint import iter_checkpoint
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+import_dir = os.getenv("NEO4J_IMPORT_DIR", os.path.join(project_root, "data", "import"))
+
+NEO4J_ARTISTS_DB = os.getenv("NEO4J_ARTISTS_DB", "neo4j")
+ARRAY_DELIMITER = ";"
+
+ARTIST_HEADER = [
+    "id:ID(Artist)",
+    "name",
+    "normalizedName",
+    "popularity:int",
+    "spotifyId",
+    "spotifyUrl",
+    "lastfmMBID",
+    "imageUrl",
+    "genres:string[]",
+    "x:double",
+    "y:double",
+    "color",
+    "userTags:string[]",
+    "rank:int",
+    "lastUpdated",
+    ":LABEL",
+]
+USER_HEADER = ["tag:ID(User)", ":LABEL"]
+RELATED_TO_HEADER = [":START_ID(Artist)", ":END_ID(Artist)", ":TYPE"]
+TAGGED_HEADER = [":START_ID(User)", ":END_ID(Artist)", ":TYPE"]
+
+bulk_import_files = {
+    "artists": ("artists_header.csv", "artists.csv"),
+    "users": ("users_header.csv", "users.csv"),
+    "related_to": ("related_to_header.csv", "related_to.csv"),
+    "tagged": ("tagged_header.csv", "tagged.csv"),
+}
+
+
+def _array(values):
+    return ARRAY_DELIMITER.join(str(v).replace(ARRAY_DELIMITER, " ") for v in values or [])
+
+
+def _value(value):
+    return "" if value is None else value
+
+
+def _path(name: str) -> str:
+    return os.path.join(import_dir, name)
+
+
+def _write_header(key: str, header: list):
+    with open(_path(bulk_import_files[key][0]), "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerow(header)
+
+
+def export_checkpoint_to_bulk_import_csv(stage_name: str = "final_genre_combined", top_artists=True) -> dict:
+    """
+    Writes neo4j-admin compatible node/relationship CSVs from a checkpoint.
+    Artists are streamed twice: once for nodes (keeping only a name -> id map),
+    once to resolve RELATED_TO edges against that map.
+    """
+    os.makedirs(import_dir, exist_ok=True)
+    for key, header in (
+        ("artists", ARTIST_HEADER),
+        ("users", USER_HEADER),
+        ("related_to", RELATED_TO_HEADER),
+        ("tagged", TAGGED_HEADER),
+    ):
+        _write_header(key, header)
+
+    labels = "Artist;TopArtist" if top_artists else "Artist"
+    last_updated = datetime.now(timezone.utc).isoformat()
+    name_to_id = {}
+    user_tags = set()
+    artist_count = 0
+    tagged_count = 0
+
+    print(f"[BULK] Writing artist nodes from checkpoint '{stage_name}'...")
+    with open(_path(bulk_import_files["artists"][1]), "w", encoding="utf-8", newline="") as artists_file, \
+            open(_path(bulk_import_files["tagged"][1]), "w", encoding="utf-8", newline="") as tagged_file:
+        artists_writer = csv.writer(artists_file)
+        tagged_writer = csv.writer(tagged_file)
+
+        for artist in iter_checkpoint(stage_name):
+            if artist.id is None:
+                continue
+
+            normalized = normalize_name(artist.name or "")
+            name_to_id[normalized] = artist.id
+            tags = sorted(set(artist.userTags or []))
+
+            artists_writer.writerow([
+                artist.id,
+                _value(artist.name),
+                normalized,
+                _value(artist.popularity),
+                _value(artist.spotifyId),
+                _value(artist.spotifyUrl),
+                _value(artist.lastfmMBID),
+                _value(artist.imageUrl),
+                _array(artist.genres),
+                _value(artist.x),
+                _value(artist.y),
+                _value(artist.color),
+                _array(tags),
+                _value(artist.rank),
+                last_updated,
+                labels,
+            ])
+
+            for tag in tags:
+                user_tags.add(tag)
+                tagged_writer.writerow([tag, artist.id, "TAGGED"])
+                tagged_count += 1
+
+            artist_count += 1
+
+    with open(_path(bulk_import_files["users"][1]), "w", encoding="utf-8", newline="") as users_file:
+        users_writer = csv.writer(users_file)
+        for tag in sorted(user_tags):
+            users_writer.writerow([tag, "User"])
+
+    print(f"[BULK] Wrote {artist_count} artists and {len(user_tags)} users. Resolving RELATED_TO edges...")
+    created_links = set()
+    with open(_path(bulk_import_files["related_to"][1]), "w", encoding="utf-8", newline="") as related_file:
+        related_writer = csv.writer(related_file)
+
+        for artist in iter_checkpoint(stage_name):
+            if artist.id is None:
+                continue
+            for related_name in artist.relatedArtists or []:
+                if not related_name:
+                    continue
+                to_id = name_to_id.get(normalize_name(related_name))
+                if not to_id or to_id == artist.id:
+                    continue
+
+                id_pair = tuple(sorted([artist.id, to_id]))
+                if id_pair in created_links:
+                    continue
+                created_links.add(id_pair)
+                related_writer.writerow([id_pair[0], id_pair[1], "RELATED_TO"])
+
+    summary = {
+        "artists": artist_count,
+        "users": len(user_tags),
+        "relatedTo": len(created_links),
+        "tagged": tagged_count,
+        "command": bulk_import_command(),
+    }
+    print(f"[BULK] Wrote {len(created_links)} RELATED_TO and {tagged_count} TAGGED relationships to {import_dir}")
+    print(f"[BULK] Import with: {summary['command']}")
+    return summary
+
+
+def bulk_import_command(database: str = NEO4J_ARTISTS_DB) -> str:
+    def files(key):
+        header, data = bulk_import_files[key]
+        return f"{_path(header)},{_path(data)}"
+
+    return (
+        "neo4j-admin database import full "
+        f"--nodes={files('artists')} "
+        f"--nodes={files('users')} "
+        f"--relationships={files('related_to')} "
+        f"--relationships={files('tagged')} "
+        f"--array-delimiter='{ARRAY_DELIMITER}' "
+        "--skip-duplicate-nodes=true "
+        "--overwrite-destination=true "
+        f"{database}"
+    )
+
+
+if __name__ == "__main__":
+    export_checkpoint_to_bulk_import_csv(sys.argv[1] if len(sys.argv) > 1 else "final_genre_combined")
@@ -9,7 +9,30 @@ from datetime import datetime, timezone
 from neo4j import Session
 
 from model.artist_node import ArtistNode
+from model.graph_index import GraphIndex
+from services.artist_cache import cache_artist_metadata, invalidate_artist_metadata, invalidate_user_tagged_ids
+from services.artist_lookup import prefetch_graph_index
+from services.change_feed import (
+    ARTIST_DELETED,
+    ARTIST_UPSERTED,
+    EDGE_ADDED,
+    EDGE_REMOVED,
+    LABEL_ADDED,
+    LABEL_REMOVED,
+    ChangeEvent,
+    change_event,
+    publish_changes,
+)
+from services.entity_resolution import normalize_name, record_exported_artists
+from services.neo4j_parallel import (
+    NEO4J_WRITE_PARTITIONS,
+    partition_rows,
+    schedule_edge_rounds,
+    write_partitions_parallel,
+    write_edge_rounds_parallel,
+)
 from services.redis import set_to_cache
+from services.user_tags import add_user_tag, ensure_user_tags_migrated
 
 load_dotenv()
 
@@ -23,8 +46,6 @@ data_dir = os.path.join(project_root, "data")
 temp_dir = os.path.join(data_dir, "temp")
 artist_data_path = os.path.join(temp_dir, "artistData.json")
 
-def normalize_name(name):
-    return ''.join(c.lower() for c in name if c.isalnum()).strip()
 
 def update_neo4j_metadata(session, name="lastSync"):
     now_iso = datetime.now(timezone.utc).isoformat()
@@ -32,17 +53,293 @@ def update_neo4j_metadata(session, name="lastSync"):
         """
         MERGE (m:Metadata {name: $name})
         SET m.updatedAt = datetime($timestamp)
+        // An in-place sync makes the TopArtist label authoritative again
+        REMOVE m.currentTopVersion
         """,
         name=name,
         timestamp=now_iso
     )
 
-def export_artist_data_to_neo4j(artist_data: List[ArtistNode], write_to_file=False, add_top_artist_label=True):
+
+ARTIST_UPSERT_QUERY = """
+UNWIND $rows AS row
+MERGE (a:Artist {id: row.id})
+SET a += row.props,
+    a.userTags = coalesce(a.userTags, []) + [tag IN row.userTags WHERE NOT tag IN coalesce(a.userTags, [])]
+FOREACH (tag IN row.userTags |
+    MERGE (u:User {tag: tag})
+    MERGE (u)-[:TAGGED]->(a)
+)
+"""
+
+TOP_ARTIST_UPSERT_QUERY = ARTIST_UPSERT_QUERY + "SET a:TopArtist\n"
+
+TOUCH_ARTIST_QUERY = """
+UNWIND $rows AS row
+MATCH (a:Artist {id: row.id})
+SET a.lastUpdated = row.lastUpdated
+"""
+
+TOP_ARTIST_TOUCH_QUERY = TOUCH_ARTIST_QUERY + "SET a:TopArtist\n"
+
+RELATED_TO_QUERY = """
+UNWIND $rows AS row
+MATCH (a:Artist {id: row.id1})
+MATCH (b:Artist {id: row.id2})
+MERGE (a)-[:RELATED_TO]-(b)
+"""
+
+EXISTING_LINKS_QUERY = """
+UNWIND $rows AS row
+MATCH (a:Artist {id: row.id1})-[:RELATED_TO]-(b:Artist {id: row.id2})
+RETURN DISTINCT a.id AS id1, b.id AS id2
+"""
+
+
+def artist_to_row(artist: ArtistNode, last_updated: str, top_artist: bool = False) -> dict:
+    data = artist.to_dict()
+    row = {
+        "id": data["id"],
+        "userTags": list(set(data.get("userTags") or [])),
+        "props": {
+            "name": data["name"],
+            "normalizedName": normalize_name(data["name"] or ""),
+            "contentHash": artist.content_hash(),
+            "popularity": data["popularity"],
+            "spotifyId": data["spotifyId"],
+            "spotifyUrl": data["spotifyUrl"],
+            "lastfmMBID": data["lastfmMBID"],
+            "imageUrl": data["imageUrl"],
+            "genres": data["genres"],
+            "x": data["x"],
+            "y": data["y"],
+            "color": data["color"],
+            # When the data was fetched: now for freshly enriched artists, the stored time for chart artists the
+            # scheduler kept, so they still come due
+            "lastUpdated": artist.lastUpdated or last_updated
+        }
+    }
+    # Only chart syncs own the rank; other exports leave whatever rank the node already has
+    if top_artist:
+        row["props"]["rank"] = data["rank"]
+    return row
+
+
+def cleanup_stale_top_artists(session, graph_index: GraphIndex, new_top_artist_ids: set) -> List[ChangeEvent]:
+    existing_top_artist_ids = graph_index.top_artist_ids
+
+    print(f"[NEO4J] Found {len(existing_top_artist_ids)} existing top artists in database.")
+    print(f"[NEO4J] Preparing to sync {len(new_top_artist_ids)} new top artists.")
+
+    stale_ids = existing_top_artist_ids - new_top_artist_ids
+    print(f"[NEO4J] Found {len(stale_ids)} stale top artists to clean up.")
+    if not stale_ids:
+        return []
+
+    # The snapshot only decides what is stale; whether a user has tagged it since is checked at delete time
+    deleted_ids = [
+        record["id"]
+        for record in session.run(
+            """
+            UNWIND $ids AS id
+            MATCH (a:Artist:TopArtist {id: id})
+            WHERE NOT EXISTS { (:User)-[:TAGGED]->(a) } AND size(coalesce(a.userTags, [])) = 0
+            DETACH DELETE a
+            RETURN id
+            """,
+            {"ids": list(stale_ids)}
+        )
+    ]
+    print(f"[NEO4J] Deleted {len(deleted_ids)} stale artists (no user favorites).")
+
+    preserved_ids = list(stale_ids - set(deleted_ids))
+    if preserved_ids:
+        session.run(
+            """
+            UNWIND $ids AS id
+            MATCH (a:Artist:TopArtist {id: id})
+            REMOVE a:TopArtist
+            """,
+            {"ids": preserved_ids}
+        )
+    print(f"[NEO4J] Preserved {len(preserved_ids)} user-favorited artists, removed TopArtist label.")
+
+    invalidate_artist_metadata(graph_index.get(i).spotifyId for i in stale_ids)
+    return (
+        [change_event(LABEL_REMOVED, i, {"label": "TopArtist"}) for i in preserved_ids]
+        + [change_event(ARTIST_DELETED, i) for i in deleted_ids]
+    )
+
+
+def remove_top_artist_label(artist_ids: List[str]) -> List[str]:
+    """
+    Drops the TopArtist label from artists that are no longer in the chart
+    but are kept for another reason (e.g. the related-artist crawl), so the
+    next top artist sync does not treat them as stale. Returns the ids that
+    lost the label.
+    """
+    if not artist_ids:
+        return []
+
+    driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    session = driver.session(database=NEO4J_ARTISTS_DB)
+    try:
+        records = [
+            record.data()
+            for record in session.run(
+                """
+                UNWIND $ids AS id
+                MATCH (a:Artist:TopArtist {id: id})
+                REMOVE a:TopArtist
+                RETURN a.id AS id, a.spotifyId AS spotifyId
+                """,
+                {"ids": list(artist_ids)}
+            )
+        ]
+    finally:
+        session.close()
+        driver.close()
+
+    print(f"[NEO4J] Removed TopArtist label from {len(records)} artists no longer in the chart.")
+    invalidate_artist_metadata(record["spotifyId"] for record in records)
+    publish_changes(change_event(LABEL_REMOVED, record["id"], {"label": "TopArtist"}) for record in records)
+    return [record["id"] for record in records]
+
+
+def refresh_artist_cache(rows: List[dict], graph_index: GraphIndex, add_top_artist_label: bool):
+    # Write-through of what the bulk endpoint reads, so repeat submissions are answered from Redis
+    cache_artist_metadata(artist_cache_entries(rows, graph_index, add_top_artist_label))
+    invalidate_user_tagged_ids(tag for row in rows for tag in row["userTags"])
+
+
+def artist_cache_entries(rows: List[dict], graph_index: GraphIndex, add_top_artist_label: bool) -> dict:
+    entries = {}
+    for row in rows:
+        existing = graph_index.get(row["id"])
+        spotify_id = row["props"]["spotifyId"]
+        if not spotify_id:
+            continue
+        entries[spotify_id] = {
+            "isTopArtist": add_top_artist_label or bool(existing and existing.isTopArtist),
+            "lastUpdated": row["props"]["lastUpdated"],
+            "userTags": sorted(set(row["userTags"]).union(existing.userTags if existing else []))
+        }
+    return entries
+
+
+def export_change_events(rows: List[dict], changed_rows: List[dict], graph_index: GraphIndex,
+                         add_top_artist_label: bool, links: set, previous_links: set = frozenset()) -> List[ChangeEvent]:
+    """
+    Change feed entries for one export: an upsert per changed artist, a
+    label change for existing artists that became top artists, and the
+    RELATED_TO edges added, plus those removed relative to previous_links.
+    Touch-only rows produce nothing.
+    """
+    events = []
+    for row in changed_rows:
+        existing = graph_index.get(row["id"])
+        events.append(change_event(ARTIST_UPSERTED, row["id"], {
+            **row["props"],
+            "userTags": sorted(set(row["userTags"]).union(existing.userTags if existing else [])),
+            "topArtist": add_top_artist_label or bool(existing and existing.isTopArtist),
+        }))
+
+    if add_top_artist_label:
+        for row in rows:
+            existing = graph_index.get(row["id"])
+            if existing and not existing.isTopArtist:
+                events.append(change_event(LABEL_ADDED, row["id"], {"label": "TopArtist"}))
+
+    events += [change_event(EDGE_ADDED, id1, {"to": id2}) for id1, id2 in sorted(links - previous_links)]
+    events += [change_event(EDGE_REMOVED, id1, {"to": id2}) for id1, id2 in sorted(previous_links - links)]
+    return events
+
+
+def link_rows(links: set) -> List[dict]:
+    return [{"id1": id1, "id2": id2} for id1, id2 in sorted(links)]
+
+
+def get_existing_links(session, links: set) -> set:
+    """The links that already have a RELATED_TO edge, so re-merging them is not reported as an addition."""
+    if not links:
+        return set()
+    result = session.run(EXISTING_LINKS_QUERY, rows=link_rows(links))
+    return {tuple(sorted([record["id1"], record["id2"]])) for record in result}
+
+
+def get_top_artist_links(session) -> set:
+    result = session.run(
+        """
+        MATCH (a:Artist:TopArtist)-[:RELATED_TO]->(b:Artist:TopArtist)
+        RETURN a.id AS id1, b.id AS id2
+        """
+    )
+    return {tuple(sorted([record["id1"], record["id2"]])) for record in result}
+
+
+def split_changed_rows(rows: List[dict], graph_index: GraphIndex, add_top_artist_label: bool):
+    """
+    Rows whose content hash, tags, TopArtist label and (for chart syncs) rank
+    already match the graph only need their lastUpdated touched instead of
+    a full upsert.
+    """
+    changed, unchanged = [], []
+    for row in rows:
+        existing = graph_index.get(row["id"])
+        if (
+            existing
+            and existing.contentHash == row["props"]["contentHash"]
+            and set(row["userTags"]).issubset(existing.userTags)
+            and (existing.isTopArtist or not add_top_artist_label)
+            and existing.rank == row["props"].get("rank", existing.rank)
+        ):
+            unchanged.append({"id": row["id"], "lastUpdated": row["props"]["lastUpdated"]})
+        else:
+            changed.append(row)
+    return changed, unchanged
+
+
+def resolve_related_artist_links(graph_index: GraphIndex, artist_data: List[ArtistNode]) -> set:
+    local_name_to_id = {normalize_name(a.name): a.id for a in artist_data}
+
+    links = set()
+    for artist in artist_data:
+        from_id = artist.id
+        for related_name in artist.relatedArtists or []:
+            if not related_name:
+                continue
+            normalized_related = normalize_name(related_name)
+            to_id = local_name_to_id.get(normalized_related) or graph_index.resolve_normalized_name(normalized_related)
+            if not to_id or from_id == to_id:
+                continue
+            links.add(tuple(sorted([from_id, to_id])))
+    return links
+
+
+def prefetch_for_export(session, artist_data: List[ArtistNode], full: bool) -> GraphIndex:
+    # The upsert MERGEs (:User {tag}) and the stale cleanup keeps tagged artists, so both need the TAGGED edges
+    ensure_user_tags_migrated(session)
+    if full:
+        return prefetch_graph_index(session)
+
+    related_names = {
+        normalize_name(name)
+        for artist in artist_data
+        for name in artist.relatedArtists or []
+        if name
+    }
+    return prefetch_graph_index(session, ids=[a.id for a in artist_data], normalized_names=related_names)
+
+
+def export_artist_data_to_neo4j(artist_data: List[ArtistNode], write_to_file=False, add_top_artist_label=True,
+                                graph_index: GraphIndex = None):
     if artist_data is None and write_to_file is False:
         raise ValueError('[NEO4J] artist_data cannot be None')
     elif artist_data is None and write_to_file is True:
         with open(artist_data_path, "r", encoding="utf-8") as f:
-            artist_data = json.load(f)
+            artist_data = [ArtistNode(**a) for a in json.load(f)]
+
+    artist_data = [artist for artist in artist_data if artist.id is not None]
 
     driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
     session = driver.session(database=NEO4J_ARTISTS_DB)
@@ -50,52 +347,27 @@ def export_artist_data_to_neo4j(artist_data: List[ArtistNode], write_to_file=Fal
     try:
         print("[NEO4J] Starting export process...")
 
-        if add_top_artist_label:
-            # Clean up old top artists
-            existing_ids_result = session.run("MATCH (a:Artist:TopArtist) RETURN a.id AS id")
-            existing_top_artist_ids = {record["id"] for record in existing_ids_result}
-            new_top_artist_ids = {artist.id for artist in artist_data}
-
-            print(f"[NEO4J] Found {len(existing_top_artist_ids)} existing top artists in database.")
-            print(f"[NEO4J] Preparing to sync {len(new_top_artist_ids)} new top artists.")
-
-            stale_ids = existing_top_artist_ids - new_top_artist_ids
-            print(f"[NEO4J] Found {len(stale_ids)} stale top artists to clean up.")
-
-            for stale_id in stale_ids:
-                result = session.run(
-                    "MATCH (a:Artist:TopArtist {id: $id}) RETURN a.userTags AS userTags",
-                    {"id": stale_id}
-                )
-                record = result.single()
-                existing_user_tags = record["userTags"] if record and record["userTags"] else []
-
-                if existing_user_tags:
-                    print(f"[NEO4J] Preserving user-favorited artist {stale_id}, removing TopArtist label.")
-                    session.run(
-                        """
-                        MATCH (a:Artist:TopArtist {id: $id})
-                        REMOVE a:TopArtist
-                        """,
-                        {"id": stale_id}
-                    )
-                else:
-                    print(f"[NEO4J] Deleting stale artist {stale_id} (no user favorites).")
-                    session.run(
-                        """
-                        MATCH (a:Artist:TopArtist {id: $id})
-                        DETACH DELETE a
-                        """,
-                        {"id": stale_id}
-                    )
+        # Top artist syncs touch most of the graph, so take a full snapshot; custom exports only need their neighbourhood
+        if graph_index is None:
+            graph_index = prefetch_for_export(session, artist_data, full=add_top_artist_label)
 
+        cleanup_events = []
+        if add_top_artist_label:
+            cleanup_events = cleanup_stale_top_artists(session, graph_index, {artist.id for artist in artist_data})
             print(f"[NEO4J] Finished cleaning up stale top artists.")
 
+        # Edges this export will merge that already exist, read before the top sync drops its old edges
+        created_links = resolve_related_artist_links(graph_index, artist_data)
+        previous_links = get_existing_links(session, created_links)
+        if add_top_artist_label:
+            # Old top-to-top edges are dropped and re-merged, so any not re-merged are removals
+            previous_links |= get_top_artist_links(session)
+
             print("[NEO4J] Deleting old RELATED_TO links between TopArtists...")
             session.run(
                 """
-                MATCH (a:Artist:TopArtist)-[r:RELATED_TO]-(b:Artist:TopArtist)
-                DELETE r
+                MATCH (a:Artist:TopArtist)-[r:RELATED_TO]->(b:Artist:TopArtist)
+                CALL { WITH r DELETE r } IN TRANSACTIONS OF 10000 ROWS
                 """
             )
             print("[NEO4J] Old TopArtist relationships deleted.")
@@ -103,112 +375,35 @@ def export_artist_data_to_neo4j(artist_data: List[ArtistNode], write_to_file=Fal
             update_neo4j_metadata(session)
             print("[NEO4J] Metadata (lastSync) updated.")
 
-        # Insert new/upsert artist nodes
-        print("[NEO4J] Inserting or updating artists...")
-        for artist in artist_data:
-            if artist.id is None:
-                continue
+        # Insert new/upsert artist nodes, partitioned by id hash across sessions
+        print(f"[NEO4J] Inserting or updating artists across {NEO4J_WRITE_PARTITIONS} partitions...")
+        last_updated = datetime.now(timezone.utc).isoformat()
+        rows = [artist_to_row(artist, last_updated, add_top_artist_label) for artist in artist_data]
+        changed_rows, unchanged_rows = split_changed_rows(rows, graph_index, add_top_artist_label)
+        upsert_query = TOP_ARTIST_UPSERT_QUERY if add_top_artist_label else ARTIST_UPSERT_QUERY
+        touch_query = TOP_ARTIST_TOUCH_QUERY if add_top_artist_label else TOUCH_ARTIST_QUERY
+        write_partitions_parallel(driver, upsert_query, partition_rows(changed_rows, "id"), "Artist upsert")
+        write_partitions_parallel(driver, touch_query, partition_rows(unchanged_rows, "id"), "Artist touch")
 
-            result = session.run(
-                "MATCH (a:Artist {id: $id}) RETURN a.userTags AS userTags",
-                {"id": artist.id}
-            )
-            record = result.single()
-            existing_user_tags = record["userTags"] if record and record["userTags"] else []
-
-            data = artist.to_dict()
-
-            # Merge input tags + existing tags
-            input_tags = set(data.get("userTags", []))
-            existing_tags = set(existing_user_tags)
-            merged_tags = list(input_tags.union(existing_tags))
-            data["userTags"] = merged_tags
-            data["lastUpdated"] = datetime.now(timezone.utc).isoformat()
-
-            set_clauses = [
-                "a.name = $name",
-                "a.popularity = $popularity",
-                "a.spotifyId = $spotifyId",
-                "a.spotifyUrl = $spotifyUrl",
-                "a.lastfmMBID = $lastfmMBID",
-                "a.imageUrl = $imageUrl",
-                "a.genres = $genres",
-                "a.x = $x",
-                "a.y = $y",
-                "a.color = $color",
-                "a.userTags = $userTags",
-                "a.lastUpdated = $lastUpdated"
-            ]
-
-            if add_top_artist_label:
-                set_clauses.insert(0, "a:TopArtist")
+        print(f"[NEO4J] Finished upserting {len(artist_data)} artists ({len(unchanged_rows)} unchanged).")
+        refresh_artist_cache(rows, graph_index, add_top_artist_label)
 
-            session.run(
-                f"""
-                MERGE (a:Artist {{id: $id}})
-                SET {', '.join(set_clauses)}
-                """,
-                data
-            )
-
-        print(f"[NEO4J] Finished upserting {len(artist_data)} artists.")
-
-        # Create new RELATED_TO relationships
+        # Create new RELATED_TO relationships in conflict-free rounds
         print("[NEO4J] Creating new RELATED_TO relationships...")
-        local_name_to_id = {normalize_name(a.name): a.id for a in artist_data}
-
-        created_links = set()
-
-        for artist in artist_data:
-            from_id = artist.id
-            for related_name in artist.relatedArtists or []:
-                if not related_name:
-                    continue
-
-                normalized_related = normalize_name(related_name)
-
-                # First check in local imported artists
-                to_id = local_name_to_id.get(normalized_related)
-
-                if not to_id:
-                    # Not found locally, check Neo4j
-                    result = session.run(
-                        """
-                        MATCH (target:Artist)
-                        WHERE toLower(REPLACE(target.name, ' ', '')) = $normalizedName
-                        RETURN target.id AS id
-                        """,
-                        {"normalizedName": normalized_related}
-                    )
-                    record = result.single()
-                    if not record:
-                        # Related artist not found in db either
-                        continue
-                    to_id = record["id"]
-
-                if from_id == to_id:
-                    continue
-
-                id_pair = tuple(sorted([from_id, to_id]))
-                if id_pair in created_links:
-                    continue
-                created_links.add(id_pair)
-
-                session.run(
-                    """
-                    MATCH (a:Artist {id: $id1})
-                    MATCH (b:Artist {id: $id2})
-                    MERGE (a)-[:RELATED_TO]-(b)
-                    """,
-                    {"id1": id_pair[0], "id2": id_pair[1]}
-                )
-
-        print(f"[NEO4J] Created {len(created_links)} new relationships.")
+        write_edge_rounds_parallel(driver, RELATED_TO_QUERY, schedule_edge_rounds(created_links), "RELATED_TO")
+
+        print(f"[NEO4J] Created {len(created_links - previous_links)} new relationships.")
 
         print(f"[NEO4J] Finished syncing {len(artist_data)} artists and {len(created_links)} relationships to Neo4j.")
+        publish_changes(cleanup_events + export_change_events(
+            rows, changed_rows, graph_index, add_top_artist_label, created_links, previous_links
+        ))
+        record_exported_artists(artist_data)
+        return True
 
     except Exception as e:
         print(f"[NEO4J] Error exporting to Neo4j: {e}")
+        return False
     finally:
         session.close()
         driver.close()
@@ -216,16 +411,8 @@ def export_artist_data_to_neo4j(artist_data: List[ArtistNode], write_to_file=Fal
 
 
 def add_user_tag_to_artist(spotify_id: str, user_tag: str, session: Session):
-    query = """
-    MATCH (a:Artist {spotifyId: $spotify_id})
-    SET a.userTags = CASE
-        WHEN NOT $user_tag IN a.userTags THEN coalesce(a.userTags, []) + $user_tag
-        ELSE a.userTags
-    END
-    RETURN a.spotifyId AS spotifyId, a.userTags AS userTags, a.name AS name
-    """
-    result = session.run(query, spotify_id=spotify_id, user_tag=user_tag)
-    record = result.single()
+    records = add_user_tag(session, [spotify_id], user_tag)
+    record = records[0] if records else None
 
     if record:
         print(f"[NEO4J] Added user tag '{user_tag}' to artist '{record['spotifyId']}'. New tags: {record['userTags']}")
@@ -236,4 +423,4 @@ def add_user_tag_to_artist(spotify_id: str, user_tag: str, session: Session):
             except Exception as e:
                 print(f"[Redis] Failed to set ingest cache for {user_tag}: {e}")
     else:
-        print(f"[NEO4J] No artist found with Spotify ID: {spotify_id}")
\ No newline at end of file
+        print(f"[NEO4J] No artist found with Spotify ID: {spotify_id}")
@@ -0,0 +1,100 @@
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Tuple
+
+from neo4j.exceptions import DriverError, Neo4jError
+
+NEO4J_WRITE_PARTITIONS = max(1, int(os.getenv("NEO4J_WRITE_PARTITIONS", "4")))
+NEO4J_BATCH_SIZE = max(1, int(os.getenv("NEO4J_BATCH_SIZE", "500")))
+NEO4J_MAX_RETRIES = int(os.getenv("NEO4J_MAX_RETRIES", "5"))
+NEO4J_RETRY_DELAY_MS = int(os.getenv("NEO4J_RETRY_DELAY_MS", "200"))
+
+NEO4J_ARTISTS_DB = os.getenv("NEO4J_ARTISTS_DB")
+
+
+def partition_of(key: str, partitions: int = NEO4J_WRITE_PARTITIONS) -> int:
+    # crc32 instead of hash() so the partitioning is stable across processes
+    return zlib.crc32(str(key).encode("utf-8")) % partitions
+
+
+def partition_rows(rows: Iterable[dict], key: str, partitions: int = NEO4J_WRITE_PARTITIONS) -> List[List[dict]]:
+    buckets = [[] for _ in range(partitions)]
+    for row in rows:
+        buckets[partition_of(row[key], partitions)].append(row)
+    return buckets
+
+
+def schedule_edge_rounds(pairs: Iterable[Tuple[str, str]], partitions: int = NEO4J_WRITE_PARTITIONS) -> List[List[List[dict]]]:
+    """
+    Groups undirected edges into rounds of buckets that never share a node partition.
+    An edge between partitions (p, q) goes to round (p + q) % partitions, so inside a
+    round every node partition belongs to exactly one bucket and the buckets can be
+    written concurrently without lock conflicts.
+    """
+    buckets = {}
+    for id1, id2 in pairs:
+        p, q = sorted((partition_of(id1, partitions), partition_of(id2, partitions)))
+        buckets.setdefault((p, q), []).append({"id1": id1, "id2": id2})
+
+    rounds = [[] for _ in range(partitions)]
+    for (p, q), rows in sorted(buckets.items()):
+        rounds[(p + q) % partitions].append(rows)
+    return [r for r in rounds if r]
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (Neo4jError, DriverError)):
+        return error.is_retryable()
+    return False
+
+
+def _write_chunk(tx, query: str, rows: List[dict], params: dict):
+    tx.run(query, {**params, "rows": rows}).consume()
+
+
+def write_partition(driver, query: str, rows: List[dict], label: str, partition: int, params: dict = None) -> int:
+    params = params or {}
+    if not rows:
+        return 0
+
+    started = time.perf_counter()
+    with driver.session(database=NEO4J_ARTISTS_DB) as session:
+        for start in range(0, len(rows), NEO4J_BATCH_SIZE):
+            chunk = rows[start:start + NEO4J_BATCH_SIZE]
+            for attempt in range(1, NEO4J_MAX_RETRIES + 1):
+                try:
+                    session.execute_write(_write_chunk, query, chunk, params)
+                    break
+                except Exception as e:
+                    if not _is_retryable(e) or attempt == NEO4J_MAX_RETRIES:
+                        raise
+                    wait_ms = NEO4J_RETRY_DELAY_MS * 2 ** (attempt - 1)
+                    print(f"[NEO4J] {label} partition {partition}: retry {attempt}/{NEO4J_MAX_RETRIES} in {wait_ms}ms ({e})")
+                    time.sleep(wait_ms / 1000)
+
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    print(f"[NEO4J] {label} partition {partition}: wrote {len(rows)} rows in {elapsed:.2f}s ({len(rows) / elapsed:.0f} rows/s)")
+    return len(rows)
+
+
+def write_partitions_parallel(driver, query: str, partitions: List[List[dict]], label: str, params: dict = None) -> int:
+    work = [(idx, rows) for idx, rows in enumerate(partitions) if rows]
+    if not work:
+        return 0
+
+    with ThreadPoolExecutor(max_workers=len(work)) as pool:
+        futures = [
+            pool.submit(write_partition, driver, query, rows, label, idx, params)
+            for idx, rows in work
+        ]
+        return sum(f.result() for f in futures)
+
+
+def write_edge_rounds_parallel(driver, query: str, rounds: List[List[List[dict]]], label: str, params: dict = None) -> int:
+    written = 0
+    for round_idx, buckets in enumerate(rounds, start=1):
+        print(f"[NEO4J] {label} round {round_idx}/{len(rounds)}: {len(buckets)} buckets")
+        written += write_partitions_parallel(driver, query, buckets, label, params)
+    return written
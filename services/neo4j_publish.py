@@ -0,0 +1,235 @@
+import os
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import neo4j
+
+from model.artist_node import ArtistNode
+from services.neo4j_export import (
+    ARTIST_UPSERT_QUERY,
+    TOUCH_ARTIST_QUERY,
+    artist_to_row,
+    prefetch_for_export,
+    resolve_related_artist_links,
+    split_changed_rows,
+)
+from services.neo4j_parallel import (
+    NEO4J_WRITE_PARTITIONS,
+    partition_rows,
+    schedule_edge_rounds,
+    write_partitions_parallel,
+    write_edge_rounds_parallel,
+)
+from services.artist_cache import invalidate_artist_metadata, invalidate_user_tagged_ids
+from services.entity_resolution import record_exported_artists
+
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USER = os.getenv("NEO4J_USER")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_ARTISTS_DB = os.getenv("NEO4J_ARTISTS_DB")
+
+# "inplace" keeps the original delete-then-insert sync, "versioned" publishes blue-green
+NEO4J_PUBLISH_MODE = os.getenv("NEO4J_PUBLISH_MODE", "inplace")
+
+METADATA_NAME = "lastSync"
+
+VERSIONED_MEMBERSHIP_QUERY = """
+UNWIND $rows AS row
+MATCH (s:TopArtistSet {version: $version})
+MATCH (a:Artist {id: row.id})
+MERGE (s)-[m:INCLUDES]->(a)
+SET m.rank = row.rank
+"""
+
+VERSIONED_RELATED_TO_QUERY = """
+UNWIND $rows AS row
+MATCH (a:Artist {id: row.id1})
+MATCH (b:Artist {id: row.id2})
+MERGE (a)-[:RELATED_TO {version: $version}]->(b)
+"""
+
+
+def new_publish_version() -> str:
+    # Lexicographically sortable, so older versions can be range-matched for cleanup
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def ensure_publish_schema(session):
+    session.run("CREATE INDEX top_artist_set_version IF NOT EXISTS FOR (s:TopArtistSet) ON (s.version)")
+    session.run("CREATE INDEX related_to_version IF NOT EXISTS FOR ()-[r:RELATED_TO]-() ON (r.version)")
+
+
+def get_current_top_version(session) -> Optional[str]:
+    record = session.run(
+        "MATCH (m:Metadata {name: $name}) RETURN m.currentTopVersion AS version",
+        name=METADATA_NAME
+    ).single()
+    return record["version"] if record else None
+
+
+def flip_current_top_version(session, version: str) -> Optional[str]:
+    """
+    Makes version current with a single Metadata write. Readers scope top
+    artist membership and links to currentTopVersion (IS_TOP_ARTIST and the
+    versioned snapshot queries), so the TopArtist labels and older links the
+    GC reconciles afterwards are never visible half-done.
+    """
+    def flip(tx):
+        record = tx.run(
+            """
+            MERGE (m:Metadata {name: $name})
+            WITH m, m.currentTopVersion AS previous
+            SET m.previousTopVersion = previous,
+                m.currentTopVersion = $version,
+                m.updatedAt = datetime($timestamp)
+            RETURN previous
+            """,
+            name=METADATA_NAME,
+            version=version,
+            timestamp=datetime.now(timezone.utc).isoformat()
+        ).single()
+        return record["previous"]
+
+    return session.execute_write(flip)
+
+
+def garbage_collect_top_versions(version: str):
+    driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    session = driver.session(database=NEO4J_ARTISTS_DB)
+
+    try:
+        print(f"[NEO4J] [GC] Reconciling TopArtist labels for version {version}...")
+        session.run(
+            """
+            MATCH (:TopArtistSet {version: $version})-[:INCLUDES]->(a:Artist)
+            WHERE NOT a:TopArtist
+            CALL { WITH a SET a:TopArtist } IN TRANSACTIONS OF 1000 ROWS
+            """,
+            version=version
+        )
+        # Former members nobody tagged are deleted, the rest only lose the label. A newer version
+        # may already have been published while this GC ran, so its members are left alone.
+        session.run(
+            """
+            MATCH (a:Artist:TopArtist)
+            WHERE NOT EXISTS { (s:TopArtistSet)-[:INCLUDES]->(a) WHERE s.version >= $version }
+            CALL {
+                WITH a
+                WITH a
+                WHERE NOT EXISTS { (:User)-[:TAGGED]->(a) } AND size(coalesce(a.userTags, [])) = 0
+                DETACH DELETE a
+            } IN TRANSACTIONS OF 1000 ROWS
+            """,
+            version=version
+        )
+        session.run(
+            """
+            MATCH (a:Artist:TopArtist)
+            WHERE NOT EXISTS { (s:TopArtistSet)-[:INCLUDES]->(a) WHERE s.version >= $version }
+            CALL { WITH a REMOVE a:TopArtist } IN TRANSACTIONS OF 1000 ROWS
+            """,
+            version=version
+        )
+
+        print("[NEO4J] [GC] Deleting RELATED_TO links from older versions...")
+        session.run(
+            """
+            MATCH ()-[r:RELATED_TO]->()
+            WHERE r.version < $version
+            CALL { WITH r DELETE r } IN TRANSACTIONS OF 10000 ROWS
+            """,
+            version=version
+        )
+        # Unversioned links between top artists were written by the in-place sync
+        session.run(
+            """
+            MATCH (s:TopArtistSet {version: $version})-[:INCLUDES]->(a:Artist)-[r:RELATED_TO]->(b:Artist)<-[:INCLUDES]-(s)
+            WHERE r.version IS NULL
+            CALL { WITH r DELETE r } IN TRANSACTIONS OF 10000 ROWS
+            """,
+            version=version
+        )
+        session.run(
+            """
+            MATCH (s:TopArtistSet)
+            WHERE s.version < $version
+            CALL { WITH s DETACH DELETE s } IN TRANSACTIONS OF 10 ROWS
+            """,
+            version=version
+        )
+        print(f"[NEO4J] [GC] Finished collecting versions older than {version}.")
+    except Exception as e:
+        print(f"[NEO4J] [GC] Error collecting old top artist versions: {e}")
+    finally:
+        session.close()
+        driver.close()
+
+
+def publish_top_artists_versioned(artist_data: List[ArtistNode], background_gc=True) -> Optional[str]:
+    artist_data = [artist for artist in artist_data if artist.id is not None]
+    version = new_publish_version()
+
+    driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    session = driver.session(database=NEO4J_ARTISTS_DB)
+
+    try:
+        print(f"[NEO4J] Publishing {len(artist_data)} top artists as version {version}...")
+        ensure_publish_schema(session)
+        session.run("MERGE (s:TopArtistSet {version: $version})", version=version)
+
+        graph_index = prefetch_for_export(session, artist_data, full=True)
+        last_updated = datetime.now(timezone.utc).isoformat()
+        rows = [artist_to_row(artist, last_updated) for artist in artist_data]
+        changed_rows, unchanged_rows = split_changed_rows(rows, graph_index, add_top_artist_label=False)
+        write_partitions_parallel(driver, ARTIST_UPSERT_QUERY, partition_rows(changed_rows, "id"), "Artist upsert")
+        write_partitions_parallel(driver, TOUCH_ARTIST_QUERY, partition_rows(unchanged_rows, "id"), "Artist touch")
+
+        membership = [{"id": artist.id, "rank": artist.rank} for artist in artist_data]
+        write_partitions_parallel(
+            driver,
+            VERSIONED_MEMBERSHIP_QUERY,
+            [membership],
+            "TopArtistSet membership",
+            {"version": version}
+        )
+
+        links = resolve_related_artist_links(graph_index, artist_data)
+        write_edge_rounds_parallel(
+            driver,
+            VERSIONED_RELATED_TO_QUERY,
+            schedule_edge_rounds(links),
+            "RELATED_TO",
+            {"version": version}
+        )
+        print(f"[NEO4J] Wrote version {version}: {len(artist_data)} artists, {len(links)} relationships "
+              f"({NEO4J_WRITE_PARTITIONS} partitions).")
+
+        previous = flip_current_top_version(session, version)
+        print(f"[NEO4J] Current top artist version flipped {previous} -> {version}.")
+
+        # Top artist membership changed with the flip, so drop cached metadata for old and new members
+        invalidate_artist_metadata(
+            [artist.spotifyId for artist in artist_data]
+            + [graph_index.get(i).spotifyId for i in graph_index.top_artist_ids]
+        )
+        invalidate_user_tagged_ids(tag for row in rows for tag in row["userTags"])
+
+    except Exception as e:
+        print(f"[NEO4J] Error publishing version {version}, current version left unchanged: {e}")
+        return None
+    finally:
+        session.close()
+        driver.close()
+
+    record_exported_artists(artist_data)
+    if background_gc:
+        threading.Thread(
+            target=garbage_collect_top_versions,
+            args=(version,),
+            name=f"neo4j-gc-{version}",
+        ).start()
+    else:
+        garbage_collect_top_versions(version)
+
+    return version
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, Optional
+
+from services.redis import async_redis_client, redis_client
+
+# Fleet-wide upstream budgets in requests/second, shared by every API replica, worker and cron run
+RATE_LIMITS = {
+    "api.spotify.com": float(os.getenv("RATE_LIMIT_SPOTIFY_RPS", "8")),
+    "accounts.spotify.com": float(os.getenv("RATE_LIMIT_SPOTIFY_AUTH_RPS", "1")),
+    "ws.audioscrobbler.com": float(os.getenv("RATE_LIMIT_LASTFM_RPS", "5")),
+    "musicbrainz.org": float(os.getenv("RATE_LIMIT_MUSICBRAINZ_RPS", "1")),
+}
+DEFAULT_RATE_LIMIT = float(os.getenv("RATE_LIMIT_DEFAULT_RPS", "5"))
+RATE_LIMIT_SAFETY_FACTOR = float(os.getenv("RATE_LIMIT_SAFETY_FACTOR", "0.9"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "2"))
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "120"))
+
+# Share of each upstream budget guaranteed per caller class, so the cron job cannot starve user requests.
+# Capacity other classes leave idle can be borrowed through the fleet-wide key.
+CALLER_CLASS = os.getenv("RATE_LIMIT_CALLER_CLASS", os.getenv("APP_MODE", "server"))
+
+
+def _parse_shares(raw: str) -> Dict[str, float]:
+    shares = {}
+    for part in raw.split(","):
+        if ":" in part:
+            name, share = part.split(":", 1)
+            shares[name.strip()] = float(share)
+    return shares
+
+
+CALLER_CLASS_SHARES = _parse_shares(os.getenv(
+    "RATE_LIMIT_CLASS_SHARES",
+    "server:0.4,ingest-worker:0.3,retry-worker:0.1,cron:0.2"
+))
+
+# GCRA: one "theoretical arrival time" per key, advanced by the emission interval on every
+# allowed request. Uses the Redis clock so replicas with skewed clocks still agree.
+# A request first spends its class's guaranteed share (KEYS[1]) and is charged to the fleet-wide
+# key (KEYS[3]) as well, even past its limit, so borrowers back off while owners use their share.
+# Without guaranteed capacity it may borrow whatever the fleet-wide key has left.
+_GCRA_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local cooldown = redis.call('PTTL', KEYS[2])
+if cooldown > 0 then
+    return cooldown
+end
+
+local function gcra(key, emission, tolerance, force)
+    local tat = tonumber(redis.call('GET', key) or now)
+    if tat < now then
+        tat = now
+    end
+    local allow_at = tat - tolerance
+    if now < allow_at and not force then
+        return allow_at - now
+    end
+    local new_tat = tat + emission
+    redis.call('SET', key, new_tat, 'PX', math.ceil(new_tat - now + tolerance + 1000))
+    return 0
+end
+
+local class_wait = gcra(KEYS[1], tonumber(ARGV[1]), tonumber(ARGV[2]), false)
+if class_wait == 0 then
+    gcra(KEYS[3], tonumber(ARGV[3]), tonumber(ARGV[4]), true)
+    return 0
+end
+
+local fleet_wait = gcra(KEYS[3], tonumber(ARGV[3]), tonumber(ARGV[4]), false)
+if fleet_wait == 0 then
+    return 0
+end
+return math.min(class_wait, fleet_wait)
+"""
+
+_gcra_script = redis_client.register_script(_GCRA_LUA)
+_gcra_script_async = async_redis_client.register_script(_GCRA_LUA)
+
+
+def credential_fingerprint(credential: Optional[str]) -> str:
+    if not credential:
+        return "anon"
+    return hashlib.sha1(credential.encode("utf-8")).hexdigest()[:12]
+
+
+class RateLimitTimeout(TimeoutError):
+    pass
+
+
+def _keys(host: str, credential: Optional[str], caller_class: str):
+    base = f"ratelimit:{host}:{credential_fingerprint(credential)}"
+    return f"{base}:{caller_class}", f"{base}:cooldown", f"{base}:fleet"
+
+
+def _emission_interval_ms(host: str, share: float) -> float:
+    rps = RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT) * RATE_LIMIT_SAFETY_FACTOR
+    return 1000.0 / max(rps * share, 1e-6)
+
+
+def _script_args(host: str, credential: Optional[str], caller_class: str):
+    share = CALLER_CLASS_SHARES.get(caller_class, min(CALLER_CLASS_SHARES.values(), default=1.0))
+    emission = _emission_interval_ms(host, share)
+    fleet_emission = _emission_interval_ms(host, 1.0)
+    tolerance = max(RATE_LIMIT_BURST - 1, 0)
+    return list(_keys(host, credential, caller_class)), [
+        emission, emission * tolerance, fleet_emission, fleet_emission * tolerance
+    ]
+
+
+def try_acquire(host: str, credential: Optional[str] = None, caller_class: str = CALLER_CLASS) -> float:
+    """
+    Returns 0 when the request may proceed now, otherwise the number of
+    milliseconds to wait before trying again.
+    """
+    keys, args = _script_args(host, credential, caller_class)
+    return float(_gcra_script(keys=keys, args=args))
+
+
+def acquire(host: str, credential: Optional[str] = None, caller_class: str = CALLER_CLASS):
+    deadline = time.monotonic() + RATE_LIMIT_MAX_WAIT_SECONDS
+    while True:
+        try:
+            wait_ms = try_acquire(host, credential, caller_class)
+        except Exception as e:
+            # Fail open: an unavailable limiter must not stop ingestion
+            print(f"[RATELIMIT] Limiter unavailable for {host}, proceeding: {e}")
+            return
+
+        if wait_ms <= 0:
+            return
+        remaining = deadline - time.monotonic()
+        if wait_ms / 1000 > remaining:
+            # Never proceed early: a long Retry-After cooldown must hold every caller back
+            time.sleep(max(remaining, 0))
+            raise RateLimitTimeout(f"Rate limit for {host} not available within {RATE_LIMIT_MAX_WAIT_SECONDS}s")
+        time.sleep(wait_ms / 1000)
+
+
+async def acquire_async(host: str, credential: Optional[str] = None, caller_class: str = CALLER_CLASS):
+    # Same budget as acquire(), but waits on the event loop instead of blocking a thread
+    deadline = time.monotonic() + RATE_LIMIT_MAX_WAIT_SECONDS
+    keys, args = _script_args(host, credential, caller_class)
+    while True:
+        try:
+            wait_ms = float(await _gcra_script_async(keys=keys, args=args))
+        except Exception as e:
+            print(f"[RATELIMIT] Limiter unavailable for {host}, proceeding: {e}")
+            return
+
+        if wait_ms <= 0:
+            return
+        remaining = deadline - time.monotonic()
+        if wait_ms / 1000 > remaining:
+            await asyncio.sleep(max(remaining, 0))
+            raise RateLimitTimeout(f"Rate limit for {host} not available within {RATE_LIMIT_MAX_WAIT_SECONDS}s")
+        await asyncio.sleep(wait_ms / 1000)
+
+
+def _cooldown_ms(retry_after_seconds: Optional[float]) -> int:
+    return max(int((retry_after_seconds if retry_after_seconds is not None else 5) * 1000), 1)
+
+
+def report_throttled(host: str, credential: Optional[str] = None, retry_after_seconds: Optional[float] = None):
+    # An upstream 429 pauses every caller class for this host/credential, not just the one that hit it
+    cooldown_ms = _cooldown_ms(retry_after_seconds)
+    _, cooldown_key, _ = _keys(host, credential, CALLER_CLASS)
+    try:
+        redis_client.set(cooldown_key, 1, px=cooldown_ms)
+        print(f"[RATELIMIT] {host} returned 429, pausing all callers for {cooldown_ms}ms.")
+    except Exception as e:
+        print(f"[RATELIMIT] Failed to record cooldown for {host}: {e}")
+
+
+async def report_throttled_async(host: str, credential: Optional[str] = None,
+                                 retry_after_seconds: Optional[float] = None):
+    cooldown_ms = _cooldown_ms(retry_after_seconds)
+    _, cooldown_key, _ = _keys(host, credential, CALLER_CLASS)
+    try:
+        await async_redis_client.set(cooldown_key, 1, px=cooldown_ms)
+        print(f"[RATELIMIT] {host} returned 429, pausing all callers for {cooldown_ms}ms.")
+    except Exception as e:
+        print(f"[RATELIMIT] Failed to record cooldown for {host}: {e}")
@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio
 import json
 import os
 from datetime import timedelta
@@ -7,6 +8,11 @@ REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 EX = int(os.getenv("REDIS_DATA_EXPIRATION_TIME_LIMIT", "3600"))
 
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+# Used by the async ingestion path; shares the server's event loop, so only touch it from async code
+async_redis_client = redis.asyncio.Redis.from_url(REDIS_URL, decode_responses=True)
+# Raw bytes clients for pre-encoded payloads such as the compressed graph snapshots
+binary_redis_client = redis.Redis.from_url(REDIS_URL)
+async_binary_redis_client = redis.asyncio.Redis.from_url(REDIS_URL)
 
 def get_from_cache(key):
     try:
@@ -33,4 +39,68 @@ def delete_from_cache(key):
         redis_client.delete(key)
         print(f"[Redis] Deleted key: {key}")
     except Exception as e:
-        print(f"[Redis] Delete error for key {key}:", e)
\ No newline at end of file
+        print(f"[Redis] Delete error for key {key}:", e)
+
+def get_many_from_cache(keys):
+    keys = list(keys)
+    if not keys:
+        return {}
+    try:
+        values = redis_client.mget(keys)
+        found = {key: json.loads(value) for key, value in zip(keys, values) if value}
+        print(f"[Redis] MGET {len(keys)} keys: {len(found)} hits, {len(keys) - len(found)} misses")
+        return found
+    except Exception as e:
+        print(f"[Redis] MGET error for {len(keys)} keys:", e)
+        return {}
+
+def set_many_to_cache(mapping, ex=EX):
+    if not mapping:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.setex(key, timedelta(seconds=ex), json.dumps(value))
+        pipe.execute()
+        print(f"[Redis] Set {len(mapping)} keys")
+    except Exception as e:
+        print(f"[Redis] Pipelined set error for {len(mapping)} keys:", e)
+
+def delete_many_from_cache(keys):
+    keys = list(keys)
+    if not keys:
+        return
+    try:
+        redis_client.delete(*keys)
+        print(f"[Redis] Deleted {len(keys)} keys")
+    except Exception as e:
+        print(f"[Redis] Delete error for {len(keys)} keys:", e)
+
+async def set_to_cache_async(key, value, ex=EX):
+    try:
+        await async_redis_client.setex(key, timedelta(seconds=ex), json.dumps(value))
+        print(f"[Redis] Set for key: {key}")
+    except Exception as e:
+        print(f"[Redis] Set error for key {key}:", e)
+
+async def set_many_to_cache_async(mapping, ex=EX):
+    if not mapping:
+        return
+    try:
+        pipe = async_redis_client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.setex(key, timedelta(seconds=ex), json.dumps(value))
+        await pipe.execute()
+        print(f"[Redis] Set {len(mapping)} keys")
+    except Exception as e:
+        print(f"[Redis] Pipelined set error for {len(mapping)} keys:", e)
+
+async def delete_many_from_cache_async(keys):
+    keys = list(keys)
+    if not keys:
+        return
+    try:
+        await async_redis_client.delete(*keys)
+        print(f"[Redis] Deleted {len(keys)} keys")
+    except Exception as e:
+        print(f"[Redis] Delete error for {len(keys)} keys:", e)
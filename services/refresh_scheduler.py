@@ -0,0 +1,145 @@
+import math
+import os
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from neo4j import Session
+
+from services.artist_lookup import IS_TOP_ARTIST
+
+load_dotenv()
+
+# Hard staleness limits: on-demand ingestion re-fetches anything older than these
+CUSTOM_ARTIST_MAX_AGE_DAYS = int(os.getenv("CUSTOM_ARTIST_MAX_AGE_DAYS", "90"))
+BULK_INGEST_MAX_AGE_DAYS = int(os.getenv("BULK_INGEST_MAX_AGE_DAYS", "30"))
+
+# Upstream requests a scheduled run may spend, chart sync included
+REFRESH_REQUEST_BUDGET = int(os.getenv("REFRESH_REQUEST_BUDGET", "8000"))
+# Artists become due somewhere in the last REFRESH_SPREAD fraction of their max age, at a point
+# fixed by a hash of their id, so a cohort ingested on the same day is refreshed over many runs
+REFRESH_SPREAD = float(os.getenv("REFRESH_SPREAD", "0.5"))
+
+# Spotify by id (50 per request), Last.fm getinfo + getsimilar, one MusicBrainz search
+REQUESTS_PER_ARTIST = 1 / 50 + 2 + 1
+# The chart itself is paged 50 artists at a time
+CHART_PAGE_SIZE = 50
+# Chart artists the graph does not know yet are looked up on Spotify by name
+REQUESTS_PER_NEW_CHART_ARTIST = 1 + 2 + 1
+
+REFRESH_CANDIDATES_QUERY = f"""
+MATCH (a:Artist)
+WHERE a.spotifyId IS NOT NULL
+RETURN a.id AS id,
+       a.spotifyId AS spotifyId,
+       a.lastUpdated AS lastUpdated,
+       a.popularity AS popularity,
+       a.rank AS rank,
+       {IS_TOP_ARTIST} AS isTopArtist,
+       size(coalesce(a.userTags, [])) AS tagCount
+"""
+
+
+@dataclass
+class RefreshCandidate:
+    id: str
+    spotifyId: str
+    lastUpdated: Optional[str] = None
+    popularity: int = 0
+    rank: Optional[int] = None
+    isTopArtist: bool = False
+    tagCount: int = 0
+
+
+def days_since(last_updated: Optional[str], now: Optional[datetime] = None) -> float:
+    """Age of a lastUpdated timestamp in days; missing or unparseable timestamps are infinitely old."""
+    if not last_updated:
+        return math.inf
+    try:
+        updated = datetime.fromisoformat(last_updated)
+    except (TypeError, ValueError):
+        return math.inf
+    if updated.tzinfo is None:
+        updated = updated.replace(tzinfo=timezone.utc)
+    return ((now or datetime.now(timezone.utc)) - updated).total_seconds() / 86400
+
+
+def is_stale(last_updated: Optional[str], max_age_days: int, now: Optional[datetime] = None) -> bool:
+    return days_since(last_updated, now) >= max_age_days
+
+
+def refresh_phase(artist_id: str) -> float:
+    return zlib.crc32((artist_id or "").encode("utf-8")) / 0xFFFFFFFF
+
+
+def due_age_days(artist_id: str, max_age_days: int = CUSTOM_ARTIST_MAX_AGE_DAYS) -> float:
+    return max_age_days * (1 - REFRESH_SPREAD * refresh_phase(artist_id))
+
+
+def refresh_priority(candidate: RefreshCandidate, now: Optional[datetime] = None,
+                     max_age_days: int = CUSTOM_ARTIST_MAX_AGE_DAYS) -> float:
+    """
+    Value of refreshing an artist now: how far past its due age it is,
+    weighted by popularity, chart rank and how many users tagged it.
+    Artists that are not yet due score 0.
+    """
+    due = due_age_days(candidate.id, max_age_days)
+    staleness = min(days_since(candidate.lastUpdated, now) / due, 10.0)
+    if staleness < 1:
+        return 0.0
+
+    popularity = 1 + (candidate.popularity or 0) / 100
+    if candidate.rank:
+        rank = 1 + 1 / math.sqrt(candidate.rank)
+    else:
+        rank = 1.5 if candidate.isTopArtist else 1.0
+    tags = 1 + math.log1p(candidate.tagCount or 0)
+    return staleness * popularity * rank * tags
+
+
+def select_refresh_batch(candidates: List[RefreshCandidate], budget: float = REFRESH_REQUEST_BUDGET,
+                         max_artists: Optional[int] = None,
+                         now: Optional[datetime] = None) -> List[RefreshCandidate]:
+    """
+    Greedy pick of due artists by priority until the request budget is
+    spent. Every artist costs the same, so this is the highest-value set
+    that fits; whatever does not fit stays due and ranks higher next run.
+    """
+    now = now or datetime.now(timezone.utc)
+    scored = [(refresh_priority(candidate, now), candidate) for candidate in candidates]
+    scored = [(score, candidate) for score, candidate in scored if score > 0]
+    scored.sort(key=lambda item: (-item[0], item[1].id))
+
+    capacity = max(int(budget // REQUESTS_PER_ARTIST), 0)
+    if max_artists is not None:
+        capacity = min(capacity, max_artists)
+    selected = [candidate for _, candidate in scored[:capacity]]
+    print(f"[SCHEDULER] {len(scored)} of {len(candidates)} artists are due, refreshing {len(selected)} "
+          f"within a budget of {budget:.0f} requests.")
+    return selected
+
+
+def load_refresh_candidates(session: Session) -> List[RefreshCandidate]:
+    return [
+        RefreshCandidate(
+            id=record["id"],
+            spotifyId=record["spotifyId"],
+            lastUpdated=record["lastUpdated"],
+            popularity=record["popularity"] or 0,
+            rank=record["rank"],
+            isTopArtist=record["isTopArtist"],
+            tagCount=record["tagCount"] or 0
+        )
+        for record in session.run(REFRESH_CANDIDATES_QUERY)
+    ]
+
+
+def chart_refresh_cost(chart_artists: int, new_artists: int) -> float:
+    """
+    Requests a chart sync spends before scheduling: the chart pages, plus a
+    full lookup for every chart artist not yet in the graph. Chart artists
+    the graph knows are scheduled like any other candidate.
+    """
+    return chart_artists / CHART_PAGE_SIZE + new_artists * REQUESTS_PER_NEW_CHART_ARTIST
@@ -0,0 +1,134 @@
+import os
+import signal
+import threading
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+from model.artist_node import ArtistNode
+from model.incomplete_artist import IncompleteArtist
+from services.combine_artist_data import implement_genre_data
+from services.lastfm import fetch_artist_details
+from services.musicbrainz import fetch_artist_genre_data
+from services.mysql_export import (
+    delete_incomplete_artists,
+    fetch_due_incomplete_artists,
+    upsert_incomplete_artists,
+)
+from services.mysql_pool import mysql_connection
+from services.neo4j_export import export_artist_data_to_neo4j
+from services.spotify import fetch_spotify_data
+
+load_dotenv()
+
+RETRY_BATCH_SIZE = int(os.getenv("RETRY_BATCH_SIZE", "50"))
+RETRY_POLL_INTERVAL_SECONDS = int(os.getenv("RETRY_POLL_INTERVAL_SECONDS", "60"))
+RETRY_BASE_DELAY_SECONDS = int(os.getenv("RETRY_BASE_DELAY_SECONDS", "900"))
+RETRY_MAX_DELAY_SECONDS = int(os.getenv("RETRY_MAX_DELAY_SECONDS", str(7 * 24 * 3600)))
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "10"))
+
+stop_event = threading.Event()
+
+
+def _group_by_artist(rows: List[IncompleteArtist]) -> Dict[str, List[IncompleteArtist]]:
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.spotify_id, []).append(row)
+    return grouped
+
+
+def retry_incomplete_artists_once(limit: int = RETRY_BATCH_SIZE) -> int:
+    with mysql_connection() as conn:
+        due = fetch_due_incomplete_artists(
+            conn,
+            limit=limit,
+            base_delay_seconds=RETRY_BASE_DELAY_SECONDS,
+            max_delay_seconds=RETRY_MAX_DELAY_SECONDS,
+            max_attempts=RETRY_MAX_ATTEMPTS
+        )
+        if not due:
+            return 0
+
+        grouped = _group_by_artist(due)
+        print(f"[RETRY] Retrying {len(grouped)} incomplete artists ({len(due)} user tags)...")
+
+        artists = [
+            ArtistNode(
+                id=spotify_id,
+                name="",
+                spotifyId=spotify_id,
+                userTags=sorted({row.user_tag for row in rows}),
+                relatedArtists=[],
+                genres=[]
+            )
+            for spotify_id, rows in grouped.items()
+        ]
+
+        original_ids = [artist.spotifyId for artist in artists]
+
+        # Each stage already processes the whole list in one pass (Spotify resolves ids 50 at a time)
+        artists = fetch_spotify_data(artists, write_to_file=False)
+        artists = fetch_artist_details(artists, write_to_file=False)
+        artists = fetch_artist_genre_data(artists, write_to_file=False)
+        finalized = implement_genre_data(artists, top_artists=False)
+        finalized_ids = {id(artist) for artist in finalized}
+
+        exported = bool(finalized) and export_artist_data_to_neo4j(
+            finalized,
+            write_to_file=False,
+            add_top_artist_label=False
+        )
+
+        succeeded = []
+        failures = []
+        for spotify_id, artist in zip(original_ids, artists):
+            if exported and id(artist) in finalized_ids:
+                succeeded.append(spotify_id)
+                continue
+            if not artist.name:
+                reason = "retry: no Spotify data"
+            elif not artist.genres:
+                reason = "retry: no genres found after data fetching"
+            else:
+                reason = "retry: Neo4j export failed"
+            for row in grouped[spotify_id]:
+                failures.append(IncompleteArtist(
+                    spotify_id=row.spotify_id,
+                    user_tag=row.user_tag,
+                    name=artist.name or row.name,
+                    popularity=artist.popularity or row.popularity,
+                    image_url=artist.imageUrl or row.image_url,
+                    failure_reason=reason
+                ))
+
+        delete_incomplete_artists(conn, succeeded)
+        upsert_incomplete_artists(conn, failures, count_attempt=False)
+
+    print(f"[RETRY] Recovered {len(succeeded)} artists, {len(grouped) - len(succeeded)} still incomplete.")
+    return len(grouped)
+
+
+def run_retry_worker():
+    print(f"[RETRY] Worker started (batch={RETRY_BATCH_SIZE}, base delay={RETRY_BASE_DELAY_SECONDS}s, "
+          f"max attempts={RETRY_MAX_ATTEMPTS}).")
+    while not stop_event.is_set():
+        try:
+            processed = retry_incomplete_artists_once()
+        except Exception as e:
+            print(f"[RETRY] Error while retrying incomplete artists: {e}")
+            processed = 0
+
+        if not processed:
+            stop_event.wait(RETRY_POLL_INTERVAL_SECONDS)
+    print("[RETRY] Worker stopped.")
+
+
+def _handle_stop(signum, frame):
+    print(f"[RETRY] Received signal {signum}, finishing current batch...")
+    stop_event.set()
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+    run_retry_worker()
@@ -0,0 +1,275 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from services.redis import async_redis_client, redis_client
+
+SINGLE_FLIGHT_LOCK_TTL_MS = int(os.getenv("SINGLE_FLIGHT_LOCK_TTL_MS", str(10 * 60 * 1000)))
+SINGLE_FLIGHT_RESULT_TTL_SECONDS = int(os.getenv("SINGLE_FLIGHT_RESULT_TTL_SECONDS", "120"))
+SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS = float(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS", "600"))
+SINGLE_FLIGHT_POLL_SECONDS = float(os.getenv("SINGLE_FLIGHT_POLL_SECONDS", "0.5"))
+
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_release_script = redis_client.register_script(_RELEASE_LUA)
+_release_script_async = async_redis_client.register_script(_RELEASE_LUA)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# Event-loop callers coalesce on futures instead; no lock needed since the loop is single-threaded
+_inflight_async = {}
+
+
+def single_flight(key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+    """
+    Runs fn once per key across threads in this process and, through a Redis
+    lock, across workers. Returns (result, leader) where leader is True only
+    for the caller that actually ran fn; everyone else gets the leader's
+    (JSON-serializable) result.
+    """
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            _inflight[key] = call
+
+    if not leader:
+        call.done.wait(SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS)
+        if call.error:
+            raise call.error
+        return call.result, False
+
+    try:
+        call.result, leader = _run_distributed(key, fn)
+        return call.result, leader
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        call.done.set()
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _keys(key: str) -> Tuple[str, str]:
+    return f"singleflight:lock:{key}", f"singleflight:result:{key}"
+
+
+def _run_distributed(key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+    lock_key, result_key = _keys(key)
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS
+
+    while True:
+        try:
+            acquired = redis_client.set(lock_key, token, nx=True, px=SINGLE_FLIGHT_LOCK_TTL_MS)
+            holder = None if acquired else redis_client.get(lock_key)
+        except Exception as e:
+            print(f"[SINGLEFLIGHT] Redis unavailable for {key}, running without coordination: {e}")
+            return fn(), True
+
+        if acquired:
+            try:
+                result = fn()
+                redis_client.set(
+                    result_key,
+                    json.dumps({"token": token, "result": result}),
+                    ex=SINGLE_FLIGHT_RESULT_TTL_SECONDS
+                )
+                return result, True
+            finally:
+                _release_script(keys=[lock_key], args=[token])
+
+        if holder is None:
+            continue
+
+        print(f"[SINGLEFLIGHT] {key} is already in flight on another worker, waiting...")
+        while time.monotonic() < deadline:
+            # Read the lock before the result: the leader writes its result before releasing
+            current_holder = redis_client.get(lock_key)
+            cached = redis_client.get(result_key)
+            if cached:
+                payload = json.loads(cached)
+                if payload.get("token") == holder:
+                    return payload.get("result"), False
+            if current_holder != holder:
+                # Holder released or expired without a result for us, compete for the lock again
+                break
+            time.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+        else:
+            raise TimeoutError(f"Timed out waiting for in-flight {key}")
+
+
+async def single_flight_async(key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+    """
+    Async counterpart of single_flight, sharing its Redis lock and result
+    keys so sync workers and async servers coalesce with each other.
+    """
+    call = _inflight_async.get(key)
+    if call is not None:
+        return await asyncio.wait_for(asyncio.shield(call), SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS), False
+
+    call = asyncio.get_running_loop().create_future()
+    _inflight_async[key] = call
+    try:
+        result, leader = await _run_distributed_async(key, fn)
+        call.set_result(result)
+        return result, leader
+    except BaseException as e:
+        call.set_exception(e)
+        # Mark retrieved so an exception nobody waited for isn't logged as unhandled
+        call.exception()
+        raise
+    finally:
+        _inflight_async.pop(key, None)
+
+
+async def _run_distributed_async(key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+    lock_key, result_key = _keys(key)
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS
+
+    while True:
+        try:
+            acquired = await async_redis_client.set(lock_key, token, nx=True, px=SINGLE_FLIGHT_LOCK_TTL_MS)
+            holder = None if acquired else await async_redis_client.get(lock_key)
+        except Exception as e:
+            print(f"[SINGLEFLIGHT] Redis unavailable for {key}, running without coordination: {e}")
+            return await fn(), True
+
+        if acquired:
+            try:
+                result = await fn()
+                await async_redis_client.set(
+                    result_key,
+                    json.dumps({"token": token, "result": result}),
+                    ex=SINGLE_FLIGHT_RESULT_TTL_SECONDS
+                )
+                return result, True
+            finally:
+                await _release_script_async(keys=[lock_key], args=[token])
+
+        if holder is None:
+            continue
+
+        print(f"[SINGLEFLIGHT] {key} is already in flight on another worker, waiting...")
+        while time.monotonic() < deadline:
+            current_holder = await async_redis_client.get(lock_key)
+            cached = await async_redis_client.get(result_key)
+            if cached:
+                payload = json.loads(cached)
+                if payload.get("token") == holder:
+                    return payload.get("result"), False
+            if current_holder != holder:
+                break
+            await asyncio.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+        else:
+            raise TimeoutError(f"Timed out waiting for in-flight {key}")
+
+
+async def single_flight_many_async(keys: List[str],
+                                   fn: Callable[[List[str]], Awaitable[Dict[str, Any]]]) -> Dict[str, Tuple[Any, bool]]:
+    """
+    Batch form of single_flight_async. Claims every key that is not already
+    in flight in this process or on another worker, runs fn once with the
+    claimed keys (fn returns a result per key) and joins the rest as a
+    follower. Returns {key: (result, leader)}; a follower whose wait failed
+    gets the exception as its result.
+    """
+    loop = asyncio.get_running_loop()
+    keys = list(dict.fromkeys(keys))
+
+    # Take the local claims before the first await, so overlapping batches in this process never share a key
+    joined = {key: _inflight_async[key] for key in keys if key in _inflight_async}
+    local = [key for key in keys if key not in joined]
+    for key in local:
+        _inflight_async[key] = loop.create_future()
+
+    token = uuid.uuid4().hex
+    claimed, remote = [], []
+    for key in local:
+        try:
+            acquired = await async_redis_client.set(_keys(key)[0], token, nx=True, px=SINGLE_FLIGHT_LOCK_TTL_MS)
+        except Exception as e:
+            print(f"[SINGLEFLIGHT] Redis unavailable for {key}, running without coordination: {e}")
+            acquired = True
+        (claimed if acquired else remote).append(key)
+
+    async def run_one(key):
+        return (await fn([key])).get(key)
+
+    async def follow(key):
+        # Held on another worker: wait for its result, or take over if it gives up, on behalf of local joiners too
+        call = _inflight_async[key]
+        try:
+            result, leader = await _run_distributed_async(key, lambda: run_one(key))
+            call.set_result(result)
+            return result, leader
+        except BaseException as e:
+            call.set_exception(e)
+            call.exception()
+            raise
+        finally:
+            _inflight_async.pop(key, None)
+
+    async def join(call):
+        return await asyncio.wait_for(asyncio.shield(call), SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS), False
+
+    followers = remote + list(joined)
+    follower_waits = asyncio.gather(
+        *(follow(key) for key in remote),
+        *(join(call) for call in joined.values()),
+        return_exceptions=True
+    )
+
+    results = {}
+    try:
+        results = await fn(claimed) if claimed else {}
+        for key in claimed:
+            try:
+                await async_redis_client.set(
+                    _keys(key)[1],
+                    json.dumps({"token": token, "result": results.get(key)}),
+                    ex=SINGLE_FLIGHT_RESULT_TTL_SECONDS
+                )
+            except Exception as e:
+                print(f"[SINGLEFLIGHT] Failed to publish result for {key}: {e}")
+    except BaseException as e:
+        follower_waits.cancel()
+        for key in claimed:
+            _inflight_async[key].set_exception(e)
+            _inflight_async[key].exception()
+        raise
+    finally:
+        for key in claimed:
+            call = _inflight_async.pop(key)
+            if not call.done():
+                call.set_result(results.get(key))
+            try:
+                await _release_script_async(keys=[_keys(key)[0]], args=[token])
+            except Exception as e:
+                print(f"[SINGLEFLIGHT] Failed to release {key}: {e}")
+
+    outcomes = {key: (results.get(key), True) for key in claimed}
+    for key, outcome in zip(followers, await follower_waits):
+        outcomes[key] = (outcome, False) if isinstance(outcome, BaseException) else outcome
+    return outcomes
@@ -8,10 +8,14 @@ import requests
 from dotenv import load_dotenv
 
 from model.artist_node import ArtistNode
+from services import http_client
+from services.entity_resolution import get_entity_index, normalize_name
 
 load_dotenv()
 
-MAX_ARTIST_LOOKUP = 1000
+MAX_ARTIST_LOOKUP = int(os.getenv("SPOTIFY_MAX_ARTISTS", "1000"))
+SPOTIFY_IDS_PER_REQUEST = 50
+SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
 SPOTIFY_NAME_SEARCH_URL = "https://api.spotify.com/v1/search"
 SPOTIFY_ID_SEARCH_URL = "https://api.spotify.com/v1/artists"
@@ -24,41 +28,117 @@ os.makedirs(temp_dir, exist_ok=True)
 lastfm_artist_path = os.path.join(temp_dir, "lastfmArtists.json")
 spotify_output_path = os.path.join(temp_dir, "spotifyArtists.json")
 
-def normalize_name(name):
-    return ''.join(c.lower() for c in name if c.isalnum()).strip()
 
-def get_spotify_access_token():
+def _token_request_headers():
     client_id = os.getenv("SPOTIFY_CLIENT_ID")
     client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
     auth_str = f"{client_id}:{client_secret}"
     auth_bytes = base64.b64encode(auth_str.encode()).decode()
 
-    headers = {
+    return {
         "Authorization": f"Basic {auth_bytes}",
         "Content-Type": "application/x-www-form-urlencoded"
     }
 
-    response = requests.post(SPOTIFY_TOKEN_URL, headers=headers, data={"grant_type": "client_credentials"})
+def get_spotify_access_token():
+    response = http_client.post(
+        SPOTIFY_TOKEN_URL,
+        credential=os.getenv("SPOTIFY_CLIENT_ID"),
+        headers=_token_request_headers(),
+        data={"grant_type": "client_credentials"}
+    )
     response.raise_for_status()
     return response.json()["access_token"]
 
+_async_token = {"value": None, "expiresAt": 0.0}
+
+async def get_spotify_access_token_async():
+    # Reused until shortly before expiry so concurrent ingestions don't each request a token
+    if _async_token["value"] and time.monotonic() < _async_token["expiresAt"]:
+        return _async_token["value"]
+
+    response = await http_client.post_async(
+        SPOTIFY_TOKEN_URL,
+        credential=os.getenv("SPOTIFY_CLIENT_ID"),
+        headers=_token_request_headers(),
+        data={"grant_type": "client_credentials"}
+    )
+    response.raise_for_status()
+    payload = response.json()
+    _async_token["value"] = payload["access_token"]
+    _async_token["expiresAt"] = time.monotonic() + payload.get("expires_in", 3600) - 60
+    return _async_token["value"]
+
 
 def fetch_spotify_artist_by_id(spotify_id, token):
     url = f"{SPOTIFY_ID_SEARCH_URL}/{spotify_id}"
     headers = {"Authorization": f"Bearer {token}"}
 
-    response = requests.get(url, headers=headers, timeout=10)
+    response = http_client.get(url, credential=SPOTIFY_CLIENT_ID, headers=headers, timeout=10)
     if response.status_code == 404:
         return None
     response.raise_for_status()
     return response.json()
 
+def fetch_spotify_artists_by_ids(spotify_ids, token) -> dict:
+    found = {}
+    headers = {"Authorization": f"Bearer {token}"}
+    ids = list(dict.fromkeys(i for i in spotify_ids if i))
+
+    for start in range(0, len(ids), SPOTIFY_IDS_PER_REQUEST):
+        chunk = ids[start:start + SPOTIFY_IDS_PER_REQUEST]
+        response = http_client.get(
+            SPOTIFY_ID_SEARCH_URL,
+            credential=SPOTIFY_CLIENT_ID,
+            params={"ids": ",".join(chunk)},
+            headers=headers,
+            timeout=10
+        )
+        response.raise_for_status()
+        for spotify_artist in response.json().get("artists", []):
+            if spotify_artist:
+                found[spotify_artist["id"]] = spotify_artist
+    return found
+
+async def fetch_spotify_artists_by_ids_async(spotify_ids, token) -> dict:
+    found = {}
+    headers = {"Authorization": f"Bearer {token}"}
+    ids = list(dict.fromkeys(i for i in spotify_ids if i))
+
+    for start in range(0, len(ids), SPOTIFY_IDS_PER_REQUEST):
+        chunk = ids[start:start + SPOTIFY_IDS_PER_REQUEST]
+        response = await http_client.get_async(
+            SPOTIFY_ID_SEARCH_URL,
+            credential=SPOTIFY_CLIENT_ID,
+            params={"ids": ",".join(chunk)},
+            headers=headers
+        )
+        response.raise_for_status()
+        for spotify_artist in response.json().get("artists", []):
+            if spotify_artist:
+                found[spotify_artist["id"]] = spotify_artist
+    return found
+
+def apply_spotify_artist(artist: ArtistNode, spotify_artist: dict):
+    artist.spotifyId = spotify_artist.get("id", artist.spotifyId)
+    artist.id = artist.spotifyId
+    artist.name = spotify_artist.get("name", artist.name)
+    artist.popularity = spotify_artist.get("popularity", None)
+    artist.spotifyUrl = spotify_artist.get("external_urls", {}).get("spotify", artist.spotifyUrl)
+
+    if spotify_artist.get("images"):
+        artist.imageUrl = spotify_artist["images"][0].get("url", artist.imageUrl)
+
+    if spotify_artist.get("genres"):
+        genres_as_dicts = [{"name": genre} for genre in spotify_artist.get("genres", [])]
+        artist.append_genres(genres_as_dicts)
+
 def search_spotify_artist_by_name(artist_name, token):
     query = requests.utils.quote(artist_name)
     url = f"{SPOTIFY_NAME_SEARCH_URL}?q={query}&type=artist&limit=3"
     headers = {"Authorization": f"Bearer {token}"}
 
-    response = requests.get(url, headers=headers, timeout=10)
+    response = http_client.get(url, credential=SPOTIFY_CLIENT_ID, headers=headers, timeout=10)
     response.raise_for_status()
     items = response.json().get("artists", {}).get("items", [])
     if not items:
@@ -82,6 +162,34 @@ def fetch_spotify_data(
     seen = set()
     i = 1
 
+    # Artists exported in earlier runs resolve to their Spotify ID through the entity index,
+    # which turns a name search per artist into a share of a 50-id batch lookup
+    remembered = {}
+    try:
+        unresolved = [artist for artist in artists[:MAX_ARTIST_LOOKUP] if not artist.spotifyId]
+        for artist, spotify_id in zip(unresolved, get_entity_index().resolve_artists(unresolved)):
+            if spotify_id:
+                remembered[id(artist)] = spotify_id
+    except Exception as err:
+        print(f"[SPOTIFY] Entity index unavailable, searching by name: {err}")
+
+    # Resolve every known Spotify ID up front, 50 per request
+    prefetched = {}
+    try:
+        prefetched = fetch_spotify_artists_by_ids(
+            [a.spotifyId for a in artists[:MAX_ARTIST_LOOKUP]] + list(remembered.values()), token
+        )
+    except Exception as err:
+        print(f"[SPOTIFY] Batch lookup failed, falling back to single lookups: {err}")
+
+    for artist in artists[:MAX_ARTIST_LOOKUP]:
+        # Only trust a remembered ID that Spotify still returns
+        if remembered.get(id(artist)) in prefetched:
+            artist.spotifyId = remembered[id(artist)]
+    if remembered:
+        print(f"[SPOTIFY] Resolved {sum(sid in prefetched for sid in remembered.values())} artists "
+              f"from the entity index.")
+
     for artist in artists:
         if i > MAX_ARTIST_LOOKUP:
             break
@@ -99,7 +207,7 @@ def fetch_spotify_data(
 
             # Prefer lookup by Spotify ID if available
             if artist.spotifyId:
-                spotify_artist = fetch_spotify_artist_by_id(artist.spotifyId, token)
+                spotify_artist = prefetched.get(artist.spotifyId) or fetch_spotify_artist_by_id(artist.spotifyId, token)
                 print(f"[SPOTIFY] Found by Id: {spotify_artist}")
 
             # Fallback: if no result by ID, try searching by name
@@ -112,25 +220,14 @@ def fetch_spotify_data(
             if not spotify_artist:
                 print(f"[SPOTIFY] No match found for {name} ({artist.spotifyId})")
                 continue
-            name = spotify_artist.get("name", artist.name)
-            norm_name = normalize_name(name)
-            if norm_name in seen:
+            # The Spotify ID is the canonical id, so aliases that matched the same Spotify artist collapse here
+            key = spotify_artist.get("id") or f"name:{normalize_name(spotify_artist.get('name', artist.name))}"
+            if key in seen:
                 continue
-            seen.add(norm_name)
+            seen.add(key)
 
             # Update the ArtistNode fields
-            artist.spotifyId = spotify_artist.get("id", artist.spotifyId)
-            artist.id = artist.spotifyId
-            artist.name = name
-            artist.popularity = spotify_artist.get("popularity", None)
-            artist.spotifyUrl = spotify_artist.get("external_urls", {}).get("spotify", artist.spotifyUrl)
-
-            if spotify_artist.get("images"):
-                artist.imageUrl = spotify_artist["images"][0].get("url", artist.imageUrl)
-
-            if spotify_artist.get("genres"):
-                genres_as_dicts = [{"name": genre} for genre in spotify_artist.get("genres", [])]
-                artist.append_genres(genres_as_dicts)
+            apply_spotify_artist(artist, spotify_artist)
 
             i += 1
 
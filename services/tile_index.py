@@ -0,0 +1,106 @@
+import json
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Fixed world bounds so tile addresses stay stable across versions; genreMap coordinates fall in [0, ~20000]
+TILE_WORLD_SIZE = float(os.getenv("TILE_WORLD_SIZE", "20480"))
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "6"))
+# Level of detail: below the max zoom each tile keeps only its most popular artists
+TILE_MAX_ARTISTS = int(os.getenv("TILE_MAX_ARTISTS", "256"))
+
+TILE_FIELDS = ("id", "name", "x", "y", "color", "popularity")
+
+
+def tiles_key(version: str) -> str:
+    return f"graph:tiles:{version}"
+
+
+def tile_field(z: int, x: int, y: int) -> str:
+    return f"{z}/{x}/{y}"
+
+
+def tile_coords(px: float, py: float, z: int) -> Tuple[int, int]:
+    n = 1 << z
+    size = TILE_WORLD_SIZE / n
+    tx = min(max(int(px // size), 0), n - 1)
+    ty = min(max(int(py // size), 0), n - 1)
+    return tx, ty
+
+
+class TileIndex:
+    """
+    Fixed zoom-level tiles over the artist plane. Each tile lists node
+    indices by descending popularity, thinned to TILE_MAX_ARTISTS below
+    the max zoom, so a query touches only the tiles it overlaps and the
+    artists it returns.
+    """
+
+    def __init__(self, nodes: List[dict], max_zoom: int = TILE_MAX_ZOOM, max_per_tile: int = TILE_MAX_ARTISTS):
+        self.version: Optional[str] = None
+        self.nodes = [node for node in nodes if node.get("x") is not None and node.get("y") is not None]
+        self.max_zoom = max_zoom
+        self.max_per_tile = max_per_tile
+        self.tiles: Dict[Tuple[int, int, int], List[int]] = {}
+        self.totals: Dict[Tuple[int, int, int], int] = {}
+
+        by_popularity = sorted(
+            range(len(self.nodes)),
+            key=lambda i: (-(self.nodes[i].get("popularity") or 0), self.nodes[i].get("id") or "")
+        )
+        for z in range(max_zoom + 1):
+            for i in by_popularity:
+                node = self.nodes[i]
+                key = (z, *tile_coords(node["x"], node["y"], z))
+                self.totals[key] = self.totals.get(key, 0) + 1
+                members = self.tiles.setdefault(key, [])
+                if z == max_zoom or len(members) < max_per_tile:
+                    members.append(i)
+
+    def tile(self, z: int, x: int, y: int) -> List[int]:
+        return self.tiles.get((z, x, y), [])
+
+    def zoom_for_viewport(self, min_x: float, min_y: float, max_x: float, max_y: float) -> int:
+        span = max(max_x - min_x, max_y - min_y, 1.0)
+        return min(max(math.ceil(math.log2(TILE_WORLD_SIZE / span)), 0), self.max_zoom)
+
+    def query(self, min_x: float, min_y: float, max_x: float, max_y: float,
+              zoom: Optional[int] = None, limit: Optional[int] = None) -> List[dict]:
+        z = self.zoom_for_viewport(min_x, min_y, max_x, max_y) if zoom is None else min(max(zoom, 0), self.max_zoom)
+        x0, y0 = tile_coords(min_x, min_y, z)
+        x1, y1 = tile_coords(max_x, max_y, z)
+
+        visible = []
+        for tx in range(x0, x1 + 1):
+            for ty in range(y0, y1 + 1):
+                for i in self.tiles.get((z, tx, ty), ()):
+                    node = self.nodes[i]
+                    if min_x <= node["x"] <= max_x and min_y <= node["y"] <= max_y:
+                        visible.append(node)
+
+        if limit is not None and len(visible) > limit:
+            visible.sort(key=lambda node: -(node.get("popularity") or 0))
+            visible = visible[:limit]
+        return visible
+
+
+def encode_tile(index: TileIndex, z: int, x: int, y: int) -> bytes:
+    members = [index.nodes[i] for i in index.tile(z, x, y)]
+    payload = {
+        "z": z,
+        "x": x,
+        "y": y,
+        "total": index.totals.get((z, x, y), 0),
+        "artists": {field: [node.get(field) for node in members] for field in TILE_FIELDS}
+    }
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def encode_tiles(index: TileIndex) -> Dict[str, bytes]:
+    return {tile_field(z, x, y): encode_tile(index, z, x, y) for (z, x, y) in index.tiles}
+
+
+def nodes_from_snapshot_json(body: bytes) -> List[dict]:
+    columns = json.loads(body)["nodes"]
+    fields = list(columns)
+    return [dict(zip(fields, values)) for values in zip(*(columns[field] for field in fields))]
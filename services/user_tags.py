@@ -0,0 +1,153 @@
+import os
+import threading
+from typing import List
+
+import neo4j
+from dotenv import load_dotenv
+from neo4j import Session
+
+from services.artist_cache import invalidate_artist_metadata, invalidate_user_tagged_ids, user_tagged_key
+from services.artist_lookup import IS_TOP_ARTIST, ensure_artist_schema
+from services.change_feed import TAG_ADDED, TAG_REMOVED, ChangeEvent, change_event, publish_changes
+from services.redis import get_from_cache, set_to_cache
+
+load_dotenv()
+
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USER = os.getenv("NEO4J_USER")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_ARTISTS_DB = os.getenv("NEO4J_ARTISTS_DB")
+
+USER_TAGGED_TTL = int(os.getenv("USER_TAGGED_CACHE_TTL", "3600"))
+
+_migration_lock = threading.Lock()
+_user_tags_migrated = False
+
+# User tags live on (:User {tag})-[:TAGGED]->(:Artist) edges so lookups are index-backed.
+# a.userTags is still maintained as a denormalized copy for readers of the node properties.
+
+
+def ensure_user_tag_schema(session: Session):
+    ensure_artist_schema(session)
+    session.run("CREATE CONSTRAINT user_tag_unique IF NOT EXISTS FOR (u:User) REQUIRE u.tag IS UNIQUE")
+
+
+def migrate_user_tags_from_arrays(session: Session) -> int:
+    print("[NEO4J] Migrating userTags arrays to TAGGED relationships...")
+    ensure_user_tag_schema(session)
+    # Only artists with a tag that has no edge yet, so re-running after a completed migration is a scan, not a rewrite
+    session.run(
+        """
+        MATCH (a:Artist)
+        WHERE size(coalesce(a.userTags, [])) > 0
+          AND any(tag IN a.userTags WHERE NOT EXISTS { (:User {tag: tag})-[:TAGGED]->(a) })
+        CALL {
+            WITH a
+            UNWIND a.userTags AS tag
+            MERGE (u:User {tag: tag})
+            MERGE (u)-[:TAGGED]->(a)
+        } IN TRANSACTIONS OF 1000 ROWS
+        """
+    ).consume()
+    count = session.run("MATCH (:User)-[r:TAGGED]->(:Artist) RETURN count(r) AS count").single()["count"]
+    print(f"[NEO4J] Migration complete: {count} TAGGED relationships.")
+    return count
+
+
+def ensure_user_tags_migrated(session: Session):
+    """
+    Schema plus the array-to-edge migration, once per process. Tag reads and
+    top artist syncs call this first, so nothing depends on the manual
+    migrate-user-tags step having been run.
+    """
+    global _user_tags_migrated
+    if _user_tags_migrated:
+        return
+    with _migration_lock:
+        if not _user_tags_migrated:
+            migrate_user_tags_from_arrays(session)
+            _user_tags_migrated = True
+
+
+ADD_USER_TAG_QUERY = """
+UNWIND $spotify_ids AS sid
+MATCH (a:Artist {spotifyId: sid})
+WITH a, $user_tag IN coalesce(a.userTags, []) AS alreadyTagged
+MERGE (u:User {tag: $user_tag})
+MERGE (u)-[:TAGGED]->(a)
+SET a.userTags = CASE
+    WHEN alreadyTagged THEN a.userTags
+    ELSE coalesce(a.userTags, []) + $user_tag
+END
+RETURN a.id AS id, a.spotifyId AS spotifyId, a.userTags AS userTags, a.name AS name, NOT alreadyTagged AS tagAdded
+"""
+
+
+def tag_change_events(records: List[dict], event_type: str, user_tag: str) -> List[ChangeEvent]:
+    return [
+        change_event(event_type, record["id"], {"spotifyId": record["spotifyId"], "tag": user_tag})
+        for record in records
+        if record["id"] and record.get("tagAdded", True)
+    ]
+
+
+def add_user_tag(session: Session, spotify_ids: List[str], user_tag: str) -> List[dict]:
+    result = session.run(ADD_USER_TAG_QUERY, spotify_ids=list(spotify_ids), user_tag=user_tag)
+    records = [record.data() for record in result]
+    invalidate_artist_metadata(record["spotifyId"] for record in records)
+    invalidate_user_tagged_ids([user_tag])
+    publish_changes(tag_change_events(records, TAG_ADDED, user_tag))
+    return records
+
+
+def remove_user_tag(session: Session, spotify_ids: List[str], user_tag: str) -> List[str]:
+    result = session.run(
+        """
+        UNWIND $spotify_ids AS sid
+        MATCH (a:Artist {spotifyId: sid})
+        WHERE $user_tag IN coalesce(a.userTags, []) OR EXISTS { (:User {tag: $user_tag})-[:TAGGED]->(a) }
+        OPTIONAL MATCH (:User {tag: $user_tag})-[r:TAGGED]->(a)
+        DELETE r
+        SET a.userTags = [tag IN coalesce(a.userTags, []) WHERE tag <> $user_tag]
+        RETURN a.id AS id, a.spotifyId AS spotifyId
+        """,
+        spotify_ids=list(spotify_ids),
+        user_tag=user_tag
+    )
+    records = [record.data() for record in result]
+    removed = [record["spotifyId"] for record in records]
+    invalidate_artist_metadata(removed)
+    invalidate_user_tagged_ids([user_tag])
+    publish_changes(tag_change_events(records, TAG_REMOVED, user_tag))
+    return removed
+
+
+def get_tagged_spotify_ids(session: Session, user_tag: str, exclude_top_artists=False) -> List[str]:
+    ensure_user_tags_migrated(session)
+    where = f"WHERE NOT {IS_TOP_ARTIST}" if exclude_top_artists else ""
+    result = session.run(
+        f"""
+        MATCH (:User {{tag: $user_tag}})-[:TAGGED]->(a:Artist)
+        {where}
+        RETURN a.spotifyId AS spotifyId
+        """,
+        user_tag=user_tag
+    )
+    return [record["spotifyId"] for record in result if record["spotifyId"]]
+
+
+def get_tagged_spotify_ids_cached(session: Session, user_tag: str) -> List[str]:
+    cached = get_from_cache(user_tagged_key(user_tag))
+    if cached is not None:
+        return cached
+
+    tagged = get_tagged_spotify_ids(session, user_tag)
+    set_to_cache(user_tagged_key(user_tag), tagged, ex=USER_TAGGED_TTL)
+    return tagged
+
+
+if __name__ == "__main__":
+    driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    with driver.session(database=NEO4J_ARTISTS_DB) as migration_session:
+        migrate_user_tags_from_arrays(migration_session)
+    driver.close()
@@ -1,5 +1,7 @@
 import json
 import os
+from typing import Iterator
+
 from model.artist_node import ArtistNode
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -14,6 +16,7 @@ checkpoint_paths = {
     "musicbrainz": os.path.join(temp_dir, "3_musicbrainz_genres_added.json"),
     "spotify": os.path.join(temp_dir, "4_spotify_enriched_artist_data.json"),
     "final_genre_combined": os.path.join(temp_dir, "5_combined_final_artist_data.json"),
+    "crawled": os.path.join(temp_dir, "6_crawled_related_artist_data.json"),
     "genre_map": os.path.join(data_dir, "genreMap.json")
 }
 
@@ -35,3 +38,56 @@ def load_checkpoint(stage_name: str) -> list[ArtistNode]:
         data = json.load(f)
     print(f"[CHECKPOINT] Loaded {len(data)} artists from {os.path.basename(path)}")
     return [ArtistNode(**artist) for artist in data]
+
+def iter_checkpoint_records(stage_name: str, chunk_size: int = 1 << 16) -> Iterator[dict]:
+    path = checkpoint_paths.get(stage_name)
+    if not path:
+        raise ValueError(f"No checkpoint path configured for stage '{stage_name}'")
+
+    yield from iter_json_array(path, chunk_size)
+
+def iter_checkpoint(stage_name: str) -> Iterator[ArtistNode]:
+    for artist in iter_checkpoint_records(stage_name):
+        yield ArtistNode(**artist)
+
+def iter_json_array(path: str, chunk_size: int = 1 << 16) -> Iterator[dict]:
+    # Decodes one array element at a time so only the current record is held in memory
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        started = False
+        eof = False
+
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer.startswith("[") and not eof:
+                    chunk = f.read(chunk_size)
+                    if chunk:
+                        buffer += chunk
+                        continue
+                if not buffer.startswith("["):
+                    raise ValueError(f"{os.path.basename(path)} does not contain a JSON array")
+                buffer = buffer[1:]
+                started = True
+                continue
+
+            if buffer.startswith(","):
+                buffer = buffer[1:]
+                continue
+            if buffer.startswith("]"):
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    eof = True
+                buffer += chunk
+                continue
+
+            buffer = buffer[end:]
+            yield record